@@ -31,6 +31,11 @@ import os
 import warnings
 import errno
 from argparse import ArgumentTypeError
+from collections import deque
+from itertools import chain
+from multiprocessing import Pool
+
+from avro.datafile import SYNC_INTERVAL
 
 try:
     from pyavroc import AvroFileReader, AvroFileWriter
@@ -38,14 +43,64 @@ except ImportError:
     from pyfeatures.pyavroc_emu import AvroFileReader, AvroFileWriter
     warnings.warn("pyavroc not found, using standard avro lib\n")
 
+import pyfeatures.backends as backends
+import pyfeatures.batch_features as batch_features
+import pyfeatures.checkpoint as checkpoint
+import pyfeatures.pipeline as pipeline
+import pyfeatures.plane_index as plane_index
+import pyfeatures.plane_store as plane_store
+import pyfeatures.pyavroc_emu as pyavroc_emu
+import pyfeatures.tile_filter as tile_filter
+from pyfeatures.app.common import get_avro_reader, int_set
+from pyfeatures.avro_container import (
+    get_codec, get_file_codec, iter_plane_subset, read_first_head
+)
 from pyfeatures.bioimg import BioImgPlane
-from pyfeatures.feature_calc import calc_features, to_avro
+from pyfeatures.columnar import ColumnarWriter
+from pyfeatures.feature_cache import FeatureCache
+from pyfeatures.feature_layout import (
+    SKIPPED_VERSION, LayoutCache, TileSignatures, get_feature_names,
+    get_skipped_signatures, to_avro
+)
 from pyfeatures.schema import Signatures as out_schema
+from pyfeatures.tiling import gen_tile_coords
+
+PLANE_KEYS = 'img_path', 'series', 'z', 'c', 't'
+# options that must be the same when resuming a checkpointed run
+RESUME_KEYS = (
+    'long', 'features', 'backend', 'numpy_features', 'width', 'height',
+    'delta_x', 'delta_y', 'offset_x', 'offset_y', 'skip_background',
+    'background_threshold',
+)
+# work units submitted to the pool and not yet consumed, per worker
+PENDING_PER_WORKER = 16
+POLL_INTERVAL = .01
+OUTPUT_CODECS = 'null', 'deflate', 'snappy', 'zstd'
+
+# set in worker processes by init_worker
+CONTEXT = None
+
+
+def subvector_set(s):
+    names = set(s.split(","))
+    try:
+        get_feature_names(names)
+    except ValueError as e:
+        raise ArgumentTypeError(e.message)
+    return names
+
+
+def family_set(s):
+    names = set(s.split(","))
+    try:
+        batch_features.check_families(names)
+    except ValueError as e:
+        raise ArgumentTypeError(e.message)
+    return names
 
 
 def get_image_size(fin):
-    reader = AvroFileReader(fin)
-    r = reader.next()
+    r = read_first_head(fin)
     size_map = dict(zip(r['dimension_order'], r['pixel_data']['shape']))
     return tuple(size_map[_] for _ in 'ZCT')
 
@@ -56,7 +111,8 @@ def get_subsets(args):
             return sizei + i
         return i
 
-    # Getting the ZCT size is expensive, only fetch if necessary
+    # Getting the ZCT size requires reading from the input, only do it
+    # if necessary
     if any((i < 0) for i in
            args.zsubset.union(args.csubset).union(args.tsubset)):
         with open(args.in_fn) as fin:
@@ -71,53 +127,447 @@ def get_subsets(args):
     return zsubset, csubset, tsubset
 
 
+def get_reader(fin, logger, in_fn, zsubset, csubset, tsubset):
+    """\
+    Get an iterator over the input records.
+
+    If a subset of planes has been requested, only the selected records
+    are fully decoded: if an up-to-date plane index is available, they
+    are read directly; otherwise, the pixel data of the other records
+    is skipped while scanning the input.
+    """
+    if zsubset or csubset or tsubset:
+        index = plane_index.load_index(in_fn, f=fin)
+        if index is not None:
+            idx_fn = plane_index.get_index_fn(in_fn)
+            logger.info('reading selected planes via %s', idx_fn)
+            positions = index.find(zsubset, csubset, tsubset)
+            return plane_index.iter_records(fin, positions)
+        return iter_plane_subset(fin, zsubset, csubset, tsubset)
+    fin.seek(0)
+    return get_avro_reader(fin, AvroFileReader)
+
+
+def iter_planes(reader, zsubset, csubset, tsubset):
+    for r in reader:
+        p = BioImgPlane(r)
+        if zsubset and p.z not in zsubset:
+            continue
+        if csubset and p.c not in csubset:
+            continue
+        if tsubset and p.t not in tsubset:
+            continue
+        yield p
+
+
+class RunContext(object):
+    """\
+    Per-run state used to split planes into work units and compute them.
+
+    run() builds a new one from the options of each run, and passes it
+    to worker processes via the pool initializer, so that nothing
+    carries over from one run to the next in the same process.
+
+    feature_set is a FeatureSet with the wndcharm backend (backend is
+    None), a LayoutCache otherwise; matrix_pool, used by the wndcharm
+    backend, is shared by all work units processed by a process.
+    """
+
+    def __init__(self, feature_set, backend=None, matrix_pool=None,
+                 cache=None, tile_filter=None):
+        self.feature_set = feature_set
+        self.backend = backend
+        self.matrix_pool = matrix_pool
+        self.cache = cache
+        self.tile_filter = tile_filter
+
+
+def init_worker(context):
+    global CONTEXT
+    CONTEXT = context
+
+
+class PlaneTracker(object):
+    """\
+    Keep track of the work units of each plane still to be written.
+    """
+
+    def __init__(self):
+        self.todo = {}
+
+    def add_plane(self, key, n_units):
+        self.todo[key] = n_units
+
+    def unit_done(self, key):
+        """\
+        Return True if this was the last unit of the plane.
+        """
+        self.todo[key] -= 1
+        if self.todo[key] > 0:
+            return False
+        del self.todo[key]
+        return True
+
+
+def gen_work_units(planes, logger, args, context, store=None, done=None,
+                   tracker=None):
+    """\
+    Split planes into (tag, long, plane_info, pixels, i, j, h, w,
+    batch_values, skip) units. Yield the list of units of each plane.
+
+    If a plane store is given, each plane is saved to it and pixels is
+    the corresponding segment path; otherwise, it's the plane array.
+    Units whose (z, c, t, x, y) key is in done are skipped, as well as
+    entire planes if there's nothing left to do for them. If batch
+    feature families have been selected, they are computed here, for
+    all tiles of a plane at once, and batch_values holds the values for
+    the unit's tile. If a tile filter has been selected, skip is True
+    for units whose tile is background.
+    """
+    tiling = dict(w=args.width, h=args.height, dx=args.delta_x,
+                  dy=args.delta_y, ox=args.offset_x, oy=args.offset_y)
+    batch_backend = None
+    if context.backend is not None:
+        if context.backend.batch:
+            batch_backend = context.backend
+    elif context.feature_set.families:
+        batch_backend = backends.NumpyBackend(
+            families=context.feature_set.families
+        )
+    for p in planes:
+        key = p.z, p.c, p.t
+        H, W = p.get_xy_shape()
+        coords = [_ for _ in gen_tile_coords(H, W, **tiling)
+                  if not done or key + (_[1], _[0]) not in done]
+        if not coords:
+            logger.info('skipping %r (already done)', list(key))
+            continue
+        pixels = p.get_xy()
+        logger.info('processing %r', list(key))
+        plane_info = dict((k, getattr(p, k)) for k in PLANE_KEYS)
+        background = set()
+        if context.tile_filter is not None:
+            background = context.tile_filter.get_background(pixels, coords)
+            logger.info('%d/%d tiles are background', len(background),
+                        len(coords))
+        batch = {}
+        if batch_backend is not None and len(background) < len(coords):
+            _, batch = backends.calc_batch_features(pixels, batch_backend,
+                                                    **tiling)
+        src = pixels if store is None else store.put(pixels)
+        if tracker is not None:
+            tracker.add_plane(key, len(coords))
+        units = []
+        for i, j, h, w in coords:
+            if store is not None:
+                store.acquire(src)
+            units.append((p.name, args.long, plane_info, src, i, j, h, w,
+                          batch.get((i, j)), (i, j) in background))
+        if store is not None:
+            store.release(src)
+        yield units
+
+
+def calc_unit(unit, context):
+    tag, long, plane_info, pixels, i, j, h, w, batch_values, skip = unit
+    if skip:
+        out_rec = to_avro(get_skipped_signatures(tag, x=j, y=i, w=w, h=h))
+        out_rec.update(plane_info)
+        return out_rec
+    if isinstance(pixels, basestring):
+        tile = plane_store.get_tile(pixels, i, j, h, w)
+    else:
+        tile = pixels[i: i + h, j: j + w]
+    backend = context.backend
+    if backend is not None:
+        if batch_values is None:
+            batch_values = backend.compute(tile)[1][0]
+        signatures = TileSignatures(tag, backend.version, backend.names,
+                                    batch_values, x=j, y=i, w=w, h=h)
+    else:
+        from pyfeatures.feature_calc import calc_tile_features
+        signatures = calc_tile_features(tile, tag, i=i, j=j,
+                                        matrix_pool=context.matrix_pool,
+                                        cache=context.cache,
+                                        batch_values=batch_values,
+                                        feature_set=context.feature_set)
+    out_rec = context.feature_set.to_avro(signatures)
+    out_rec.update(plane_info)
+    return out_rec
+
+
+def get_cache_counts(context):
+    cache = context.cache
+    return (0, 0) if cache is None else (cache.hits, cache.misses)
+
+
+def calc_shared_unit(unit):
+    hits, misses = get_cache_counts(CONTEXT)
+    out_rec = calc_unit(unit, CONTEXT)
+    new_hits, new_misses = get_cache_counts(CONTEXT)
+    return unit[3], out_rec, (new_hits - hits, new_misses - misses)
+
+
+def pop_ready(pending):
+    """\
+    Remove and return the first AsyncResult in pending that is ready,
+    waiting for one if necessary.
+    """
+    while True:
+        for i, result in enumerate(pending):
+            if result.ready():
+                del pending[i]
+                return result
+        pending[0].wait(POLL_INTERVAL)
+
+
+def map_units(units, context, store=None, workers=1, keep_order=False):
+    if workers <= 1:
+        for unit in units:
+            yield calc_unit(unit, context)
+        return
+    # Pool.imap* would exhaust the units iterator (and thus decode all
+    # planes) right away, so keep a bounded number of units in flight,
+    # submitting a new one whenever a result is consumed
+    max_pending = PENDING_PER_WORKER * workers
+    units = iter(units)
+    pending = deque()
+    pool = Pool(workers, init_worker, (context,))
+    try:
+        while True:
+            for unit in units:
+                pending.append(pool.apply_async(calc_shared_unit, (unit,)))
+                if len(pending) >= max_pending:
+                    break
+            if not pending:
+                break
+            result = pending.popleft() if keep_order else pop_ready(pending)
+            seg, out_rec, (hits, misses) = result.get()
+            if store is not None:
+                store.release(seg)
+            if context.cache is not None:
+                # cache lookups happen in the workers
+                context.cache.hits += hits
+                context.cache.misses += misses
+            yield out_rec
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def get_run_params(args):
+    """\
+    Get the parameters to be stored in (or checked against) the journal
+    of a checkpointed run: the input series and RESUME_KEYS options.
+    """
+    params = {}
+    for k in RESUME_KEYS:
+        v = getattr(args, k)
+        params[k] = sorted(v) if isinstance(v, (set, frozenset)) else v
+    with open(args.in_fn) as fin:
+        try:
+            head = read_first_head(fin)
+        except ValueError:
+            head = {}  # no planes
+    for k in 'img_path', 'series':
+        params[k] = head.get(k)
+    return params
+
+
+def open_output(out_fn, logger, args):
+    """\
+    Open the output container, return (fout, writer, journal, done).
+
+    If checkpointing is enabled, the writer is the pure Python one,
+    which can be synced on demand and reopened for appending, and the
+    journal records the units written at each checkpoint. When resuming,
+    the output is truncated to the last checkpoint and done is the set
+    of units committed up to that point. Resuming a run with different
+    parameters (see get_run_params) is an error.
+    """
+    block_size = args.block_size or SYNC_INTERVAL
+    if not (args.checkpoint or args.resume):
+        fout = open(out_fn, 'wb')
+        if args.codec == 'null' and not args.block_size:
+            writer = AvroFileWriter(fout, out_schema)
+        else:
+            # only the pure Python writer supports all codecs and block sizes
+            writer = pyavroc_emu.AvroFileWriter(
+                fout, out_schema, codec=args.codec, block_size=block_size
+            )
+        return fout, writer, None, set()
+    journal_fn = checkpoint.get_journal_fn(out_fn)
+    params = get_run_params(args)
+    done, offset = set(), None
+    if args.resume:
+        done, offset = checkpoint.load_journal(journal_fn)
+    if offset is not None:
+        saved_params = checkpoint.load_params(journal_fn)
+        if saved_params is None:
+            logger.warning('%s has no run parameters, cannot check them',
+                           journal_fn)
+        else:
+            mismatches = checkpoint.get_mismatches(params, saved_params)
+            if mismatches:
+                sys.exit('Cannot resume, parameters differ from the '
+                         'previous run (%s)' % ', '.join(
+                             '%s=%r' % (_, saved_params.get(_))
+                             for _ in mismatches))
+    if offset is None:
+        fout = open(out_fn, 'w+b')
+        writer = pyavroc_emu.AvroFileWriter(
+            fout, out_schema, codec=args.codec, block_size=block_size
+        )
+        done = set()
+    else:
+        logger.info('resuming from %s: %d units already done',
+                    journal_fn, len(done))
+        fout = open(out_fn, 'r+b')
+        codec = get_file_codec(fout)
+        if codec != get_codec(args.codec):
+            fout.close()
+            sys.exit('Cannot resume: %s was written with --codec %s' % (
+                out_fn, codec
+            ))
+        fout.truncate(offset)
+        # the codec is the one the container was created with
+        writer = pyavroc_emu.AvroFileWriter(fout, block_size=block_size)
+    journal = checkpoint.Journal(journal_fn, params=params, committed=done,
+                                 offset=offset)
+    return fout, writer, journal, done
+
+
+def get_context(logger, args):
+    """\
+    Build the RunContext for the given options.
+    """
+    cache = feature_subset = backend = filter_ = None
+    if args.cache_dir:
+        logger.info('using feature cache in %s', args.cache_dir)
+        cache = FeatureCache(args.cache_dir, max_size=args.cache_size << 20)
+    if args.features:
+        feature_subset = get_feature_names(args.features)
+        logger.info('computing %d features for: %s', len(feature_subset),
+                    ', '.join(sorted(args.features)))
+    if args.backend != 'wndcharm':
+        if args.numpy_features or args.cache_dir:
+            sys.exit('--numpy-features and --cache-dir only apply to the '
+                     'wndcharm backend')
+        logger.info('using the %s backend', args.backend)
+        try:
+            backend = backends.get_backend(args.backend, long=args.long,
+                                           feature_names=feature_subset)
+        except ValueError as e:
+            sys.exit('Cannot use the %s backend: %s' % (args.backend, e))
+    if args.skip_background:
+        filter_ = tile_filter.TileFilter(
+            args.skip_background, threshold=args.background_threshold
+        )
+        logger.info('skipping tiles with %s <= %g', args.skip_background,
+                    args.background_threshold)
+    if args.numpy_features:
+        logger.info('computing with NumPy: %s',
+                    ', '.join(sorted(args.numpy_features)))
+    if backend is not None:
+        return RunContext(LayoutCache(), backend=backend,
+                          tile_filter=filter_)
+    # imported here, so that other backends work without wndcharm
+    from pyfeatures.feature_calc import FeatureSet, ImageMatrixPool
+    feature_set = FeatureSet(long=args.long, feature_names=feature_subset,
+                             batch_families=args.numpy_features)
+    return RunContext(feature_set, matrix_pool=ImageMatrixPool(),
+                      cache=cache, tile_filter=filter_)
+
+
 def run(logger, args, extra_argv=None):
     try:
         os.makedirs(args.out_dir)
     except OSError as e:
         if e.errno != errno.EEXIST:
             sys.exit('Cannot create output dir: %s' % e)
+    if args.resume and args.columnar:
+        sys.exit('--columnar cannot be used with --resume')
+    try:
+        get_codec(args.codec)
+    except ValueError as e:
+        sys.exit('Cannot write output: %s' % e)
+    if args.block_size is not None and args.block_size <= 0:
+        sys.exit('--block-size must be positive')
     tag, ext = os.path.splitext(os.path.basename(args.in_fn))
     out_fn = os.path.join(args.out_dir, '%s_features%s' % (tag, ext))
     logger.info('writing to %s', out_fn)
     zsubset, csubset, tsubset = get_subsets(args)
-    with open(out_fn, 'w') as fout:
-        writer = AvroFileWriter(fout, out_schema)
-        with open(args.in_fn) as fin:
-            reader = AvroFileReader(fin)
-            for r in reader:
-                p = BioImgPlane(r)
-                if zsubset and p.z not in zsubset:
-                    continue
-                if csubset and p.c not in csubset:
-                    continue
-                if tsubset and p.t not in tsubset:
-                    continue
-                pixels = p.get_xy()
-                logger.info('processing %r', [p.z, p.c, p.t])
-                kw = {
-                    'long': args.long,
-                    'w': args.width,
-                    'h': args.height,
-                    'dx': args.delta_x,
-                    'dy': args.delta_y,
-                    'ox': args.offset_x,
-                    'oy': args.offset_y,
-                }
-                for fv in calc_features(pixels, p.name, **kw):
-                    out_rec = to_avro(fv)
-                    for name in 'img_path', 'series', 'z', 'c', 't':
-                        out_rec[name] = getattr(p, name)
-                    writer.write(out_rec)
-        writer.close()
-    return 0
+    context = get_context(logger, args)
+    store = None
+    if args.workers > 1:
+        store = plane_store.PlaneStore(dir=args.shm_dir)
+    col_writer = None
+    if args.columnar:
+        col_out_dir = os.path.join(args.out_dir, '%s_features.cols' % tag)
+        logger.info('writing columnar data to %s', col_out_dir)
+        col_writer = ColumnarWriter(col_out_dir)
+    fout, writer, journal, done = open_output(out_fn, logger, args)
+    tracker = None if journal is None else PlaneTracker()
 
+    def write_record(out_rec):
+        writer.write(out_rec)
+        if col_writer is not None:
+            col_writer.write(out_rec)
+        if journal is None:
+            return
+        key = out_rec['z'], out_rec['c'], out_rec['t']
+        journal.add(key + (out_rec['x'], out_rec['y']))
+        if tracker.unit_done(key):
+            writer.flush()  # ends the current block
+            os.fsync(fout.fileno())
+            journal.commit(fout.tell())
 
-def int_set(s):
+    consumer = None
+    if args.queue_size > 0:
+        # encode and write records in a background thread
+        consumer = pipeline.Consumer(
+            write_record, maxsize=PENDING_PER_WORKER * max(args.workers, 1)
+        )
     try:
-        return set(int(_) for _ in s.split(","))
-    except ValueError as e:
-        raise ArgumentTypeError(e.message)
+        with open(args.in_fn) as fin:
+            reader = get_reader(fin, logger, args.in_fn,
+                                zsubset, csubset, tsubset)
+            planes = iter_planes(reader, zsubset, csubset, tsubset)
+            plane_units = gen_work_units(planes, logger, args, context,
+                                         store=store, done=done,
+                                         tracker=tracker)
+            if args.queue_size > 0:
+                # read and decode planes in a background thread
+                plane_units = pipeline.prefetch(plane_units,
+                                                maxsize=args.queue_size)
+            units = chain.from_iterable(plane_units)
+            try:
+                for out_rec in map_units(units, context, store=store,
+                                         workers=args.workers,
+                                         keep_order=args.keep_order):
+                    if consumer is None:
+                        write_record(out_rec)
+                    else:
+                        consumer.put(out_rec)
+            finally:
+                plane_units.close()
+        if consumer is not None:
+            consumer.close()
+        writer.close()
+        if col_writer is not None:
+            col_writer.close()
+        if context.cache is not None:
+            logger.info('feature cache: %d hits, %d misses',
+                        context.cache.hits, context.cache.misses)
+    finally:
+        if consumer is not None:
+            consumer.abort()
+        fout.close()
+        if journal is not None:
+            journal.close()
+        if store is not None:
+            store.close()
+    return 0
 
 
 def add_parser(subparsers):
@@ -127,6 +577,20 @@ def add_parser(subparsers):
     parser.add_argument('-o', '--out-dir', metavar='DIR', default=os.getcwd())
     parser.add_argument('-l', '--long', action='store_true',
                         help='extract WND-CHARM\'s "long" features set')
+    parser.add_argument('-f', '--features', type=subvector_set,
+                        metavar='NAME,NAME,...',
+                        help='compute only these feature sub-vectors '
+                        '(the others are left empty)')
+    parser.add_argument('--backend', metavar='NAME', default='wndcharm',
+                        choices=sorted(backends.BACKENDS),
+                        help='feature extraction backend (%s; default: '
+                        'wndcharm)' % ', '.join(sorted(backends.BACKENDS)))
+    parser.add_argument('--numpy-features', type=family_set,
+                        metavar='NAME,NAME,...',
+                        help='compute these feature sub-vectors with NumPy '
+                        '(for all tiles of a plane at once) instead of '
+                        'WND-CHARM. Supported: %s' % ', '.join(
+                            sorted(batch_features.FAMILIES)))
     parser.add_argument('-W', '--width', type=int, metavar="INT",
                         help='tile width (default = image width)')
     parser.add_argument('-H', '--height', type=int, metavar="INT",
@@ -139,6 +603,16 @@ def add_parser(subparsers):
                         help="horizontal offset of first tile (default 0)")
     parser.add_argument("--offset-y", type=int, metavar="INT",
                         help="vertical offset of first tile (default 0)")
+    parser.add_argument("--skip-background", metavar="METHOD",
+                        choices=tile_filter.METHODS,
+                        help="do not compute features for tiles whose score "
+                        "(%s) is not greater than the background threshold; "
+                        "their records have version '%s' and no feature "
+                        "values" % (", ".join(tile_filter.METHODS),
+                                    SKIPPED_VERSION))
+    parser.add_argument("--background-threshold", type=float,
+                        metavar="FLOAT", default=0.,
+                        help="background threshold for --skip-background")
     parser.add_argument("-z", "--zsubset", type=int_set, metavar="INT,INT,...",
                         default=set(),
                         help="process only planes with these Z coordinates")
@@ -148,5 +622,43 @@ def add_parser(subparsers):
     parser.add_argument("-t", "--tsubset", type=int_set, metavar="INT,INT,...",
                         default=set(),
                         help="process only planes with these T coordinates")
+    parser.add_argument("-p", "--workers", type=int, metavar="INT", default=1,
+                        help="number of worker processes for tile features")
+    parser.add_argument("--queue-size", type=int, metavar="INT", default=2,
+                        help="number of planes to read and decode ahead of "
+                        "feature calculation, in a separate thread (output "
+                        "records are also written in a separate thread); 0 "
+                        "runs everything in the main thread")
+    parser.add_argument("--keep-order", action="store_true",
+                        help="with more than one worker, write output "
+                        "records in the same order as a serial run")
+    parser.add_argument("--codec", metavar="NAME", default="null",
+                        choices=OUTPUT_CODECS,
+                        help="output block compression codec (%s); snappy "
+                        "and zstd require the python-snappy and zstandard "
+                        "packages. zstd output is not supported by pyavroc: "
+                        "the other subcommands read it with the (slower) "
+                        "standard avro lib. With --resume, must be the codec "
+                        "of the interrupted run" % ", ".join(OUTPUT_CODECS))
+    parser.add_argument("--block-size", type=int, metavar="BYTES",
+                        help="write an output block as soon as its "
+                        "uncompressed size reaches this many bytes "
+                        "(default %d)" % SYNC_INTERVAL)
+    parser.add_argument("--checkpoint", action="store_true",
+                        help="record completed tiles in a journal after "
+                        "each plane, so that the run can be resumed")
+    parser.add_argument("--resume", action="store_true",
+                        help="resume an interrupted checkpointed run, "
+                        "appending to its output (implies --checkpoint)")
+    parser.add_argument("--columnar", action="store_true",
+                        help="also write features to a columnar container")
+    parser.add_argument("--shm-dir", metavar="DIR",
+                        help="where to store planes shared with workers "
+                        "(default: %s if available)" % plane_store.SHM_DIR)
+    parser.add_argument("--cache-dir", metavar="DIR",
+                        help="cache tile features in this directory and "
+                        "reuse them for tiles with identical content")
+    parser.add_argument("--cache-size", type=int, metavar="MB",
+                        default=1024, help="maximum feature cache size")
     parser.set_defaults(func=run)
     return parser
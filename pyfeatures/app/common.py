@@ -19,6 +19,10 @@
 # END_COPYRIGHT
 
 import logging
+from argparse import ArgumentTypeError
+
+import pyfeatures.pyavroc_emu as pyavroc_emu
+from pyfeatures.avro_container import NATIVE_CODECS, get_file_codec
 
 LOG_LEVELS = frozenset([
     "CRITICAL",
@@ -66,3 +70,21 @@ class NullLogger(logging.Logger):
         logging.Logger.__init__(self, "null")
         self.propagate = 0
         self.handlers = [_NullHandler()]
+
+
+def int_set(s):
+    try:
+        return set(int(_) for _ in s.split(","))
+    except ValueError as e:
+        raise ArgumentTypeError(e.message)
+
+
+def get_avro_reader(f, reader_cls):
+    """\
+    Return reader_cls(f) if the codec of f is supported by pyavroc, else
+    a pure Python reader. Use it to read containers written by calc
+    with, e.g., --codec zstd.
+    """
+    if get_file_codec(f) not in NATIVE_CODECS:
+        reader_cls = pyavroc_emu.AvroFileReader
+    return reader_cls(f)
@@ -36,15 +36,35 @@ except ImportError:
 import numpy as np
 from libtiff import TIFF
 
+from pyfeatures.app.common import get_avro_reader, int_set
+from pyfeatures.avro_container import iter_plane_subset
 from pyfeatures.bioimg import BioImgPlane
+from pyfeatures.plane_index import load_index, iter_records
 
 
 # no schema needed for deserialization
-def iterplanes(avro_file):
+def iterplanes(avro_file, zsubset=None, csubset=None, tsubset=None):
     with open(avro_file, 'rb') as f:
-        reader = AvroFileReader(f)
+        if zsubset or csubset or tsubset:
+            index = load_index(avro_file, f=f)
+            if index is None:
+                reader = iter_plane_subset(f, zsubset, csubset, tsubset)
+            else:
+                reader = iter_records(
+                    f, index.find(zsubset, csubset, tsubset)
+                )
+        else:
+            f.seek(0)
+            reader = get_avro_reader(f, AvroFileReader)
         for r in reader:
-            yield BioImgPlane(r)
+            p = BioImgPlane(r)
+            if zsubset and p.z not in zsubset:
+                continue
+            if csubset and p.c not in csubset:
+                continue
+            if tsubset and p.t not in tsubset:
+                continue
+            yield p
 
 
 def run(logger, args, extra_argv=None):
@@ -53,7 +73,8 @@ def run(logger, args, extra_argv=None):
     except OSError as e:
         if e.errno != errno.EEXIST:
             sys.exit('Cannot create output dir: %s' % e)
-    for p in iterplanes(args.avro_file):
+    for p in iterplanes(args.avro_file, zsubset=args.zsubset,
+                        csubset=args.csubset, tsubset=args.tsubset):
         pixels = p.get_xy()
         out_tag = '%s-z%04d-c%04d-t%04d' % (p.name, p.z, p.c, p.t)
         logger.info("writing plane %s", out_tag)
@@ -73,5 +94,14 @@ def add_parser(subparsers):
     parser.add_argument('out_dir', metavar='OUT_DIR')
     parser.add_argument('--img', action='store_true',
                         help='write images instead of .npy dumps')
+    parser.add_argument("-z", "--zsubset", type=int_set, metavar="INT,INT,...",
+                        default=set(),
+                        help="only output planes with these Z coordinates")
+    parser.add_argument("-c", "--csubset", type=int_set, metavar="INT,INT,...",
+                        default=set(),
+                        help="only output planes with these C coordinates")
+    parser.add_argument("-t", "--tsubset", type=int_set, metavar="INT,INT,...",
+                        default=set(),
+                        help="only output planes with these T coordinates")
     parser.set_defaults(func=run)
     return parser
@@ -40,13 +40,15 @@ except ImportError:
     from pyfeatures.pyavroc_emu import AvroFileReader
     warnings.warn("pyavroc not found, using standard avro lib\n")
 
+from pyfeatures.app.common import get_avro_reader
+
 
 FORMATS = "db", "pickle", "txt", "json"
 PROTOCOL = cPickle.HIGHEST_PROTOCOL
 
 
 def iter_records(f, logger, num_records=None):
-    reader = AvroFileReader(f)
+    reader = get_avro_reader(f, AvroFileReader)
     for i, r in enumerate(reader):
         logger.debug("record #%d", i)
         if num_records is not None and i >= num_records:
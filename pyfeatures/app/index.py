@@ -0,0 +1,46 @@
+# BEGIN_COPYRIGHT
+#
+# Copyright (C) 2017 Open Microscopy Environment:
+#   - University of Dundee
+#   - CRS4
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# END_COPYRIGHT
+
+"""\
+Build plane indexes for BioImgPlane Avro containers.
+
+For each container, write a sidecar index (by default, the container's
+path plus '.idx') that maps the (series, z, c, t) coordinates of each
+plane to its position in the file. The calc and deserialize commands
+use it to seek directly to the planes they need.
+"""
+
+from pyfeatures.plane_index import get_index_fn, write_index
+
+
+def add_parser(subparsers):
+    parser = subparsers.add_parser("index", description=__doc__)
+    parser.add_argument("in_fn", metavar="AVRO_CONTAINER", nargs="+",
+                        help="avro input file(s) with serialized img planes")
+    parser.set_defaults(func=run)
+    return parser
+
+
+def run(logger, args, extra_argv=None):
+    for fn in args.in_fn:
+        idx_fn = get_index_fn(fn)
+        index = write_index(fn, idx_fn=idx_fn)
+        logger.info("%s: %d planes indexed", idx_fn, len(index.entries))
+    return 0
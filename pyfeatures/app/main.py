@@ -34,10 +34,12 @@ SUBMOD_NAMES = [
     "calc",
     "deserialize",
     "dump",
+    "index",
     "plot",
     "serialize",
     "summarize",
     "tiles",
+    "tune_tiles",
 ]
 
 
@@ -21,7 +21,8 @@
 """\
 Plot feature values across a given dimension.
 
-Reads feature data from Avro containers output by 'pyfeatures calc'.
+Reads feature data from Avro containers output by 'pyfeatures calc'
+or from the columnar containers written by 'pyfeatures calc --columnar'.
 
 The '-f' option expects the name of a feature sub-vector, e.g.,
 'haralick_textures'.
@@ -40,6 +41,11 @@ try:
 except ImportError:
     from pyfeatures.pyavroc_emu import AvroFileReader
     warnings.warn("pyavroc not found, using standard avro lib\n")
+import numpy as np
+
+from pyfeatures.app.common import get_avro_reader
+from pyfeatures.columnar import ColumnarReader, is_columnar
+from pyfeatures.feature_layout import SKIPPED_VERSION, is_skipped
 from pyfeatures.feature_names import FEATURE_NAMES
 
 
@@ -64,17 +70,50 @@ def iter_records(fn):
                 yield r
     else:
         with open(fn) as f:
-            reader = AvroFileReader(f)
+            reader = get_avro_reader(f, AvroFileReader)
             for r in reader:
                 yield r
 
 
+def get_columnar_data(fn, axis, feature=None, x=None, y=None):
+    reader = ColumnarReader(fn)
+    other_axes = [_ for _ in AXES if _ != axis]
+    meta = reader.meta
+    # background tiles are stored as rows of NaNs
+    mask = meta['version'] != SKIPPED_VERSION
+    if x is not None:
+        mask &= (meta['x'] == x)
+    if y is not None:
+        mask &= (meta['y'] == y)
+    rows = np.flatnonzero(mask)
+    rows = rows[np.argsort(meta[axis][rows], kind='mergesort')]
+    groups = {}
+    for i in rows:
+        k1 = tuple(int(meta[_][i]) for _ in other_axes)
+        k2 = (int(meta['x'][i]), int(meta['y'][i]))
+        groups.setdefault((k1, k2), []).append(i)
+    names = [feature] if feature else reader.columns
+    data = {}
+    for name in names:
+        subv = reader.get(name)
+        for (k1, k2), group_rows in groups.iteritems():
+            values = subv[group_rows]
+            v2 = data.setdefault(k1, {}).setdefault(k2, {})
+            for idx in xrange(values.shape[1]):
+                v2[(name, idx)] = values[:, idx].tolist()
+    return data
+
+
 def get_data(fn, axis, feature=None, x=None, y=None):
+    if is_columnar(fn):
+        return get_columnar_data(fn, axis, feature=feature, x=x, y=y)
     other_axes = [_ for _ in AXES if _ != axis]
     data = {}
     for r in iter_records(fn):
         if (x is not None and r['x'] != x) or (y is not None and r['y'] != y):
             continue
+        if is_skipped(r):
+            continue  # background tile, no features
         k1 = tuple(r[_] for _ in other_axes)
         k2 = (r['x'], r['y'])
         for name, idx in FEATURE_NAMES.itervalues():
@@ -120,7 +159,8 @@ def plot_data(data, axis, out_dir, logger):
 def add_parser(subparsers):
     parser = subparsers.add_parser("plot", description=__doc__)
     parser.add_argument("in_fn", metavar="FEATURES_FILE",
-                        help="Avro file containing feature data")
+                        help="Avro file or columnar container "
+                        "containing feature data")
     parser.add_argument("axis", metavar="|".join(AXES), choices=AXES,
                         help="what to map to the horizontal axis in the plots")
     parser.add_argument("-f", "--feature", metavar="FEATURE", choices=FV_NAMES,
@@ -21,17 +21,74 @@
 """\
 Serialize image data to BioImgPlane records.
 
-All args are passed to it.crs4.features.ImageToAvro.
+All args, except for the ones listed below, are passed to
+it.crs4.features.ImageToAvro.
 """
 
+import os
 import subprocess as sp
 
 from pyfeatures import JAR_PATH
+from pyfeatures.plane_index import get_index_fn, write_index
+
+OUTDIR_OPTS = frozenset(["-o", "--outdir"])
+
+
+def get_out_dir(extra_argv):
+    """\
+    Get the output directory from the args passed to ImageToAvro.
+    """
+    out_dir = None
+    argv = iter(extra_argv)
+    for a in argv:
+        if a in OUTDIR_OPTS:
+            out_dir = next(argv, None)
+        elif a.startswith("--outdir="):
+            out_dir = a.split("=", 1)[1]
+    return out_dir or os.getcwd()
+
+
+def list_containers(out_dir):
+    """\
+    Map the path of each avro container in out_dir to its mtime.
+    """
+    res = {}
+    try:
+        names = os.listdir(out_dir)
+    except OSError:
+        return res
+    for bn in names:
+        if not bn.endswith(".avro"):
+            continue
+        fn = os.path.join(out_dir, bn)
+        try:
+            res[fn] = os.stat(fn).st_mtime
+        except OSError:
+            pass
+    return res
+
+
+def get_new_containers(out_dir, before):
+    """\
+    Get the containers in out_dir that are not in the before listing
+    (as returned by list_containers) or have been modified since.
+    """
+    return sorted(fn for fn, mtime in list_containers(out_dir).iteritems()
+                  if before.get(fn) != mtime)
+
+
+def index_containers(logger, fns):
+    for fn in fns:
+        idx_fn = get_index_fn(fn)
+        index = write_index(fn, idx_fn=idx_fn)
+        logger.info("%s: %d planes indexed", idx_fn, len(index.entries))
 
 
 def run(logger, args, extra_argv=None):
     if extra_argv is None:
         extra_argv = []
+    out_dir = get_out_dir(extra_argv)
+    before = list_containers(out_dir) if args.index else None
     java = ["java", "-cp", JAR_PATH]
     if args.java_d:
         for prop in args.java_d:
@@ -43,6 +100,9 @@ def run(logger, args, extra_argv=None):
     except sp.CalledProcessError:
         if extra_argv:
             raise
+        return 0
+    if args.index:
+        index_containers(logger, get_new_containers(out_dir, before))
     return 0
 
 
@@ -54,5 +114,7 @@ def add_parser(subparsers):
     )
     parser.add_argument('-D', dest='java_d', metavar='JAVA_PROPERTY',
                         nargs='+', help='Java properties')
+    parser.add_argument('--index', action='store_true',
+                        help='also write a plane index for each container')
     parser.set_defaults(func=run)
     return parser
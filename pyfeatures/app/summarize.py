@@ -31,6 +31,9 @@ except ImportError:
     from pyfeatures.pyavroc_emu import AvroFileReader
     warnings.warn("pyavroc not found, using standard avro lib\n")
 
+from pyfeatures.app.common import get_avro_reader
+from pyfeatures.feature_layout import is_skipped
+
 
 def add_parser(subparsers):
     parser = subparsers.add_parser("summarize", description=__doc__)
@@ -47,12 +50,16 @@ def run(logger, args, extra_argv=None):
     str_keys = ["name", "img_path"]
     int_keys = ["series", "z", "c", "t", "w", "h", "x", "y"]
     d = {"n_features": set()}
+    n_skipped = 0
     with open(args.in_fn) as f:
-        reader = AvroFileReader(f)
+        reader = get_avro_reader(f, AvroFileReader)
         for r in reader:
-            d["n_features"].add(
-                sum(len(v) for k, v in r.iteritems() if type(v) is list)
-            )
+            if is_skipped(r):
+                n_skipped += 1  # no features
+            else:
+                d["n_features"].add(
+                    sum(len(v) for k, v in r.iteritems() if type(v) is list)
+                )
             for k in str_keys:
                 d.setdefault(k, set()).add(r[k])
             for k in int_keys:
@@ -67,3 +74,7 @@ def run(logger, args, extra_argv=None):
                 fo.write("%s: %d-%d\n" % (k, v[0], v[-1]))
             else:
                 fo.write("%s: %s\n" % (k, ", ".join(map(str, v))))
+        fo.write("n_features: %s\n" % ", ".join(
+            map(str, sorted(d["n_features"]))
+        ))
+        fo.write("skipped: %d\n" % n_skipped)
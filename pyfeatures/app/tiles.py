@@ -25,7 +25,7 @@ visual representation of the resulting coverage.
 
 import numpy as np
 
-from pyfeatures.feature_calc import gen_tiles
+from pyfeatures.tiling import gen_tiles
 
 
 IMG_ALPHA = 0.2
@@ -0,0 +1,158 @@
+# BEGIN_COPYRIGHT
+#
+# Copyright (C) 2017 Open Microscopy Environment:
+#   - University of Dundee
+#   - CRS4
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# END_COPYRIGHT
+
+"""\
+Recommend a tile size for the calc command.
+
+Compute features for a few randomly placed tiles of a few sizes on a
+representative plane, fit a cost / error model (see tile_tuning) and
+print the tiling (-W, -H, -x, -y calc options) that minimizes the error
+within a time budget, or the time within an error bound. Error is the
+relative distance between the mean tile feature vector and the feature
+vector of the whole plane. Fitted models are cached per plane shape,
+dtype and feature set, so planes from similar images are not sampled
+again.
+"""
+
+import sys
+
+import pyfeatures.backends as backends
+import pyfeatures.tile_tuning as tile_tuning
+from pyfeatures.avro_container import iter_plane_subset
+from pyfeatures.bioimg import BioImgPlane
+from pyfeatures.feature_layout import get_feature_names
+from pyfeatures.app.calc import subvector_set
+
+MIN_W = 200
+MIN_H = 200
+
+
+def read_plane(in_fn, z, c, t):
+    with open(in_fn) as fin:
+        for r in iter_plane_subset(fin, {z}, {c}, {t}):
+            return BioImgPlane(r)
+    raise ValueError("plane not found: z=%d, c=%d, t=%d" % (z, c, t))
+
+
+def get_target(args):
+    return "time=%r:error=%r:overlap=%r:min=%dx%d" % (
+        args.time_budget, args.max_error, args.overlap, args.min_width,
+        args.min_height
+    )
+
+
+def add_parser(subparsers):
+    parser = subparsers.add_parser("tune-tiles", description=__doc__)
+    parser.add_argument("in_fn", metavar="AVRO_CONTAINER",
+                        help="avro input file with serialized img planes")
+    parser.add_argument("--time-budget", type=float, metavar="SECONDS",
+                        help="maximum feature calculation time per plane")
+    parser.add_argument("--max-error", type=float, metavar="FLOAT",
+                        help="maximum relative error wrt the whole plane")
+    parser.add_argument("-l", "--long", action="store_true",
+                        help="extract WND-CHARM's \"long\" features set")
+    parser.add_argument("-f", "--features", type=subvector_set,
+                        metavar="NAME,NAME,...",
+                        help="compute only these sub-vectors")
+    parser.add_argument("--backend", metavar="NAME", default="wndcharm",
+                        choices=sorted(backends.BACKENDS),
+                        help="feature extraction backend")
+    parser.add_argument("-z", type=int, metavar="INT", default=0,
+                        help="z index of the sample plane")
+    parser.add_argument("-c", type=int, metavar="INT", default=0,
+                        help="channel index of the sample plane")
+    parser.add_argument("-t", type=int, metavar="INT", default=0,
+                        help="time index of the sample plane")
+    parser.add_argument("-W", "--min-width", type=int, metavar="INT",
+                        default=MIN_W, help="minimum tile width")
+    parser.add_argument("-H", "--min-height", type=int, metavar="INT",
+                        default=MIN_H, help="minimum tile height")
+    parser.add_argument("--overlap", type=float, metavar="FLOAT", default=0.,
+                        help="fraction of overlap between adjacent tiles")
+    parser.add_argument("--n-samples", type=int, metavar="INT", default=4,
+                        help="number of tile sizes to sample")
+    parser.add_argument("--n-tiles", type=int, metavar="INT", default=8,
+                        help="number of tiles per sampled size")
+    parser.add_argument("--seed", type=int, metavar="INT",
+                        help="random seed for tile positions")
+    parser.add_argument("--cache-file", metavar="FILE",
+                        default=tile_tuning.DEFAULT_CACHE,
+                        help="model cache (JSON)")
+    parser.add_argument("--refit", action="store_true",
+                        help="ignore cached models")
+    parser.set_defaults(func=run)
+    return parser
+
+
+def run(logger, args, extra_argv=None):
+    if args.time_budget is None and args.max_error is None:
+        sys.exit("at least one of --time-budget and --max-error is required")
+    if not 0 <= args.overlap < 1:
+        sys.exit("overlap must be in [0, 1)")
+    feature_names = None
+    if args.features:
+        feature_names = get_feature_names(args.features)
+    plane = read_plane(args.in_fn, args.z, args.c, args.t)
+    pixels = plane.get_xy()
+    H, W = pixels.shape
+    candidates = tile_tuning.get_candidates(
+        H, W, min_w=args.min_width, min_h=args.min_height,
+        overlap=args.overlap
+    )
+    cache = tile_tuning.ModelCache(args.cache_file)
+    key = tile_tuning.get_cache_key(H, W, pixels.dtype, args.long,
+                                    args.backend, feature_names)
+    model = None if args.refit else cache.get_model(key)
+    recommendation = None
+    if model is not None:
+        logger.info("using cached model for %s", key)
+        recommendation = cache.get_recommendation(key, get_target(args))
+    else:
+        shapes = tile_tuning.get_sample_shapes(candidates, args.n_samples)
+        if len(shapes) < 2:
+            sys.exit("not enough tile sizes to sample, try lowering the "
+                     "minimum tile width / height")
+        backend = backends.get_backend(args.backend, long=args.long,
+                                       feature_names=feature_names)
+        logger.info("sampling %d tile sizes on a %dx%d plane",
+                    len(shapes), W, H)
+        ref_time, samples = tile_tuning.sample(
+            backend, pixels, shapes, n_tiles=args.n_tiles, seed=args.seed
+        )
+        logger.info("whole plane: %.3fs", ref_time)
+        for h, w, t, err in samples:
+            logger.info("%dx%d: %.4fs per tile, error %.4g", w, h, t, err)
+        model = tile_tuning.TileModel.fit(H, W, samples, ref_time=ref_time)
+        cache.put_model(key, model)
+    if recommendation is None:
+        recommendation = tile_tuning.recommend(
+            model, candidates, time_budget=args.time_budget,
+            max_error=args.max_error
+        )
+        cache.put_recommendation(key, get_target(args), recommendation)
+        cache.save()
+    else:
+        logger.info("using cached recommendation")
+    tiling, t, err, feasible = recommendation
+    if not feasible:
+        logger.warning("no tiling meets the requirements, using the closest")
+    logger.info("predicted time: %.3fs, error: %.4g", t, err)
+    logger.info("recommended: -W %d -H %d -x %d -y %d", *tiling)
+    return 0
@@ -0,0 +1,436 @@
+# BEGIN_COPYRIGHT
+#
+# Copyright (C) 2017 Open Microscopy Environment:
+#   - University of Dundee
+#   - CRS4
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# END_COPYRIGHT
+
+"""\
+Schema-compiled Avro binary decoding and encoding.
+
+The generic avro.io DatumReader and DatumWriter walk the schema for
+each datum, reading or writing one value at a time through a file-like
+object. Here, a parsed schema is compiled once into nested closures:
+
+  decode = compile_decoder(schema)
+  datum, pos = decode(buf, pos)
+
+  encode = compile_encoder(schema)
+  encode(out, datum)
+
+where buf is a memoryview of the encoded data, pos the offset of the
+datum in it and out a bytearray the encoded datum is appended to.
+A record decoder is a flat sequence of field decoders that advance
+the offset cursor, so decoding does not create any per-datum file or
+decoder objects. Arrays of doubles and floats, which make up most of a
+Signatures record, are decoded and encoded one block at a time with
+struct.
+
+All types that can appear in a schema are supported, including
+recursive ones: named types are compiled once and then looked up by
+their full name. Compiling other types (e.g., protocol messages)
+raises UnsupportedSchema. Encoders do not validate data beforehand,
+but check it as it is written (e.g., the range of int and long values):
+invalid data makes them raise a TypeError, ValueError, KeyError,
+struct.error, etc.
+"""
+
+from struct import Struct, pack, unpack_from
+
+from avro.io import (
+    INT_MAX_VALUE, INT_MIN_VALUE, LONG_MAX_VALUE, LONG_MIN_VALUE, validate
+)
+from avro.schema import NamedSchema
+
+FLOAT = Struct("<f")
+DOUBLE = Struct("<d")
+
+
+class UnsupportedSchema(ValueError):
+    pass
+
+
+def read_long(buf, pos):
+    b = ord(buf[pos])
+    pos += 1
+    n = b & 0x7F
+    shift = 7
+    while b & 0x80:
+        b = ord(buf[pos])
+        pos += 1
+        n |= (b & 0x7F) << shift
+        shift += 7
+    return (n >> 1) ^ -(n & 1), pos
+
+
+def write_long(out, n):
+    if not LONG_MIN_VALUE <= n <= LONG_MAX_VALUE:
+        raise ValueError("%r is out of range for long" % (n,))
+    n = (n << 1) ^ (n >> 63)
+    while n & ~0x7F:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def write_int(out, n):
+    if not INT_MIN_VALUE <= n <= INT_MAX_VALUE:
+        raise ValueError("%r is out of range for int" % (n,))
+    write_long(out, n)
+
+
+def read_bytes(buf, pos):
+    n, pos = read_long(buf, pos)
+    end = pos + n
+    return buf[pos: end].tobytes(), end
+
+
+def write_bytes(out, b):
+    write_long(out, len(b))
+    out.extend(b)
+
+
+def read_string(buf, pos):
+    n, pos = read_long(buf, pos)
+    end = pos + n
+    return buf[pos: end].tobytes().decode("utf-8"), end
+
+
+def write_string(out, s):
+    if isinstance(s, unicode):
+        s = s.encode("utf-8")
+    write_long(out, len(s))
+    out.extend(s)
+
+
+def read_boolean(buf, pos):
+    return buf[pos] == "\x01", pos + 1
+
+
+def write_boolean(out, b):
+    if b is True:
+        out.append(1)
+    elif b is False:
+        out.append(0)
+    else:
+        raise TypeError("%r is not a bool" % (b,))
+
+
+def read_float(buf, pos):
+    return FLOAT.unpack_from(buf, pos)[0], pos + 4
+
+
+def write_float(out, x):
+    out.extend(FLOAT.pack(x))
+
+
+def read_double(buf, pos):
+    return DOUBLE.unpack_from(buf, pos)[0], pos + 8
+
+
+def write_double(out, x):
+    out.extend(DOUBLE.pack(x))
+
+
+def read_null(buf, pos):
+    return None, pos
+
+
+def write_null(out, datum):
+    if datum is not None:
+        raise TypeError("%r is not None" % (datum,))
+
+
+PRIMITIVE_DECODERS = {
+    "null": read_null,
+    "boolean": read_boolean,
+    "int": read_long,
+    "long": read_long,
+    "float": read_float,
+    "double": read_double,
+    "bytes": read_bytes,
+    "string": read_string,
+}
+
+PRIMITIVE_ENCODERS = {
+    "null": write_null,
+    "boolean": write_boolean,
+    "int": write_int,
+    "long": write_long,
+    "float": write_float,
+    "double": write_double,
+    "bytes": write_bytes,
+    "string": write_string,
+}
+
+# item type -> (struct format code, item size)
+PACKED_ITEMS = {
+    "double": ("d", 8),
+    "float": ("f", 4),
+}
+
+
+def get_block_count(buf, pos):
+    count, pos = read_long(buf, pos)
+    if count < 0:
+        count = -count
+        _, pos = read_long(buf, pos)  # block size in bytes
+    return count, pos
+
+
+def compile_packed_array_decoder(item_type):
+    code, size = PACKED_ITEMS[item_type]
+
+    def decode(buf, pos):
+        items = []
+        count, pos = get_block_count(buf, pos)
+        while count:
+            items.extend(unpack_from("<%d%s" % (count, code), buf, pos))
+            pos += count * size
+            count, pos = get_block_count(buf, pos)
+        return items, pos
+    return decode
+
+
+def compile_array_decoder(schema, names):
+    if schema.items.type in PACKED_ITEMS:
+        return compile_packed_array_decoder(schema.items.type)
+    decode_item = compile_decoder(schema.items, names)
+
+    def decode(buf, pos):
+        items = []
+        append = items.append
+        count, pos = get_block_count(buf, pos)
+        while count:
+            for _ in xrange(count):
+                item, pos = decode_item(buf, pos)
+                append(item)
+            count, pos = get_block_count(buf, pos)
+        return items, pos
+    return decode
+
+
+def compile_map_decoder(schema, names):
+    decode_value = compile_decoder(schema.values, names)
+
+    def decode(buf, pos):
+        d = {}
+        count, pos = get_block_count(buf, pos)
+        while count:
+            for _ in xrange(count):
+                k, pos = read_string(buf, pos)
+                d[k], pos = decode_value(buf, pos)
+            count, pos = get_block_count(buf, pos)
+        return d, pos
+    return decode
+
+
+def compile_union_decoder(schema, names):
+    branches = [compile_decoder(_, names) for _ in schema.schemas]
+
+    def decode(buf, pos):
+        idx, pos = read_long(buf, pos)
+        return branches[idx](buf, pos)
+    return decode
+
+
+def compile_record_decoder(schema, names):
+    # registered before compiling fields, which may refer to the record
+    fields = []
+
+    def decode(buf, pos):
+        rec = {}
+        for name, decode_field in fields:
+            rec[name], pos = decode_field(buf, pos)
+        return rec, pos
+    names[schema.fullname] = decode
+    fields.extend((f.name, compile_decoder(f.type, names))
+                  for f in schema.fields)
+    return decode
+
+
+def compile_enum_decoder(schema, names):
+    symbols = list(schema.symbols)
+
+    def decode(buf, pos):
+        idx, pos = read_long(buf, pos)
+        return symbols[idx], pos
+    return decode
+
+
+def compile_fixed_decoder(schema, names):
+    size = schema.size
+
+    def decode(buf, pos):
+        end = pos + size
+        return buf[pos: end].tobytes(), end
+    return decode
+
+
+COMPLEX_DECODERS = {
+    "record": compile_record_decoder,
+    "error": compile_record_decoder,
+    "array": compile_array_decoder,
+    "map": compile_map_decoder,
+    "union": compile_union_decoder,
+    "enum": compile_enum_decoder,
+    "fixed": compile_fixed_decoder,
+}
+
+
+def compile_decoder(schema, names=None):
+    """\
+    Compile a parsed schema into a decode(buf, pos) function.
+
+    names maps the full names of the named types compiled so far to
+    their decoders.
+    """
+    if names is None:
+        names = {}
+    t = schema.type
+    if t in PRIMITIVE_DECODERS:
+        return PRIMITIVE_DECODERS[t]
+    named = isinstance(schema, NamedSchema)
+    if named and schema.fullname in names:
+        return names[schema.fullname]
+    try:
+        compile_ = COMPLEX_DECODERS[t]
+    except KeyError:
+        raise UnsupportedSchema("unsupported type: %r" % (t,))
+    decode = compile_(schema, names)
+    if named:
+        names[schema.fullname] = decode
+    return decode
+
+
+def compile_packed_array_encoder(item_type):
+    code, _ = PACKED_ITEMS[item_type]
+
+    def encode(out, items):
+        n = len(items)
+        if n:
+            write_long(out, n)
+            out.extend(pack("<%d%s" % (n, code), *items))
+        out.append(0)
+    return encode
+
+
+def compile_array_encoder(schema, names):
+    if schema.items.type in PACKED_ITEMS:
+        return compile_packed_array_encoder(schema.items.type)
+    encode_item = compile_encoder(schema.items, names)
+
+    def encode(out, items):
+        if len(items):
+            write_long(out, len(items))
+            for item in items:
+                encode_item(out, item)
+        out.append(0)
+    return encode
+
+
+def compile_map_encoder(schema, names):
+    encode_value = compile_encoder(schema.values, names)
+
+    def encode(out, d):
+        if len(d):
+            write_long(out, len(d))
+            for k, v in d.iteritems():
+                write_string(out, k)
+                encode_value(out, v)
+        out.append(0)
+    return encode
+
+
+def compile_union_encoder(schema, names):
+    # like the generic writer, pick the last branch the datum is valid for
+    branches = [(i, s, compile_encoder(s, names))
+                for i, s in reversed(list(enumerate(schema.schemas)))]
+
+    def encode(out, datum):
+        for idx, s, encode_branch in branches:
+            if validate(s, datum):
+                write_long(out, idx)
+                return encode_branch(out, datum)
+        raise TypeError("%r does not match any union branch" % (datum,))
+    return encode
+
+
+def compile_record_encoder(schema, names):
+    # registered before compiling fields, which may refer to the record
+    fields = []
+
+    def encode(out, rec):
+        for name, encode_field in fields:
+            encode_field(out, rec.get(name))
+    names[schema.fullname] = encode
+    fields.extend((f.name, compile_encoder(f.type, names))
+                  for f in schema.fields)
+    return encode
+
+
+def compile_enum_encoder(schema, names):
+    indices = dict((s, i) for i, s in enumerate(schema.symbols))
+
+    def encode(out, symbol):
+        write_long(out, indices[symbol])
+    return encode
+
+
+def compile_fixed_encoder(schema, names):
+    size = schema.size
+
+    def encode(out, b):
+        if len(b) != size:
+            raise ValueError("expected %d bytes, got %d" % (size, len(b)))
+        out.extend(b)
+    return encode
+
+
+COMPLEX_ENCODERS = {
+    "record": compile_record_encoder,
+    "error": compile_record_encoder,
+    "array": compile_array_encoder,
+    "map": compile_map_encoder,
+    "union": compile_union_encoder,
+    "enum": compile_enum_encoder,
+    "fixed": compile_fixed_encoder,
+}
+
+
+def compile_encoder(schema, names=None):
+    """\
+    Compile a parsed schema into an encode(out, datum) function.
+
+    names maps the full names of the named types compiled so far to
+    their encoders.
+    """
+    if names is None:
+        names = {}
+    t = schema.type
+    if t in PRIMITIVE_ENCODERS:
+        return PRIMITIVE_ENCODERS[t]
+    named = isinstance(schema, NamedSchema)
+    if named and schema.fullname in names:
+        return names[schema.fullname]
+    try:
+        compile_ = COMPLEX_ENCODERS[t]
+    except KeyError:
+        raise UnsupportedSchema("unsupported type: %r" % (t,))
+    encode = compile_(schema, names)
+    if named:
+        names[schema.fullname] = encode
+    return encode
@@ -0,0 +1,278 @@
+# BEGIN_COPYRIGHT
+#
+# Copyright (C) 2017 Open Microscopy Environment:
+#   - University of Dundee
+#   - CRS4
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# END_COPYRIGHT
+
+"""\
+Block-level access to Avro object container files.
+
+Unlike a regular Avro file reader, this gives access to the position
+of each data block, so that records can be located and reached again
+with a seek, and allows BioImgPlane records to be read in two steps
+(metadata first, then pixel data), skipping the pixels of unwanted
+planes without decoding them.
+"""
+
+import os
+import struct
+import zlib
+from cStringIO import StringIO
+
+from avro.datafile import MAGIC, META_SCHEMA, SYNC_SIZE
+from avro.io import BinaryDecoder, DatumReader
+import avro.schema
+
+try:
+    import snappy
+except ImportError:
+    snappy = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CODEC_KEY = "avro.codec"
+SCHEMA_KEY = "avro.schema"
+
+# codec name -> module it requires
+CODECS = {
+    "null": None,
+    "deflate": zlib,
+    "snappy": snappy,
+    "zstandard": zstandard,
+}
+CODEC_ALIASES = {"zstd": "zstandard"}
+# codecs supported by the avro C library (and thus by pyavroc)
+NATIVE_CODECS = frozenset(["null", "deflate", "snappy"])
+
+
+def get_codec(name):
+    """\
+    Return the avro.codec name for name (which can be an alias).
+
+    Raise ValueError if the codec is unknown or its module is missing.
+    """
+    codec = CODEC_ALIASES.get(name, name)
+    if codec not in CODECS:
+        raise ValueError("unknown codec: %r" % (name,))
+    if codec != "null" and CODECS[codec] is None:
+        raise ValueError("%s codec requires the %s module" % (name, codec))
+    return codec
+
+
+def get_file_codec(f):
+    """\
+    Return the codec of the Avro container open as f.
+
+    The file position is restored after reading the header.
+    """
+    pos = f.tell()
+    try:
+        return ContainerReader(f).codec
+    finally:
+        f.seek(pos)
+
+
+def compress(codec, data):
+    if codec == "null":
+        return data
+    if codec == "deflate":
+        # raw deflate data, without the zlib header and checksum
+        return zlib.compress(data)[2:-4]
+    if codec == "snappy" and snappy is not None:
+        crc = zlib.crc32(data) & 0xffffffff
+        return snappy.compress(data) + struct.pack(">I", crc)
+    if codec == "zstandard" and zstandard is not None:
+        return zstandard.ZstdCompressor().compress(data)
+    raise ValueError("unsupported codec: %r" % (codec,))
+
+
+def decompress(codec, data):
+    if codec == "null":
+        return data
+    if codec == "deflate":
+        return zlib.decompress(data, -15)
+    if codec == "snappy" and snappy is not None:
+        return snappy.decompress(data[:-4])  # strip the CRC32 checksum
+    if codec == "zstandard" and zstandard is not None:
+        # frames written by other implementations may lack the content size
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    raise ValueError("unsupported codec: %r" % (codec,))
+
+
+class ContainerReader(object):
+
+    def __init__(self, f):
+        self.f = f
+        self.decoder = BinaryDecoder(f)
+        f.seek(0)
+        header = DatumReader().read_data(META_SCHEMA, META_SCHEMA,
+                                         self.decoder)
+        if header["magic"] != MAGIC:
+            raise ValueError("not an Avro container file")
+        self.meta = header["meta"]
+        self.sync = header["sync"]
+        self.codec = self.meta.get(CODEC_KEY, "null")
+        self.schema = avro.schema.parse(self.meta[SCHEMA_KEY])
+        self.data_offset = f.tell()
+        f.seek(0, os.SEEK_END)
+        self.size = f.tell()
+        f.seek(self.data_offset)
+
+    def iter_blocks(self, offset=None):
+        """\
+        Yield (offset, count, decoder) for each data block.
+
+        Records in the block must be read from the decoder before
+        advancing the iterator. For uncompressed containers, the decoder
+        reads directly from the file, so skipping data is just a seek.
+        """
+        if offset is None:
+            offset = self.data_offset
+        self.f.seek(offset)
+        while offset < self.size:
+            count = self.decoder.read_long()
+            size = self.decoder.read_long()
+            data_offset = self.f.tell()
+            if self.codec == "null":
+                decoder = self.decoder
+            else:
+                data = decompress(self.codec, self.f.read(size))
+                decoder = BinaryDecoder(StringIO(data))
+            yield offset, count, decoder
+            self.f.seek(data_offset + size)
+            if self.f.read(SYNC_SIZE) != self.sync:
+                raise ValueError("sync marker mismatch at %d" % offset)
+            offset = self.f.tell()
+
+    def iter_block_data(self, offset=None):
+        """\
+        Yield (offset, count, data) for each data block.
+
+        data is the block's (decompressed) content, i.e., the binary
+        encoding of its count records.
+        """
+        if offset is None:
+            offset = self.data_offset
+        while offset < self.size:
+            self.f.seek(offset)
+            count = self.decoder.read_long()
+            size = self.decoder.read_long()
+            data = decompress(self.codec, self.f.read(size))
+            if self.f.read(SYNC_SIZE) != self.sync:
+                raise ValueError("sync marker mismatch at %d" % offset)
+            next_offset = self.f.tell()
+            yield offset, count, data
+            offset = next_offset
+
+    def get_block(self, offset):
+        """\
+        Return (count, decoder) for the block at the given offset.
+        """
+        for _, count, decoder in self.iter_blocks(offset=offset):
+            return count, decoder
+        raise ValueError("no block at %d" % offset)
+
+
+class PlaneReader(object):
+    """\
+    Two-step reader for BioImgPlane records.
+
+    read_head returns a record without pixel_data['data']; the latter
+    must then be either loaded with read_data or skipped with skip_data.
+    The reader works with any schema where the pixel data bytes are the
+    last thing in the record.
+    """
+
+    def __init__(self, schema):
+        try:
+            pixel_field = schema.fields[-1]
+            data_field = pixel_field.type.fields[-1]
+        except (AttributeError, IndexError):
+            data_field = None
+        at_end = data_field is not None and (
+            (pixel_field.name, data_field.name) == ("pixel_data", "data")
+        )
+        if not at_end:
+            raise ValueError("pixel data must be at the end of the record")
+        self.fields = schema.fields[:-1]
+        self.pixel_fields = pixel_field.type.fields[:-1]
+        self.datum_reader = DatumReader()
+
+    def __read_fields(self, fields, decoder):
+        read = self.datum_reader.read_data
+        return dict((f.name, read(f.type, f.type, decoder)) for f in fields)
+
+    def read_head(self, decoder):
+        head = self.__read_fields(self.fields, decoder)
+        head["pixel_data"] = self.__read_fields(self.pixel_fields, decoder)
+        return head
+
+    def read_data(self, head, decoder):
+        head["pixel_data"]["data"] = decoder.read_bytes()
+        return head
+
+    def skip_data(self, decoder):
+        decoder.skip_bytes()
+
+    def read(self, decoder):
+        return self.read_data(self.read_head(decoder), decoder)
+
+    def skip(self, decoder):
+        self.read_head(decoder)
+        self.skip_data(decoder)
+
+
+def get_zct(head):
+    offsets = head["pixel_data"]["offsets"]
+    return tuple(offsets[head["dimension_order"].index(_)] for _ in "ZCT")
+
+
+def iter_plane_subset(f, zsubset=None, csubset=None, tsubset=None):
+    """\
+    Iterate over the BioImgPlane records in the given ZCT subsets.
+
+    Only the metadata of each record is decoded before applying the
+    filter: pixel data of unselected planes is skipped.
+    """
+    container = ContainerReader(f)
+    plane_reader = PlaneReader(container.schema)
+    for _, count, decoder in container.iter_blocks():
+        for _ in xrange(count):
+            head = plane_reader.read_head(decoder)
+            z, c, t = get_zct(head)
+            subsets = (z, zsubset), (c, csubset), (t, tsubset)
+            if any(s and v not in s for v, s in subsets):
+                plane_reader.skip_data(decoder)
+            else:
+                yield plane_reader.read_data(head, decoder)
+
+
+def read_first_head(f):
+    """\
+    Read the metadata of the first plane in a BioImgPlane container.
+
+    For uncompressed containers, this only reads a few hundred bytes,
+    regardless of the size of the plane.
+    """
+    container = ContainerReader(f)
+    plane_reader = PlaneReader(container.schema)
+    for _, count, decoder in container.iter_blocks():
+        if count > 0:
+            return plane_reader.read_head(decoder)
+    raise ValueError("no records found")
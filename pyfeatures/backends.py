@@ -0,0 +1,259 @@
+# BEGIN_COPYRIGHT
+#
+# Copyright (C) 2017 Open Microscopy Environment:
+#   - University of Dundee
+#   - CRS4
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# END_COPYRIGHT
+
+"""\
+Feature extraction backends.
+
+A backend computes a list of features, named as in WND-CHARM (see
+feature_names), for a stack of tiles:
+
+  names, values = backend.compute(tiles)
+
+where tiles is an array whose last two axes are the rows and columns
+of each tile (leading axes are flattened), names is the list of
+feature names and values is a (n_tiles, len(names)) float64 matrix.
+Backends with batch = True are vectorized over the whole stack; the
+others process one tile at a time. After the first call, version
+holds the version string to be stored in Signatures records and names
+the feature names (batch backends must set both on creation).
+
+Backends with sliding = True can also compute features for (i, j, h, w)
+windows of a whole plane, sharing work between overlapping windows:
+
+  names, values = backend.compute_windows(img_array, coords)
+
+Backends are looked up by name in a registry: alternative
+implementations can be added with register_backend and compared on
+the same input without changing the calc subcommand.
+"""
+
+import timeit
+from itertools import izip
+
+import numpy as np
+
+import pyfeatures.batch_features as batch_features
+from pyfeatures.feature_layout import get_feature_names
+from pyfeatures.feature_names import FEATURE_NAMES
+from pyfeatures.tiling import get_tile_stack
+
+BACKENDS = {}
+
+
+def register_backend(cls):
+    BACKENDS[cls.name] = cls
+    return cls
+
+
+def get_backend(name, **kwargs):
+    try:
+        cls = BACKENDS[name]
+    except KeyError:
+        raise ValueError("unknown backend: %r" % (name,))
+    return cls(**kwargs)
+
+
+def as_stack(tiles):
+    tiles = np.asarray(tiles)
+    if tiles.ndim < 2:
+        raise ValueError("tiles must be at least two-dimensional")
+    return tiles.reshape((-1,) + tiles.shape[-2:])
+
+
+class Backend(object):
+    """\
+    Base class for backends.
+
+    feature_names, if not None, restricts the features to be computed;
+    backends are free to ignore options that do not apply to them.
+    """
+
+    name = None
+    batch = False
+    sliding = False
+
+    def __init__(self, long=False, feature_names=None, cache=None):
+        self.long = long
+        self.feature_names = feature_names
+        self.cache = cache
+        self.version = None
+        self.names = None
+
+    def compute(self, tiles):
+        raise NotImplementedError
+
+
+@register_backend
+class WndcharmBackend(Backend):
+
+    name = "wndcharm"
+
+    def __init__(self, long=False, feature_names=None, cache=None):
+        super(WndcharmBackend, self).__init__(
+            long=long, feature_names=feature_names, cache=cache
+        )
+        # imported here, so that other backends work without wndcharm
+        import pyfeatures.feature_calc as feature_calc
+        self.feature_calc = feature_calc
+        self.matrix_pool = feature_calc.ImageMatrixPool()
+        self.feature_set = feature_calc.FeatureSet(
+            long=long, feature_names=feature_names
+        )
+
+    def compute(self, tiles):
+        tiles = as_stack(tiles)
+        names, rows = self.feature_names or [], []
+        for tile in tiles:
+            signatures = self.feature_calc.calc_tile_features(
+                tile, self.name, matrix_pool=self.matrix_pool,
+                cache=self.cache, feature_set=self.feature_set
+            )
+            names = list(signatures.feature_names)
+            rows.append(signatures.values)
+            self.version = signatures.feature_set_version
+        self.names = names
+        values = np.array(rows, dtype=np.float64).reshape(
+            len(tiles), len(names)
+        )
+        return names, values
+
+
+@register_backend
+class NumpyBackend(Backend):
+    """\
+    Vectorized implementations in batch_features.
+
+    Computes all supported families, or those needed for the requested
+    feature_names; requesting features in other families is an error.
+    """
+
+    name = "numpy"
+    batch = True
+    sliding = True
+
+    def __init__(self, long=False, feature_names=None, cache=None,
+                 families=None):
+        super(NumpyBackend, self).__init__(
+            long=long, feature_names=feature_names, cache=cache
+        )
+        if families is None:
+            families = batch_features.FAMILIES
+        batch_features.check_families(families)
+        if feature_names is not None:
+            requested = frozenset(feature_names)
+            families = [_ for _ in families if requested.intersection(
+                batch_features.get_family_names(_)
+            )]
+            unsupported = requested.difference(
+                batch_features.get_names(families)
+            )
+            if unsupported:
+                raise ValueError("no batch implementation for: %s" % (
+                    ", ".join(sorted(set(
+                        FEATURE_NAMES.get(_, (_,))[0] for _ in unsupported
+                    )))
+                ))
+        self.families = sorted(families)
+        self.version = self.name
+        self.names = batch_features.get_names(self.families)
+
+    def compute(self, tiles):
+        return batch_features.compute(tiles, self.families)
+
+    def compute_windows(self, img_array, coords):
+        return batch_features.compute_windows(img_array, coords,
+                                              self.families)
+
+
+@register_backend
+class StubBackend(Backend):
+    """\
+    Cheap, deterministic fake features, for testing.
+
+    Feature k of each tile is the sum of its pixels plus k. Computes
+    pixel intensity statistics unless feature_names is given.
+    """
+
+    name = "stub"
+    batch = True
+
+    def __init__(self, long=False, feature_names=None, cache=None):
+        if feature_names is None:
+            feature_names = get_feature_names(["pixel_intensity_statistics"])
+        super(StubBackend, self).__init__(
+            long=long, feature_names=feature_names, cache=cache
+        )
+        self.version = self.name
+        self.names = list(feature_names)
+
+    def compute(self, tiles):
+        x = batch_features.get_pixels(as_stack(tiles))
+        n = len(self.names)
+        values = x.sum(axis=1)[:, None] + np.arange(n, dtype=np.float64)
+        return self.names, values
+
+
+def benchmark(backends, tiles, repeat=3):
+    """\
+    Time each backend on the same tile stack.
+
+    Return a dictionary that maps backend names to the best time per
+    tile, in seconds, over repeat runs.
+    """
+    tiles = as_stack(tiles)
+    res = {}
+    for b in backends:
+        t = min(timeit.repeat(lambda: b.compute(tiles), repeat=repeat,
+                              number=1))
+        res[b.name] = t / max(len(tiles), 1)
+    return res
+
+
+def calc_batch_features(img_array, backend, w=None, h=None, dx=None,
+                        dy=None, ox=None, oy=None):
+    """\
+    Compute features with a batch backend for all tiles of gen_tiles.
+
+    Return (feature_names, values), where values is a dictionary that
+    maps each tile's (i, j) to its feature values. With a sliding
+    backend, all tiles are processed as windows of img_array; otherwise,
+    full-size tiles are processed as a single stack, partial ones as one
+    stack per shape.
+    """
+    tiles, coords, edge_coords = get_tile_stack(
+        img_array, w=w, h=h, dx=dx, dy=dy, ox=ox, oy=oy
+    )
+    if backend.sliding:
+        tile_h, tile_w = tiles.shape[-2:]
+        windows = [(i, j, tile_h, tile_w) for i, j in coords.tolist()]
+        windows.extend(edge_coords)
+        names, values = backend.compute_windows(img_array, windows)
+        return names, dict(izip(((_[0], _[1]) for _ in windows), values))
+    names, values = backend.compute(tiles)
+    res = dict(izip(map(tuple, coords.tolist()), values))
+    by_shape = {}
+    for i, j, tile_h, tile_w in edge_coords:
+        by_shape.setdefault((tile_h, tile_w), []).append((i, j))
+    for (tile_h, tile_w), pos in by_shape.iteritems():
+        edge_tiles = np.array([img_array[i: i + tile_h, j: j + tile_w]
+                               for i, j in pos])
+        names, values = backend.compute(edge_tiles)
+        res.update(izip(pos, values))
+    return names, res
@@ -0,0 +1,291 @@
+# BEGIN_COPYRIGHT
+#
+# Copyright (C) 2017 Open Microscopy Environment:
+#   - University of Dundee
+#   - CRS4
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# END_COPYRIGHT
+
+"""\
+Vectorized NumPy versions of cheap WND-CHARM feature families.
+
+Each function takes a stack of tiles, i.e., an array whose last two
+axes are the tile's rows and columns (such as the output of
+feature_calc.get_tile_stack), and returns an array with one row of
+feature values per tile, following the definitions in WND-CHARM's
+FeatureAlgorithms.cpp and ImageMatrix.cpp. Only the untransformed
+("()") variants are supported: transforms are computed by WND-CHARM.
+
+compute runs the functions on a stack in chunks of at most
+CHUNK_PIXELS pixels, so that the float64 copies they work on stay
+bounded. compute_windows does the same for (i, j, h, w) windows of a
+plane (such as the tiles of a sliding window), except that means,
+standard deviations and extrema are computed from whole-plane running
+sums and extrema (see sliding), whose cost does not grow with the
+overlap between windows.
+"""
+
+import numpy as np
+
+from pyfeatures.feature_names import FEATURE_NAMES
+from pyfeatures.sliding import SlidingWindowStats
+
+HIST_BINS = 3, 5, 7, 9
+# maximum number of pixels converted to float64 at once
+CHUNK_PIXELS = 1 << 22
+
+
+def get_pixels(tiles):
+    """\
+    Get tile pixels as a (n_tiles, n_pixels) float64 array.
+    """
+    tiles = np.asarray(tiles)
+    if tiles.ndim < 2:
+        raise ValueError("tiles must be at least two-dimensional")
+    n_pixels = tiles.shape[-2] * tiles.shape[-1]
+    return tiles.reshape(-1, n_pixels).astype(np.float64)
+
+
+def iter_chunks(tiles, max_pixels=None):
+    """\
+    Yield consecutive (n_tiles, h, w) chunks of a stack of tiles.
+
+    Each chunk has at most max_pixels (default: CHUNK_PIXELS) pixels,
+    but at least one tile.
+    Chunks of a three-dimensional stack are views; otherwise, only one
+    chunk at a time is copied, since merging the leading axes of a
+    strided stack (see feature_calc.get_tile_stack) makes a copy.
+    """
+    if max_pixels is None:
+        max_pixels = CHUNK_PIXELS
+    tiles = np.asarray(tiles)
+    if tiles.ndim < 2:
+        raise ValueError("tiles must be at least two-dimensional")
+    if tiles.ndim == 2:
+        tiles = tiles[None]
+    lead_shape = tiles.shape[:-2]
+    n_tiles = int(np.prod(lead_shape))
+    step = max(1, max_pixels // max(tiles.shape[-2] * tiles.shape[-1], 1))
+    for start in xrange(0, n_tiles, step):
+        stop = min(start + step, n_tiles)
+        if tiles.ndim == 3:
+            yield tiles[start: stop]
+        else:
+            yield tiles[np.unravel_index(np.arange(start, stop), lead_shape)]
+
+
+def iter_window_chunks(img_array, coords, max_pixels=None):
+    """\
+    Yield (rows, chunk) for the (i, j, h, w) windows of img_array.
+
+    Windows are grouped by shape: each chunk is a (len(rows), h, w)
+    stack of at most max_pixels pixels (but at least one window), where
+    rows are the positions of its windows in coords.
+    """
+    if max_pixels is None:
+        max_pixels = CHUNK_PIXELS
+    coords = np.asarray(coords, dtype=np.intp).reshape(-1, 4)
+    shapes = coords[:, 2:]
+    for h, w in set(map(tuple, shapes.tolist())):
+        rows = np.flatnonzero((shapes[:, 0] == h) & (shapes[:, 1] == w))
+        step = max(1, max_pixels // max(h * w, 1))
+        for start in xrange(0, len(rows), step):
+            sel = rows[start: start + step]
+            i = coords[sel, 0][:, None, None] + np.arange(h)[:, None]
+            j = coords[sel, 1][:, None, None] + np.arange(w)
+            yield sel, img_array[i, j]
+
+
+def get_medians(x):
+    """\
+    Upper median of each row of a (n_tiles, n_pixels) array.
+    """
+    n = x.shape[1]
+    return np.partition(x, n // 2, axis=1)[:, n // 2]
+
+
+def pixel_intensity_statistics(tiles):
+    """\
+    Mean, median, standard deviation, min and max of each tile.
+
+    As in WND-CHARM, the median is the upper middle element for an even
+    number of pixels and the standard deviation is the sample one.
+    """
+    x = get_pixels(tiles)
+    n = x.shape[1]
+    out = np.empty((len(x), 5))
+    out[:, 0] = x.mean(axis=1)
+    out[:, 1] = get_medians(x)
+    out[:, 2] = x.std(axis=1, ddof=1) if n > 1 else 0.
+    out[:, 3] = x.min(axis=1)
+    out[:, 4] = x.max(axis=1)
+    return out
+
+
+def multiscale_histograms(tiles):
+    """\
+    3, 5, 7 and 9-bin histograms over each tile's [min, max] range.
+
+    The 24 counts are normalized by their maximum.
+    """
+    x = get_pixels(tiles)
+    n_tiles = len(x)
+    mn = x.min(axis=1)[:, None]
+    mx = x.max(axis=1)[:, None]
+    offsets = np.arange(n_tiles)[:, None]
+    out = []
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for n_bins in HIST_BINS:
+            bins = np.floor((x - mn) * n_bins / (mx - mn))
+            bins[x == mx] = n_bins - 1
+            idx = (offsets * n_bins + bins.astype(np.intp)).ravel()
+            counts = np.bincount(idx, minlength=n_tiles * n_bins)
+            out.append(counts.reshape(n_tiles, n_bins))
+    out = np.hstack(out).astype(np.float64)
+    return out / out.max(axis=1)[:, None]
+
+
+def gini_coefficient(tiles):
+    """\
+    Gini coefficient of the positive pixels in each tile.
+
+    Defined as 0 for tiles with less than two positive pixels.
+    """
+    x = np.sort(get_pixels(tiles), axis=1)
+    n = x.shape[1]
+    pos = x > 0
+    count = pos.sum(axis=1)
+    total = np.where(pos, x, 0).sum(axis=1)
+    # positive pixels are the last count ones; rank them from 1
+    rank = np.arange(n) - (n - count)[:, None] + 1
+    weights = np.where(rank >= 1, 2. * rank - count[:, None] - 1, 0)
+    g = (weights * x).sum(axis=1)
+    out = np.zeros((len(x), 1))
+    ok = (count > 1) & (total > 0)
+    c = count[ok].astype(np.float64)
+    # g / (mean * count * (count - 1)), with mean = total / count
+    out[ok, 0] = g[ok] / (total[ok] * (c - 1))
+    return out
+
+
+def window_pixel_intensity_statistics(img_array, coords, stats):
+    """\
+    pixel_intensity_statistics for the (i, j, h, w) windows of img_array.
+
+    Only the medians are computed from the windows' pixels; the other
+    values come from stats, a SlidingWindowStats for img_array.
+    """
+    out = np.empty((len(coords), 5))
+    out[:, 0] = stats.mean(coords)
+    for rows, chunk in iter_window_chunks(img_array, coords):
+        out[rows, 1] = get_medians(get_pixels(chunk))
+    out[:, 2] = stats.std(coords, ddof=1)
+    out[:, 3] = stats.min(coords)
+    out[:, 4] = stats.max(coords)
+    return out
+
+
+# sub-vector name -> (WND-CHARM algorithm name, function)
+FAMILIES = {
+    "pixel_intensity_statistics": (
+        "Pixel Intensity Statistics", pixel_intensity_statistics
+    ),
+    "multiscale_histograms": ("Multiscale Histograms", multiscale_histograms),
+    "gini_coefficient": ("Gini Coefficient", gini_coefficient),
+}
+# sub-vector name -> function(img_array, coords, stats), for families
+# that have a faster implementation for the windows of a plane
+WINDOW_FAMILIES = {
+    "pixel_intensity_statistics": window_pixel_intensity_statistics,
+}
+
+
+def get_family_names(family):
+    """\
+    Get the WND-CHARM names of the features in a family, in order.
+    """
+    algorithm = FAMILIES[family][0]
+    prefix = "%s () [" % algorithm
+    names = [_ for _ in FEATURE_NAMES if _.startswith(prefix)]
+    return sorted(names, key=FEATURE_NAMES.get)
+
+
+def check_families(families):
+    unknown = set(families) - set(FAMILIES)
+    if unknown:
+        raise ValueError("no batch implementation for: %s" % ", ".join(
+            sorted(unknown)
+        ))
+
+
+def get_names(families):
+    """\
+    Get the feature names computed by compute(tiles, families), in order.
+    """
+    check_families(families)
+    names = []
+    for family in sorted(families):
+        names.extend(get_family_names(family))
+    return names
+
+
+def compute(tiles, families):
+    """\
+    Compute the given families (sub-vector names) for a stack of tiles.
+
+    Return (feature_names, values), where values has one row per tile.
+    The leading axes of tiles, if more than one, are flattened.
+    """
+    names = get_names(families)
+    funcs = [FAMILIES[_][1] for _ in sorted(families)]
+    chunks = []
+    for chunk in iter_chunks(tiles):
+        values = [f(chunk) for f in funcs]
+        chunks.append(np.hstack(values) if values else
+                      np.empty((len(chunk), 0)))
+    if not chunks:
+        return names, np.empty((0, len(names)))
+    return names, np.vstack(chunks)
+
+
+def compute_windows(img_array, coords, families):
+    """\
+    Compute the given families for the (i, j, h, w) windows of a plane.
+
+    Return (feature_names, values), where values has one row per window,
+    with the same values (up to rounding) as compute on a stack of the
+    windows.
+    """
+    names = get_names(families)
+    coords = np.asarray(coords, dtype=np.intp).reshape(-1, 4)
+    values = np.empty((len(coords), len(names)))
+    if not len(coords):
+        return names, values
+    stats = None
+    start = 0
+    for family in sorted(families):
+        stop = start + len(get_family_names(family))
+        if family in WINDOW_FAMILIES:
+            if stats is None:
+                stats = SlidingWindowStats(img_array)
+            values[:, start: stop] = WINDOW_FAMILIES[family](
+                img_array, coords, stats
+            )
+        else:
+            func = FAMILIES[family][1]
+            for rows, chunk in iter_window_chunks(img_array, coords):
+                values[rows, start: stop] = func(chunk)
+        start = stop
+    return names, values
@@ -25,8 +25,15 @@ import numpy as np
 
 
 class ArraySlice(object):
+    """\
+    N-dimensional array slice backed by an avro ArraySlice record.
 
-    def __init__(self, avro_record):
+    By default, data is a read-only view of the record's buffer, in the
+    record's byte order. With copy=True, it's a writable copy in native
+    byte order (the copy and the byte swap, if any, are done in one go).
+    """
+
+    def __init__(self, avro_record, copy=False):
         r = avro_record
         self.shape = r['shape']
         self.offsets = r['offsets']
@@ -36,7 +43,10 @@ class ArraySlice(object):
             '<' if r['little_endian'] else '>'
         )
         self.__check_size(r['data'], dtype)
-        self.data = np.fromstring(r['data'], dtype=dtype).reshape(r['deltas'])
+        data = np.frombuffer(r['data'], dtype=dtype)
+        if copy:
+            data = data.astype(dtype.newbyteorder('='))
+        self.data = data.reshape(r['deltas'])
 
     def __check_boundaries(self):
         n_dim = len(self.shape)
@@ -71,7 +81,7 @@ class BioImgPlane(object):
             v = avro_record['pixel_data'][k]
             v[0], v[1] = v[1], v[0]
 
-    def __init__(self, avro_record):
+    def __init__(self, avro_record, copy=False):
         r = avro_record
         self.indices = [
             r['dimension_order'].index(_) for _ in self.BASE_DIM_ORDER
@@ -83,11 +93,25 @@ class BioImgPlane(object):
         for k in 'name', 'img_path', 'dimension_order', 'series':
             setattr(self, k, r[k])
         self.__check_dim_order()
-        self.pixel_data = ArraySlice(r['pixel_data'])
+        # pixel data is decoded on first access (see the pixel_data
+        # property), so that planes can be filtered by z, c, t for free
+        self.__pixel_record = r['pixel_data']
+        self.__pixel_data = None
+        self.__copy = copy
         self.__check_is_plane()
-        self.z = self.pixel_data.offsets[self.i_z]
-        self.c = self.pixel_data.offsets[self.i_c]
-        self.t = self.pixel_data.offsets[self.i_t]
+        offsets = self.__pixel_record['offsets']
+        self.z = offsets[self.i_z]
+        self.c = offsets[self.i_c]
+        self.t = offsets[self.i_t]
+
+    @property
+    def pixel_data(self):
+        if self.__pixel_data is None:
+            self.__pixel_data = ArraySlice(
+                self.__pixel_record, copy=self.__copy
+            )
+            self.__pixel_record = None
+        return self.__pixel_data
 
     def __check_dim_order(self):
         if ((len(self.dimension_order) != len(self.BASE_DIM_ORDER) or
@@ -96,10 +120,22 @@ class BioImgPlane(object):
                              self.BASE_DIM_ORDER)
 
     def __check_is_plane(self):
-        dz, dt, dc = [self.pixel_data.deltas[_] for _ in self.indices[2:]]
+        deltas = self.__pixel_record['deltas']
+        dz, dt, dc = [deltas[_] for _ in self.indices[2:]]
         if not(dz == dt == dc == 1):
             raise ValueError('data is not flat along the zct dimensions')
 
+    def get_xy_shape(self):
+        """\
+        Get the shape of the array returned by get_xy, without decoding.
+        """
+        if self.__pixel_data is None:
+            shape = self.__pixel_record['shape']
+            deltas = self.__pixel_record['deltas']
+        else:
+            shape, deltas = self.pixel_data.shape, self.pixel_data.deltas
+        return tuple(min(shape[_], deltas[_]) for _ in (self.i_y, self.i_x))
+
     def get_xy(self):
         idx = [None] * len(self.dimension_order)
         for i in self.indices[2:]:
@@ -0,0 +1,145 @@
+# BEGIN_COPYRIGHT
+#
+# Copyright (C) 2017 Open Microscopy Environment:
+#   - University of Dundee
+#   - CRS4
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# END_COPYRIGHT
+
+"""\
+Checkpoint journals for resumable feature calculation.
+
+The journal is a text file with one line per completed work unit
+("u Z C T X Y") and one line per checkpoint ("s OFFSET"), where OFFSET
+is the size of the output Avro container right after a sync marker
+has been written. Only units followed by a checkpoint line count as
+committed: anything after the last one (including a partially written
+line) is ignored when the journal is loaded.
+
+The first line ("p JSON") holds the parameters of the run that wrote
+the journal (input series, tiling, feature options, etc.), so that a
+run is not resumed with different ones.
+"""
+
+import json
+import os
+
+JOURNAL_EXT = ".journal"
+
+
+def get_journal_fn(out_fn):
+    return "%s%s" % (out_fn, JOURNAL_EXT)
+
+
+def load_journal(fn):
+    """\
+    Return (committed_units, offset) for the given journal.
+
+    committed_units is a set of (z, c, t, x, y) tuples; offset is the
+    output size at the last checkpoint, or None if there is none.
+    """
+    committed, pending = set(), []
+    offset = None
+    if not os.path.isfile(fn):
+        return committed, offset
+    with open(fn) as f:
+        for line in f:
+            if not line.endswith("\n"):
+                break
+            fields = line.split()
+            try:
+                if fields[0] == "p":
+                    continue
+                if fields[0] == "u" and len(fields) == 6:
+                    pending.append(tuple(int(_) for _ in fields[1:]))
+                elif fields[0] == "s" and len(fields) == 2:
+                    offset = int(fields[1])
+                    committed.update(pending)
+                    pending = []
+                else:
+                    break
+            except (IndexError, ValueError):
+                break
+    return committed, offset
+
+
+def load_params(fn):
+    """\
+    Return the run parameters stored in the given journal, or None if
+    there are none.
+    """
+    try:
+        with open(fn) as f:
+            line = f.readline()
+    except IOError:
+        return None
+    if not line.startswith("p ") or not line.endswith("\n"):
+        return None
+    try:
+        return json.loads(line[2:])
+    except ValueError:
+        return None
+
+
+def get_mismatches(params, saved_params):
+    """\
+    Return the names of the parameters whose values differ from the
+    ones loaded from a journal, sorted.
+    """
+    params = json.loads(json.dumps(params))  # e.g., str -> unicode
+    return sorted(k for k in set(params) | set(saved_params)
+                  if params.get(k) != saved_params.get(k))
+
+
+class Journal(object):
+    """\
+    Journal writer. The journal file is rewritten: when resuming, pass
+    the units committed in the previous run and the corresponding
+    offset, which are written back as a single checkpoint.
+
+    The new journal is written to a temporary file in the same
+    directory, which then replaces the old one, so that a crash while
+    rewriting it does not lose the committed units.
+
+    params, if given, must be a JSON-serializable dictionary.
+    """
+
+    def __init__(self, fn, params=None, committed=None, offset=None):
+        tmp_fn = "%s.tmp" % fn
+        self.f = open(tmp_fn, "w")
+        self.pending = []
+        if params is not None:
+            self.f.write("p %s\n" % json.dumps(params, sort_keys=True))
+        if offset is not None:
+            self.pending.extend(sorted(committed or ()))
+            self.commit(offset)
+        else:
+            self.f.flush()
+            os.fsync(self.f.fileno())
+        os.rename(tmp_fn, fn)
+
+    def add(self, unit):
+        self.pending.append(unit)
+
+    def commit(self, offset):
+        for unit in self.pending:
+            self.f.write("u %d %d %d %d %d\n" % unit)
+        self.f.write("s %d\n" % offset)
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        self.pending = []
+
+    def close(self):
+        self.f.close()
@@ -0,0 +1,150 @@
+# BEGIN_COPYRIGHT
+#
+# Copyright (C) 2017 Open Microscopy Environment:
+#   - University of Dundee
+#   - CRS4
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# END_COPYRIGHT
+
+"""\
+Columnar storage for Signatures records.
+
+A columnar container is a directory holding one raw float64 matrix
+file per feature sub-vector (one row per record), a .npy structured
+array with the non-feature fields (name, img_path, z, c, t, x, y, ...)
+and a JSON layout file with the number of records and the width of
+each sub-vector. Sub-vectors can be memory-mapped and sliced without
+decoding the other ones. Tiles skipped as background (see tile_filter)
+are stored as rows of NaNs.
+"""
+
+import json
+import os
+
+import numpy as np
+
+from pyfeatures.feature_layout import is_skipped
+
+LAYOUT_BN = "layout.json"
+META_BN = "meta.npy"
+DATA_EXT = ".f8"
+DTYPE = np.dtype("<f8")
+STR_KEYS = "name", "img_path", "version"
+INT_KEYS = "series", "z", "c", "t", "x", "y", "w", "h"
+
+
+class ColumnarWriter(object):
+
+    def __init__(self, path):
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        self.path = path
+        self.widths = None
+        self.files = {}
+        self.meta = dict((k, []) for k in STR_KEYS + INT_KEYS)
+        self.n_records = 0
+        # skipped records seen before the widths are known
+        self.pending = []
+
+    def __open(self, rec):
+        self.widths = {}
+        for k, v in rec.iteritems():
+            if isinstance(v, list):
+                self.widths[k] = len(v)
+                fn = os.path.join(self.path, "%s%s" % (k, DATA_EXT))
+                self.files[k] = open(fn, "wb")
+
+    def __write_meta(self, rec):
+        for k, v in self.meta.iteritems():
+            v.append(rec[k])
+        self.n_records += 1
+
+    def write(self, rec):
+        if is_skipped(rec):
+            if self.widths is None:
+                self.pending.append(rec)
+                return
+            for k, fo in self.files.iteritems():
+                np.full(self.widths[k], np.nan, dtype=DTYPE).tofile(fo)
+            self.__write_meta(rec)
+            return
+        if self.widths is None:
+            self.__open(rec)
+            for r in self.pending:
+                self.write(r)
+            self.pending = []
+        for k, fo in self.files.iteritems():
+            v = rec[k]
+            if len(v) != self.widths[k]:
+                raise ValueError("%s: expected %d values, got %d" % (
+                    k, self.widths[k], len(v)
+                ))
+            np.asarray(v, dtype=DTYPE).tofile(fo)
+        self.__write_meta(rec)
+
+    def close(self):
+        for r in self.pending:
+            self.__write_meta(r)
+        self.pending = []
+        for fo in self.files.itervalues():
+            fo.close()
+        fields = [(k, "S%d" % max([1] + map(len, self.meta[k])))
+                  for k in STR_KEYS]
+        fields.extend((k, "<i4") for k in INT_KEYS)
+        meta = np.empty(self.n_records, dtype=fields)
+        for k, v in self.meta.iteritems():
+            meta[k] = v
+        np.save(os.path.join(self.path, META_BN), meta)
+        layout = {
+            "n_records": self.n_records,
+            "dtype": DTYPE.str,
+            "columns": self.widths or {},
+        }
+        with open(os.path.join(self.path, LAYOUT_BN), "w") as fo:
+            json.dump(layout, fo, sort_keys=True, indent=1)
+
+
+class ColumnarReader(object):
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, LAYOUT_BN)) as f:
+            layout = json.load(f)
+        self.n_records = layout["n_records"]
+        self.dtype = np.dtype(str(layout["dtype"]))
+        self.widths = dict((str(k), v) for k, v in
+                           layout["columns"].iteritems())
+        self.meta = np.load(os.path.join(path, META_BN), mmap_mode="r")
+
+    def __len__(self):
+        return self.n_records
+
+    @property
+    def columns(self):
+        return sorted(self.widths)
+
+    def get(self, name):
+        """\
+        Get a read-only (n_records, width) view of the given sub-vector.
+        """
+        shape = self.n_records, self.widths[name]
+        if 0 in shape:
+            return np.empty(shape, dtype=self.dtype)
+        fn = os.path.join(self.path, "%s%s" % (name, DATA_EXT))
+        return np.memmap(fn, dtype=self.dtype, mode="r", shape=shape)
+
+
+def is_columnar(path):
+    return os.path.isfile(os.path.join(path, LAYOUT_BN))
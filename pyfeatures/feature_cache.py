@@ -0,0 +1,189 @@
+# BEGIN_COPYRIGHT
+#
+# Copyright (C) 2017 Open Microscopy Environment:
+#   - University of Dundee
+#   - CRS4
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# END_COPYRIGHT
+
+"""\
+On-disk, content-addressed cache of tile feature vectors.
+
+Entries are keyed by a hash of the tile's pixels, dtype and shape,
+together with the feature set options and the WND-CHARM version, so
+tiles with the same content get the same features regardless of the
+image or the position they come from. Each entry is a .npy file with
+the feature values; feature names are stored once per distinct list.
+
+The cache is bounded in size: when it grows beyond the limit, least
+recently used entries (by modification time, which is updated on each
+hit) are removed until it is back under a low-water mark, so that the
+cache directory is not scanned again on every following miss. Files
+are written to a temporary name and renamed, so the cache can be
+shared by concurrent processes.
+"""
+
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+
+from pyfeatures.feature_layout import TileSignatures
+
+ENTRY_EXT = ".npy"
+NAMES_EXT = ".names"
+DEFAULT_MAX_SIZE = 1 << 30
+# eviction brings the size down to this fraction of the maximum
+LOW_WATER = 0.9
+
+
+def get_options_id(long, version, feature_names=None):
+    """\
+    Get the part of the cache key that depends on the feature set
+    options, which are the same for all tiles in a run: compute it once
+    and pass it to get_key.
+    """
+    h = hashlib.sha1()
+    h.update("%r\t%s\t" % (bool(long), version))
+    if feature_names is not None:
+        h.update("\n".join(feature_names))
+    return h.hexdigest()
+
+
+def get_key(tile, options_id):
+    tile = np.ascontiguousarray(tile)
+    h = hashlib.sha1()
+    h.update("%s\t%r\t%s\t" % (tile.dtype.str, tile.shape, options_id))
+    h.update(tile.data)
+    return h.hexdigest()
+
+
+def get_names_id(feature_names):
+    return hashlib.sha1("\n".join(feature_names)).hexdigest()
+
+
+class FeatureCache(object):
+
+    def __init__(self, path, max_size=DEFAULT_MAX_SIZE, low_water=LOW_WATER):
+        if not 0 < low_water <= 1:
+            raise ValueError("low_water must be in (0, 1]")
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        self.path = path
+        self.max_size = max_size
+        self.low_water = low_water
+        self.names = {}
+        self.size = sum(s for _, _, s in self.__list_entries())
+        self.hits = self.misses = 0
+
+    def __entry_fn(self, key):
+        return os.path.join(self.path, "%s%s" % (key, ENTRY_EXT))
+
+    def __names_fn(self, names_id):
+        return os.path.join(self.path, "%s%s" % (names_id, NAMES_EXT))
+
+    def __list_entries(self):
+        entries = []
+        for bn in os.listdir(self.path):
+            if not bn.endswith(ENTRY_EXT):
+                continue
+            fn = os.path.join(self.path, bn)
+            try:
+                st = os.stat(fn)
+            except OSError:
+                continue  # removed by another process
+            entries.append((st.st_mtime, fn, st.st_size))
+        return entries
+
+    def __write(self, fn, write_func):
+        fd, tmp_fn = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fo:
+                write_func(fo)
+            os.rename(tmp_fn, fn)
+        except BaseException:
+            try:
+                os.remove(tmp_fn)
+            except OSError:
+                pass
+            raise
+        return os.path.getsize(fn)
+
+    def __get_names(self, names_id):
+        try:
+            return self.names[names_id]
+        except KeyError:
+            pass
+        with open(self.__names_fn(names_id)) as f:
+            names = f.read().split("\n")
+        self.names[names_id] = names
+        return names
+
+    def __put_names(self, names):
+        names_id = get_names_id(names)
+        if names_id not in self.names:
+            fn = self.__names_fn(names_id)
+            if not os.path.isfile(fn):
+                self.__write(fn, lambda fo: fo.write("\n".join(names)))
+            self.names[names_id] = list(names)
+        return names_id
+
+    def get(self, key, basename):
+        """\
+        Return a TileSignatures object for key, or None on a miss.
+        """
+        fn = self.__entry_fn(key)
+        try:
+            with open(fn, "rb") as f:
+                version, names_id = f.readline().split()
+                values = np.load(f)
+            names = self.__get_names(names_id)
+            os.utime(fn, None)
+        except (IOError, OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return TileSignatures(basename, version, names, values)
+
+    def put(self, key, signatures):
+        names_id = self.__put_names(signatures.feature_names)
+
+        def write(fo):
+            fo.write("%s %s\n" % (signatures.feature_set_version, names_id))
+            np.save(fo, np.asarray(signatures.values, dtype=np.float64))
+        self.size += self.__write(self.__entry_fn(key), write)
+        if self.size > self.max_size:
+            self.evict()
+
+    def evict(self):
+        """\
+        Remove least recently used entries until the cache size is not
+        greater than low_water * max_size.
+
+        The total size is recomputed from the directory, since other
+        processes may have added or removed entries.
+        """
+        entries = sorted(self.__list_entries())
+        self.size = sum(s for _, _, s in entries)
+        target = int(self.low_water * self.max_size)
+        for _, fn, s in entries:
+            if self.size <= target:
+                break
+            try:
+                os.remove(fn)
+            except OSError:
+                pass
+            self.size -= s
@@ -18,73 +18,283 @@
 #
 # END_COPYRIGHT
 
-from itertools import izip
+from collections import OrderedDict
 
+import numpy as np
+import wndcharm
 from wndcharm.FeatureVector import FeatureVector
 from wndcharm.PyImageMatrix import PyImageMatrix
 
-from pyfeatures.feature_names import FEATURE_NAMES
+import pyfeatures.batch_features as batch_features
+from pyfeatures.backends import (  # noqa: F401 (re-exported)
+    NumpyBackend, calc_batch_features
+)
+from pyfeatures.feature_cache import get_key, get_options_id
+from pyfeatures.feature_layout import (  # noqa: F401 (re-exported)
+    SUBVECTOR_NAMES, FeatureLayout, TileSignatures, get_feature_names,
+    LayoutCache, get_layout, get_skipped_signatures, to_avro
+)
+from pyfeatures.tiling import (  # noqa: F401 (re-exported)
+    gen_tile_coords, gen_tiles, get_tile_stack, get_tiling
+)
+
+WNDCHARM_VERSION = getattr(wndcharm, "__version__", "unknown")
+
+_DEFAULTS = {}
+_SPLITS = {}
+
+
+def new_image_matrix(shape):
+    image_matrix = PyImageMatrix()
+    image_matrix.allocate(shape[1], shape[0])
+    return image_matrix
 
 
 def get_image_matrix(img_array):
     if len(img_array.shape) != 2:
         raise ValueError("array must be two-dimensional")
-    image_matrix = PyImageMatrix()
-    image_matrix.allocate(img_array.shape[1], img_array.shape[0])
+    image_matrix = new_image_matrix(img_array.shape)
     numpy_matrix = image_matrix.as_ndarray()
     numpy_matrix[:] = img_array
     return image_matrix
 
 
-def gen_tiles(img_array, w=None, h=None, dx=None, dy=None, ox=None, oy=None):
-    if len(img_array.shape) != 2:
-        raise ValueError("array must be two-dimensional")
-    H, W = img_array.shape
-    if w is None or w > W:
-        w = W
-    if h is None or h > H:
-        h = H
-    if dx is None:
-        dx = w
-    if dy is None:
-        dy = h
-    if ox is None:
-        ox = 0
-    if oy is None:
-        oy = 0
-    if w < 1 or h < 1:
-        raise ValueError("smallest tile size is 1 x 1")
-    if dx < 1 or dy < 1:
-        raise ValueError("smallest distance between tiles is 1")
-    # min(...): a maximum of one partial tile in that dimension
-    for i in xrange(oy, min(H, H - h + dy), dy):
-        for j in xrange(ox, min(W, W - w + dx), dx):
-            yield i, j, img_array[i: i + h, j: j + w]
+class ImageMatrixPool(object):
+    """\
+    Recycle PyImageMatrix objects across tiles with the same shape.
+
+    The first shape seen is assumed to be the one of regular tiles and
+    its matrix is kept for the pool's lifetime; other shapes (partial
+    tiles at the right and bottom edges) are kept in a small LRU cache.
+    Matrices are overwritten by subsequent requests, so the one returned
+    by get() is only valid until the next call.
+    """
+
+    def __init__(self, max_edge_shapes=3):
+        self.max_edge_shapes = max_edge_shapes
+        self.main_shape = None
+        self.main_matrix = None
+        self.edge_matrices = OrderedDict()
+
+    def __get_matrix(self, shape):
+        if self.main_shape is None:
+            self.main_shape = shape
+        if shape == self.main_shape:
+            if self.main_matrix is None:
+                self.main_matrix = new_image_matrix(shape)
+            return self.main_matrix
+        try:
+            image_matrix = self.edge_matrices.pop(shape)
+        except KeyError:
+            image_matrix = new_image_matrix(shape)
+            while len(self.edge_matrices) >= self.max_edge_shapes:
+                self.edge_matrices.popitem(last=False)
+        self.edge_matrices[shape] = image_matrix
+        return image_matrix
+
+    def get(self, img_array):
+        if len(img_array.shape) != 2:
+            raise ValueError("array must be two-dimensional")
+        image_matrix = self.__get_matrix(img_array.shape)
+        image_matrix.as_ndarray()[:] = img_array
+        return image_matrix
+
+
+def get_default_features(long=False):
+    """\
+    Get (feature_set_version, feature_names) for the default feature set.
+
+    WND-CHARM is run once (per process) on a small synthetic tile.
+    """
+    try:
+        return _DEFAULTS[long]
+    except KeyError:
+        pass
+    fv = FeatureVector(basename="default", long=long)
+    fv.original_px_plane = get_image_matrix(
+        (np.arange(32 * 32) % 251).reshape(32, 32)
+    )
+    fv.GenerateFeatures(write_to_disk=False)
+    _DEFAULTS[long] = fv.feature_set_version, list(fv.feature_names)
+    return _DEFAULTS[long]
+
+
+def split_features(batch_families, long=False, feature_names=None):
+    """\
+    Split the requested features between WND-CHARM and the NumPy batch
+    implementations in the batch_features module.
+
+    Return (wndcharm_names, families), where families are the batch
+    families that are actually requested (all of them are, if
+    feature_names is None).
+    """
+    key = tuple(sorted(batch_families)), long, (
+        None if feature_names is None else tuple(feature_names)
+    )
+    try:
+        return _SPLITS[key]
+    except KeyError:
+        pass
+    batch_features.check_families(batch_families)
+    if feature_names is None:
+        feature_names = get_default_features(long)[1]
+    requested = frozenset(feature_names)
+    families = [_ for _ in sorted(batch_families) if
+                requested.intersection(batch_features.get_family_names(_))]
+    batch_names = frozenset(batch_features.get_names(families))
+    wndcharm_names = [_ for _ in feature_names if _ not in batch_names]
+    _SPLITS[key] = wndcharm_names, families
+    return _SPLITS[key]
+
+
+class FeatureSet(LayoutCache):
+    """\
+    Feature options shared by all tiles of a run.
+
+    Everything derived from the options alone (the split between
+    WND-CHARM and NumPy, the cache key prefix and the Signatures record
+    layout) is computed once here, rather than for each tile from the
+    (thousands of) feature names. See calc_tile_features for the
+    meaning of the options.
+    """
+
+    def __init__(self, long=False, feature_names=None, batch_families=None):
+        super(FeatureSet, self).__init__()
+        self.long = long
+        self.feature_names = feature_names
+        self.batch_families = batch_families
+        self.wndcharm_names, self.families = feature_names, []
+        if batch_families:
+            self.wndcharm_names, self.families = split_features(
+                batch_families, long=long, feature_names=feature_names
+            )
+        self.batch_names = batch_features.get_names(self.families)
+        self.cache_id = get_options_id(long, WNDCHARM_VERSION,
+                                       feature_names=self.wndcharm_names)
+
+
+def calc_tile_features(tile, tag, i=0, j=0, long=False, matrix_pool=None,
+                       cache=None, feature_names=None, batch_families=None,
+                       batch_values=None, feature_set=None):
+    """\
+    Compute features for a single tile.
+
+    If a FeatureCache is given, it's looked up (by tile content) before
+    running WND-CHARM, and updated with the new features on a miss. If
+    feature_names is given, only those features are computed (see
+    get_feature_names). Features in batch_families are computed with
+    NumPy instead of WND-CHARM (see split_features); batch_values, if
+    given, must hold their values for this tile (e.g., as computed by
+    calc_batch_features).
+
+    When processing many tiles, pass a FeatureSet instead of long,
+    feature_names and batch_families.
+    """
+    if feature_set is None:
+        feature_set = FeatureSet(long=long, feature_names=feature_names,
+                                 batch_families=batch_families)
+    long = feature_set.long
+    feature_names = feature_set.wndcharm_names
+    batch_names = feature_set.batch_names
+    if feature_set.families and batch_values is None:
+        batch_values = batch_features.compute(
+            tile[None], feature_set.families
+        )[1][0]
+    signatures = None
+    if feature_set.batch_families and not feature_names:
+        # nothing left for WND-CHARM (an empty list would mean "all")
+        version = get_default_features(long)[0]
+        signatures = TileSignatures(tag, version, [], np.empty(0))
+    if signatures is None and cache is not None:
+        key = get_key(tile, feature_set.cache_id)
+        signatures = cache.get(key, tag)
+    if signatures is None:
+        signatures = FeatureVector(basename=tag, long=long,
+                                   feature_names=feature_names)
+        if matrix_pool is None:
+            signatures.original_px_plane = get_image_matrix(tile)
+        else:
+            signatures.original_px_plane = matrix_pool.get(tile)
+        signatures.GenerateFeatures(write_to_disk=False)
+        if matrix_pool is not None:
+            # the matrix will be overwritten by the next tile
+            signatures.original_px_plane = None
+        if cache is not None:
+            cache.put(key, signatures)
+    if batch_names:
+        signatures.feature_names = list(signatures.feature_names) + \
+            batch_names
+        signatures.values = np.concatenate((signatures.values, batch_values))
+    signatures.x, signatures.y = j, i
+    signatures.h, signatures.w = tile.shape
+    return signatures
+
+
+def calc_backend_features(img_array, tag, backend, w=None, h=None,
+                          dx=None, dy=None, ox=None, oy=None, skip=None):
+    """\
+    Same as calc_features, but compute all features with a backend.
+
+    Yield a TileSignatures object for each tile. Tiles whose (i, j) is
+    in skip get a placeholder (see get_skipped_signatures).
+    """
+    tiling = dict(w=w, h=h, dx=dx, dy=dy, ox=ox, oy=oy)
+    skip = skip or set()
+    if backend.batch:
+        names, values = calc_batch_features(img_array, backend, **tiling)
+    for i, j, tile in gen_tiles(img_array, **tiling):
+        th, tw = tile.shape
+        if (i, j) in skip:
+            yield get_skipped_signatures(tag, x=j, y=i, w=tw, h=th)
+            continue
+        if backend.batch:
+            tile_values = values[(i, j)]
+        else:
+            names, tile_values = backend.compute(tile)
+            tile_values = tile_values[0]
+        yield TileSignatures(tag, backend.version, names, tile_values,
+                             x=j, y=i, w=tw, h=th)
 
 
 def calc_features(img_array, tag, long=False, w=None, h=None,
-                  dx=None, dy=None, ox=None, oy=None):
+                  dx=None, dy=None, ox=None, oy=None, cache=None,
+                  feature_names=None, batch_families=None, backend=None,
+                  tile_filter=None):
+    """\
+    Compute features for all tiles of img_array (see gen_tiles).
+
+    By default, features are computed with WND-CHARM (except for those
+    in batch_families, see calc_tile_features). If backend is given,
+    all features are computed with it instead. If a TileFilter is
+    given, tiles it detects as background are not processed: a
+    placeholder is yielded for them (see get_skipped_signatures).
+    """
     if len(img_array.shape) != 2:
         raise ValueError("array must be two-dimensional")
-    for i, j, tile in gen_tiles(
-            img_array, w=w, h=h, dx=dx, dy=dy, ox=ox, oy=oy):
-        signatures = FeatureVector(basename=tag, long=long)
-        signatures.original_px_plane = get_image_matrix(tile)
-        signatures.GenerateFeatures(write_to_disk=False)
-        signatures.x, signatures.y = j, i
-        signatures.h, signatures.w = tile.shape
-        yield signatures
-
-
-def to_avro(signatures):
-    rec = dict((_[0], []) for _ in FEATURE_NAMES.itervalues())
-    for fname, value in izip(signatures.feature_names, signatures.values):
-        vname, idx = FEATURE_NAMES[fname]
-        rec[vname].append((idx, value))
-    for vname, tuples in rec.iteritems():
-        rec[vname] = [_[1] for _ in sorted(tuples)]
-    rec["version"] = signatures.feature_set_version
-    rec["name"] = signatures.basename
-    for k in "x", "y", "w", "h":
-        rec[k] = getattr(signatures, k)
-    return rec
+    tiling = dict(w=w, h=h, dx=dx, dy=dy, ox=ox, oy=oy)
+    skip = set()
+    if tile_filter is not None:
+        skip = tile_filter.get_background(
+            img_array, gen_tile_coords(*img_array.shape, **tiling)
+        )
+    if backend is not None:
+        for signatures in calc_backend_features(img_array, tag, backend,
+                                                skip=skip, **tiling):
+            yield signatures
+        return
+    matrix_pool = ImageMatrixPool()
+    feature_set = FeatureSet(long=long, feature_names=feature_names,
+                             batch_families=batch_families)
+    batch = {}
+    if feature_set.families:
+        _, batch = calc_batch_features(
+            img_array, NumpyBackend(families=feature_set.families), **tiling
+        )
+    for i, j, tile in gen_tiles(img_array, **tiling):
+        if (i, j) in skip:
+            th, tw = tile.shape
+            yield get_skipped_signatures(tag, x=j, y=i, w=tw, h=th)
+            continue
+        yield calc_tile_features(tile, tag, i=i, j=j, matrix_pool=matrix_pool,
+                                 cache=cache, batch_values=batch.get((i, j)),
+                                 feature_set=feature_set)
@@ -0,0 +1,176 @@
+# BEGIN_COPYRIGHT
+#
+# Copyright (C) 2017 Open Microscopy Environment:
+#   - University of Dundee
+#   - CRS4
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# END_COPYRIGHT
+
+"""\
+Mapping of flat feature vectors to Signatures records.
+
+Nothing here depends on WND-CHARM: records can be built from the
+output of any feature extraction backend, as long as features are
+named as in WND-CHARM (see feature_names).
+"""
+
+import numpy as np
+
+from pyfeatures.feature_names import FEATURE_NAMES
+
+SUBVECTOR_NAMES = frozenset(_[0] for _ in FEATURE_NAMES.itervalues())
+# version of records for tiles skipped as background (no features)
+SKIPPED_VERSION = "skipped"
+
+_LAYOUTS = {}
+
+
+class TileSignatures(object):
+    """\
+    Feature values for a tile.
+
+    Exposes the FeatureVector attributes used by to_avro, so it can
+    stand in for one, e.g., for features restored from a cache or
+    computed by a backend other than WND-CHARM.
+    """
+
+    def __init__(self, basename, feature_set_version, feature_names,
+                 values, x=0, y=0, w=0, h=0):
+        self.basename = basename
+        self.feature_set_version = feature_set_version
+        self.feature_names = feature_names
+        self.values = values
+        self.x, self.y, self.w, self.h = x, y, w, h
+
+
+def get_skipped_signatures(basename, x=0, y=0, w=0, h=0):
+    """\
+    Get a placeholder for a tile whose features have not been computed.
+
+    The corresponding record has SKIPPED_VERSION as its version and
+    empty feature arrays.
+    """
+    return TileSignatures(basename, SKIPPED_VERSION, [], np.empty(0),
+                          x=x, y=y, w=w, h=h)
+
+
+def is_skipped(rec):
+    return rec["version"] == SKIPPED_VERSION
+
+
+def get_feature_names(subvector_names):
+    """\
+    Get the WND-CHARM names of the features in the given sub-vectors.
+
+    Passing these to FeatureVector restricts computation to the
+    algorithms and transforms needed by the selected sub-vectors.
+    """
+    subvector_names = set(subvector_names)
+    unknown = subvector_names - SUBVECTOR_NAMES
+    if unknown:
+        raise ValueError("unknown sub-vector(s): %s" % ", ".join(
+            sorted(unknown)
+        ))
+    return sorted((fname for fname, (vname, _) in FEATURE_NAMES.iteritems()
+                   if vname in subvector_names), key=FEATURE_NAMES.get)
+
+
+class FeatureLayout(object):
+    """\
+    Map flat WND-CHARM feature vectors to Signatures sub-vectors.
+
+    The layout depends only on the order of feature names, which is
+    fixed for a given feature set: it is computed once, after which
+    splitting a feature vector takes a single fancy indexing operation
+    plus one list slice per sub-vector.
+    """
+
+    def __init__(self, feature_names):
+        positions = dict((_, []) for _ in SUBVECTOR_NAMES)
+        for k, fname in enumerate(feature_names):
+            vname, idx = FEATURE_NAMES[fname]
+            positions[vname].append((idx, k))
+        order = []
+        self.bounds = {}
+        for vname, pos in positions.iteritems():
+            start = len(order)
+            order.extend(k for _, k in sorted(pos))
+            self.bounds[vname] = start, len(order)
+        self.order = np.array(order, dtype=np.intp)
+
+    def split(self, values):
+        flat = np.asarray(values, dtype=np.float64)[self.order].tolist()
+        return dict((vname, flat[start: stop])
+                    for vname, (start, stop) in self.bounds.iteritems())
+
+
+def get_layout(version, feature_names):
+    key = version, tuple(feature_names)
+    try:
+        return _LAYOUTS[key]
+    except KeyError:
+        layout = _LAYOUTS[key] = FeatureLayout(feature_names)
+        return layout
+
+
+class LayoutCache(object):
+    """\
+    Record layouts for the tiles of a run.
+
+    All tiles computed with the same options have the same feature
+    names, so layouts are looked up by feature set version and number
+    of features rather than by the names themselves.
+    """
+
+    def __init__(self):
+        self.__layouts = {}
+
+    def get_layout(self, signatures):
+        """\
+        Get the record layout for signatures.
+        """
+        version = signatures.feature_set_version
+        key = version, len(signatures.feature_names)
+        try:
+            return self.__layouts[key]
+        except KeyError:
+            layout = self.__layouts[key] = get_layout(
+                version, signatures.feature_names
+            )
+            return layout
+
+    def to_avro(self, signatures):
+        return to_avro(signatures, layout=self.get_layout(signatures))
+
+
+def to_avro(signatures, layout=None):
+    """\
+    Convert signatures to a Signatures record (without the plane info).
+
+    signatures can be a WND-CHARM FeatureVector or any object with the
+    same attributes, such as a TileSignatures. If given, layout must be
+    the one returned by get_layout for the signatures' feature set:
+    passing it saves looking it up by feature names for each tile.
+    """
+    if layout is None:
+        layout = get_layout(
+            signatures.feature_set_version, signatures.feature_names
+        )
+    rec = layout.split(signatures.values)
+    rec["version"] = signatures.feature_set_version
+    rec["name"] = signatures.basename
+    for k in "x", "y", "w", "h":
+        rec[k] = getattr(signatures, k)
+    return rec
@@ -0,0 +1,152 @@
+# BEGIN_COPYRIGHT
+#
+# Copyright (C) 2017 Open Microscopy Environment:
+#   - University of Dundee
+#   - CRS4
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# END_COPYRIGHT
+
+"""\
+Thread-based pipeline stages connected by bounded queues.
+
+prefetch runs a producer (e.g., a generator that reads and decodes
+records) in a background thread, at most maxsize items ahead of the
+consumer; Consumer calls a function (e.g., one that encodes and writes
+records) on each item in a background thread, blocking the producer
+when maxsize items are pending. Exceptions raised in the background
+are re-raised in the calling thread, with their original traceback.
+
+Threads are started lazily (on the first item requested or put), so
+that they are not running yet if the caller forks worker processes
+before that.
+"""
+
+import sys
+import threading
+from Queue import Queue, Empty, Full
+
+DEFAULT_MAXSIZE = 64
+POLL_INTERVAL = .1
+
+_END = object()
+
+
+class _Error(object):
+
+    def __init__(self, exc_info):
+        self.exc_info = exc_info
+
+
+def _put(q, item, stop):
+    # a blocking put would hang forever if the other end went away
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=POLL_INTERVAL)
+        except Full:
+            continue
+        return True
+    return False
+
+
+def prefetch(iterable, maxsize=DEFAULT_MAXSIZE):
+    """\
+    Iterate over iterable in a background thread.
+    """
+    q = Queue(maxsize)
+    stop = threading.Event()
+
+    def run():
+        try:
+            for item in iterable:
+                if not _put(q, item, stop):
+                    return
+            item = _END
+        except BaseException:
+            item = _Error(sys.exc_info())
+        _put(q, item, stop)
+
+    t = threading.Thread(target=run, name="prefetch")
+    t.daemon = True
+    t.start()
+    try:
+        while True:
+            item = q.get()
+            if item is _END:
+                break
+            if isinstance(item, _Error):
+                tp, val, tb = item.exc_info
+                raise tp, val, tb
+            yield item
+    finally:
+        stop.set()
+        t.join()
+
+
+class Consumer(object):
+
+    def __init__(self, func, maxsize=DEFAULT_MAXSIZE):
+        self.func = func
+        self.queue = Queue(maxsize)
+        self.stop = threading.Event()
+        self.exc_info = None
+        self.thread = None
+
+    def __run(self):
+        while not self.stop.is_set():
+            try:
+                item = self.queue.get(timeout=POLL_INTERVAL)
+            except Empty:
+                continue
+            if item is _END:
+                return
+            try:
+                self.func(item)
+            except BaseException:
+                self.exc_info = sys.exc_info()
+                self.stop.set()
+                return
+
+    def __check(self):
+        if self.exc_info is not None:
+            tp, val, tb = self.exc_info
+            raise tp, val, tb
+
+    def put(self, item):
+        self.__check()
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.__run, name="consumer")
+            self.thread.daemon = True
+            self.thread.start()
+        if not _put(self.queue, item, self.stop):
+            self.__check()
+
+    def close(self):
+        """\
+        Wait until all items have been processed.
+        """
+        if self.thread is not None:
+            _put(self.queue, _END, self.stop)
+            self.thread.join()
+            self.thread = None
+        self.__check()
+
+    def abort(self):
+        """\
+        Stop processing items, discarding the pending ones.
+        """
+        self.stop.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
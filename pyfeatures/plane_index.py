@@ -0,0 +1,160 @@
+# BEGIN_COPYRIGHT
+#
+# Copyright (C) 2017 Open Microscopy Environment:
+#   - University of Dundee
+#   - CRS4
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# END_COPYRIGHT
+
+"""\
+Sidecar indexes for BioImgPlane Avro containers.
+
+An index maps the (series, z, c, t) coordinates of each plane to the
+offset of the Avro block that contains it and to the position of the
+record within the block. It is stored as JSON next to the container,
+together with the container's size and sync marker, which are used to
+detect stale indexes.
+"""
+
+import json
+import os
+from binascii import hexlify
+from itertools import groupby
+
+from pyfeatures.avro_container import ContainerReader, PlaneReader, get_zct
+
+INDEX_EXT = ".idx"
+INDEX_VERSION = 1
+
+
+def get_index_fn(avro_fn):
+    return "%s%s" % (avro_fn, INDEX_EXT)
+
+
+class PlaneIndex(object):
+
+    def __init__(self, entries, size, sync):
+        # entries: [(series, z, c, t, block_offset, block_pos), ...]
+        self.entries = [tuple(_) for _ in entries]
+        self.size = size
+        self.sync = sync
+
+    @classmethod
+    def build(cls, f):
+        container = ContainerReader(f)
+        plane_reader = PlaneReader(container.schema)
+        entries = []
+        for offset, count, decoder in container.iter_blocks():
+            for pos in xrange(count):
+                head = plane_reader.read_head(decoder)
+                plane_reader.skip_data(decoder)
+                entries.append(
+                    (head["series"],) + get_zct(head) + (offset, pos)
+                )
+        return cls(entries, container.size, hexlify(container.sync))
+
+    @classmethod
+    def load(cls, fn):
+        with open(fn) as f:
+            d = json.load(f)
+        if d.get("version") != INDEX_VERSION:
+            raise ValueError("unsupported index version")
+        return cls(d["planes"], d["size"], str(d["sync"]))
+
+    def dump(self, fn):
+        d = {
+            "version": INDEX_VERSION,
+            "size": self.size,
+            "sync": self.sync,
+            "planes": self.entries,
+        }
+        with open(fn, "w") as fo:
+            json.dump(d, fo)
+
+    def matches(self, f):
+        """\
+        Check that this index describes the given (open) container.
+        """
+        container = ContainerReader(f)
+        if container.size != self.size:
+            return False
+        return hexlify(container.sync) == self.sync
+
+    def find(self, zsubset=None, csubset=None, tsubset=None, series=None):
+        """\
+        Get (block_offset, block_pos) for the selected planes.
+
+        Positions are sorted by their order in the container.
+        """
+        pos = []
+        for s, z, c, t, offset, block_pos in self.entries:
+            if series is not None and s != series:
+                continue
+            if zsubset and z not in zsubset:
+                continue
+            if csubset and c not in csubset:
+                continue
+            if tsubset and t not in tsubset:
+                continue
+            pos.append((offset, block_pos))
+        return sorted(pos)
+
+
+def load_index(avro_fn, f=None):
+    """\
+    Load the sidecar index for avro_fn, if any and up to date.
+
+    Return None if the index is missing or stale.
+    """
+    idx_fn = get_index_fn(avro_fn)
+    if not os.path.isfile(idx_fn):
+        return None
+    try:
+        index = PlaneIndex.load(idx_fn)
+    except (ValueError, KeyError):
+        return None
+    if f is None:
+        with open(avro_fn, "rb") as f:
+            up_to_date = index.matches(f)
+    else:
+        up_to_date = index.matches(f)
+    return index if up_to_date else None
+
+
+def write_index(avro_fn, idx_fn=None):
+    if idx_fn is None:
+        idx_fn = get_index_fn(avro_fn)
+    with open(avro_fn, "rb") as f:
+        index = PlaneIndex.build(f)
+    index.dump(idx_fn)
+    return index
+
+
+def iter_records(f, positions):
+    """\
+    Read the BioImgPlane records at the given (block_offset, block_pos)
+    positions, which must be sorted.
+    """
+    container = ContainerReader(f)
+    plane_reader = PlaneReader(container.schema)
+    for offset, group in groupby(positions, lambda _: _[0]):
+        _, decoder = container.get_block(offset)
+        cur_pos = 0
+        for _, block_pos in group:
+            while cur_pos < block_pos:
+                plane_reader.skip(decoder)
+                cur_pos += 1
+            yield plane_reader.read(decoder)
+            cur_pos += 1
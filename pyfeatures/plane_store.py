@@ -0,0 +1,105 @@
+# BEGIN_COPYRIGHT
+#
+# Copyright (C) 2017 Open Microscopy Environment:
+#   - University of Dundee
+#   - CRS4
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# END_COPYRIGHT
+
+"""\
+Share decoded image planes with worker processes via memory mapping.
+
+The parent process stores each plane once as a .npy segment; workers
+receive only the segment path plus tile coordinates and slice tiles
+out of a read-only memory map, so no pixels go through the pool's
+pipes.
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+SHM_DIR = "/dev/shm"
+MAX_OPEN_SEGMENTS = 2
+
+_open_segments = OrderedDict()
+
+
+class PlaneStore(object):
+
+    def __init__(self, dir=None):
+        if dir is None and os.path.isdir(SHM_DIR):
+            dir = SHM_DIR
+        self.dir = tempfile.mkdtemp(prefix="pyfeatures_", dir=dir)
+        self.refcounts = {}
+        self.n_segments = 0
+        # planes may be put and released by different threads
+        self.lock = threading.Lock()
+
+    def put(self, pixels):
+        """\
+        Store pixels in a new segment, return the segment path.
+
+        The caller owns one reference to the segment and must release
+        it when done handing out tiles.
+        """
+        with self.lock:
+            seg = os.path.join(self.dir, "%d.npy" % self.n_segments)
+            self.n_segments += 1
+        np.save(seg, pixels)
+        with self.lock:
+            self.refcounts[seg] = 1
+        return seg
+
+    def acquire(self, seg):
+        with self.lock:
+            self.refcounts[seg] += 1
+
+    def release(self, seg):
+        with self.lock:
+            self.refcounts[seg] -= 1
+            if self.refcounts[seg] > 0:
+                return
+            del self.refcounts[seg]
+        os.remove(seg)
+
+    def close(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+        self.refcounts.clear()
+
+
+def load(seg):
+    """\
+    Get a read-only memory map of the given segment.
+
+    The most recently used segments are kept open, since consecutive
+    work units usually come from the same plane.
+    """
+    try:
+        a = _open_segments.pop(seg)
+    except KeyError:
+        a = np.load(seg, mmap_mode="r")
+        while len(_open_segments) >= MAX_OPEN_SEGMENTS:
+            _open_segments.popitem(last=False)
+    _open_segments[seg] = a
+    return a
+
+
+def get_tile(seg, i, j, h, w):
+    return load(seg)[i: i + h, j: j + w]
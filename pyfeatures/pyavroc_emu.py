@@ -18,49 +18,232 @@
 #
 # END_COPYRIGHT
 
+import os
 from cStringIO import StringIO
+from itertools import izip
+import struct
 
-from avro.datafile import DataFileReader, DataFileWriter
-from avro.io import DatumReader, DatumWriter, BinaryDecoder, BinaryEncoder
+from avro.datafile import DataFileWriter, SYNC_INTERVAL
+from avro.io import (
+    AvroTypeException, DatumReader, DatumWriter, BinaryDecoder, BinaryEncoder
+)
 import avro.schema
 
+from pyfeatures.avro_codec import (
+    UnsupportedSchema, compile_decoder, compile_encoder
+)
+from pyfeatures.avro_container import (
+    CODEC_KEY, ContainerReader, compress, get_codec
+)
 
-class AvroFileReader(DataFileReader):
+# errors raised by compiled encoders on invalid data
+ENCODE_ERRORS = (
+    AttributeError, KeyError, IndexError, TypeError, ValueError,
+    struct.error,
+)
+
+
+def get_decoder(schema):
+    try:
+        return compile_decoder(schema)
+    except UnsupportedSchema:
+        return None
+
+
+def get_encoder(schema):
+    try:
+        return compile_encoder(schema)
+    except UnsupportedSchema:
+        return None
+
+
+def encode_datum(encode, schema, out, datum):
+    try:
+        encode(out, datum)
+    except ENCODE_ERRORS:
+        raise AvroTypeException(schema, datum)
+
+
+class CompiledDatumWriter(DatumWriter):
+    """\
+    A DatumWriter that uses a schema-compiled encoder (see avro_codec),
+    if the schema is supported.
+    """
+
+    def __init__(self, writers_schema=None):
+        super(CompiledDatumWriter, self).__init__(writers_schema)
+        self.buffer = bytearray()
+        self.encode = None
+        self.encode_schema = None
+
+    def write(self, datum, encoder):
+        if self.encode_schema is not self.writers_schema:
+            self.encode = get_encoder(self.writers_schema)
+            self.encode_schema = self.writers_schema
+        if self.encode is None:
+            return super(CompiledDatumWriter, self).write(datum, encoder)
+        del self.buffer[:]
+        encode_datum(self.encode, self.writers_schema, self.buffer, datum)
+        encoder.write(self.buffer)
+
+
+class AvroFileReader(object):
+    """\
+    Iterate over the records of an Avro container.
+
+    Records are decoded one block at a time, with a schema-compiled
+    decoder if the schema is supported, or else with the generic one.
+    """
 
     def __init__(self, f, types=False):
         if types:
             raise RuntimeError('types not supported')
-        super(AvroFileReader, self).__init__(f, DatumReader())
+        self.container = ContainerReader(f)
+        self.schema = self.container.schema
+        self.decode = get_decoder(self.schema)
+        self.__records = self.__iter_records()
+
+    def __iter_records(self):
+        for _, count, data in self.container.iter_block_data():
+            if self.decode is None:
+                datum_reader = DatumReader(self.schema)
+                decoder = BinaryDecoder(StringIO(data))
+                for _ in xrange(count):
+                    yield datum_reader.read(decoder)
+                continue
+            buf, pos = memoryview(data), 0
+            for _ in xrange(count):
+                rec, pos = self.decode(buf, pos)
+                yield rec
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        return next(self.__records)
+
+    def close(self):
+        self.container.f.close()
 
 
 class AvroFileWriter(DataFileWriter):
-
-    def __init__(self, f, schema_json):
-        schema = avro.schema.parse(schema_json)
-        super(AvroFileWriter, self).__init__(f, DatumWriter(), schema)
+    """\
+    If schema_json is None, append to the existing container in f,
+    which must be open for both reading and writing (the codec is then
+    the one used by the container).
+
+    codec can be any of those supported by avro_container (e.g., zstd),
+    not just the ones supported by the avro lib. A block is written as
+    soon as its uncompressed size reaches block_size bytes.
+    """
+
+    def __init__(self, f, schema_json=None, codec="null",
+                 block_size=SYNC_INTERVAL):
+        appending = schema_json is None
+        if appending:
+            container = ContainerReader(f)
+            schema, codec = container.schema, container.codec
+        else:
+            schema = avro.schema.parse(schema_json)
+        codec = get_codec(codec)
+        if block_size <= 0:
+            raise ValueError("block size must be positive")
+        # let the base class write a "null" codec, then replace it
+        super(AvroFileWriter, self).__init__(
+            f, CompiledDatumWriter(), schema
+        )
+        self.set_meta(CODEC_KEY, codec)
+        self.block_size = block_size
+        if appending:
+            self._sync_marker = container.sync
+            self._header_written = True
+            f.seek(0, os.SEEK_END)
+
+    def _write_block(self):
+        if not self._header_written:
+            self._write_header()
+        if self.block_count > 0:
+            data = compress(self.get_meta(CODEC_KEY),
+                            self.buffer_writer.getvalue())
+            self.encoder.write_long(self.block_count)
+            self.encoder.write_long(len(data))
+            self.writer.write(data)
+            self.writer.write(self.sync_marker)
+            self.buffer_writer.truncate(0)
+            self.block_count = 0
+
+    def append(self, datum):
+        self.datum_writer.write(datum, self.buffer_encoder)
+        self.block_count += 1
+        if self.buffer_writer.tell() >= self.block_size:
+            self._write_block()
 
     def write(self, datum):
-        return super(AvroFileWriter, self).append(datum)
+        return self.append(datum)
 
 
 class AvroDeserializer(object):
+    """\
+    Decode single records, with a schema-compiled decoder if the schema
+    is supported. rec_bytes can be a str, a bytearray or a memoryview.
+    """
 
     def __init__(self, schema_str):
         schema = avro.schema.parse(schema_str)
+        self.decode = get_decoder(schema)
         self.reader = DatumReader(schema)
 
     def deserialize(self, rec_bytes):
-        return self.reader.read(BinaryDecoder(StringIO(rec_bytes)))
+        if self.decode is None:
+            if isinstance(rec_bytes, memoryview):
+                rec_bytes = rec_bytes.tobytes()
+            return self.reader.read(BinaryDecoder(StringIO(str(rec_bytes))))
+        if not isinstance(rec_bytes, memoryview):
+            rec_bytes = memoryview(rec_bytes)
+        return self.decode(rec_bytes, 0)[0]
 
 
 class AvroSerializer(object):
+    """\
+    Encode records, with a schema-compiled encoder if the schema is
+    supported. Records are encoded into a buffer that is reused across
+    calls, so the only per-record allocation is the returned string.
+    """
 
     def __init__(self, schema_str):
-        schema = avro.schema.parse(schema_str)
-        self.writer = DatumWriter(schema)
+        self.schema = avro.schema.parse(schema_str)
+        self.encode = get_encoder(self.schema)
+        self.writer = DatumWriter(self.schema)
+        self.buffer = bytearray()
 
-    def serialize(self, record):
+    def __serialize_generic(self, record):
         f = StringIO()
         encoder = BinaryEncoder(f)
         self.writer.write(record, encoder)
         return f.getvalue()
+
+    def serialize(self, record):
+        if self.encode is None:
+            return self.__serialize_generic(record)
+        del self.buffer[:]
+        encode_datum(self.encode, self.schema, self.buffer, record)
+        return str(self.buffer)
+
+    def serialize_many(self, records):
+        """\
+        Encode all records in one pass over the buffer. Return a list
+        with the encoded records, in the same order.
+        """
+        if self.encode is None:
+            return [self.__serialize_generic(_) for _ in records]
+        buf = self.buffer
+        del buf[:]
+        ends = []
+        for r in records:
+            encode_datum(self.encode, self.schema, buf, r)
+            ends.append(len(buf))
+        view = memoryview(buf)
+        out = [view[start: end].tobytes()
+               for start, end in izip([0] + ends, ends)]
+        del view  # the buffer cannot be resized while a view exists
+        return out
@@ -0,0 +1,203 @@
+# BEGIN_COPYRIGHT
+#
+# Copyright (C) 2017 Open Microscopy Environment:
+#   - University of Dundee
+#   - CRS4
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# END_COPYRIGHT
+
+"""\
+Incremental statistics over (possibly overlapping) tiles of a plane.
+
+Statistics that decompose over pixels are computed for all tiles at
+once from whole-plane running sums, so the cost does not grow with the
+overlap between tiles:
+
+* sums, means and standard deviations use integral images (summed-area
+  tables) of the pixel values and of their squares; pixel sums are
+  exact for integer types of up to 32 bits, while squares of values
+  wider than 16 bits are summed in float64 after shifting the values
+  by the plane's mean, to avoid overflow and limit cancellation in the
+  variance (constant tiles get an exact zero deviation);
+* fixed-range histograms use one integral image per bin;
+* minima and maxima use the van Herk / Gil-Werman running extrema
+  algorithm, separably along rows and columns, once per tile shape
+  (partial tiles at the plane's border count as full-size ones).
+
+Tile coordinates are (i, j, h, w) tuples, as yielded by
+feature_calc.gen_tile_coords. Order statistics such as the median do
+not decompose and are not supported.
+"""
+
+import numpy as np
+
+
+def integral_image(a):
+    """\
+    Get the (H + 1) x (W + 1) summed-area table of a H x W array.
+
+    Integer input is accumulated with int64, so sums are exact.
+    """
+    dtype = np.int64 if a.dtype.kind in "biu" else np.float64
+    S = np.zeros((a.shape[0] + 1, a.shape[1] + 1), dtype=dtype)
+    np.cumsum(a, axis=0, dtype=dtype, out=S[1:, 1:])
+    np.cumsum(S[1:, 1:], axis=1, out=S[1:, 1:])
+    return S
+
+
+def window_sums(S, coords):
+    """\
+    Get the sum of each (i, j, h, w) window from the integral image S.
+    """
+    i, j, h, w = np.asarray(coords, dtype=np.intp).reshape(-1, 4).T
+    return S[i + h, j + w] - S[i, j + w] - S[i + h, j] + S[i, j]
+
+
+def get_neutral(dtype, ufunc):
+    """\
+    Get the value that never wins a np.minimum / np.maximum comparison.
+    """
+    info = np.iinfo(dtype) if dtype.kind in "iu" else np.finfo(dtype)
+    return info.max if ufunc is np.minimum else info.min
+
+
+def running_extremum(a, size, axis, ufunc=np.minimum):
+    """\
+    Extremum of each run of size consecutive elements along axis.
+
+    The output is shorter than the input by size - 1 along axis. Uses
+    the van Herk / Gil-Werman algorithm: three comparisons per element,
+    independently of size.
+    """
+    a = np.moveaxis(a, axis, -1)
+    n = a.shape[-1]
+    if size < 1 or size > n:
+        raise ValueError("bad run size: %d" % size)
+    n_blocks = -(-n // size)
+    padded = np.full(a.shape[:-1] + (n_blocks * size,),
+                     get_neutral(a.dtype, ufunc), dtype=a.dtype)
+    padded[..., :n] = a
+    blocks = padded.reshape(a.shape[:-1] + (n_blocks, size))
+    prefix = ufunc.accumulate(blocks, axis=-1).reshape(padded.shape)
+    suffix = ufunc.accumulate(blocks[..., ::-1], axis=-1)[..., ::-1]
+    suffix = suffix.reshape(padded.shape)
+    m = n - size + 1
+    out = ufunc(suffix[..., :m], prefix[..., size - 1: size - 1 + m])
+    return np.moveaxis(out, -1, axis)
+
+
+class SlidingWindowStats(object):
+    """\
+    Per-tile statistics computed from whole-plane running sums.
+
+    The integral images are computed once, on creation; each call then
+    takes O(1) time per tile, plus O(H * W) per distinct tile shape for
+    minima and maxima (also used by std for floating point planes).
+    """
+
+    def __init__(self, img_array):
+        if len(img_array.shape) != 2:
+            raise ValueError("array must be two-dimensional")
+        self.img_array = img_array
+        dtype = img_array.dtype
+        is_int = dtype.kind in "biu"
+        if is_int and dtype.itemsize <= 2:
+            self.shift = 0
+            shifted, sq_dtype = img_array, np.int64
+        else:
+            # variances do not change, but sums of squares get smaller;
+            # wider integers are shifted by an integer, so that sums
+            # stay exact, but their squares could overflow int64
+            self.shift = img_array.mean(dtype=np.float64)
+            if is_int and dtype.itemsize <= 4:
+                self.shift = int(round(self.shift))
+                shifted = img_array.astype(np.int64) - self.shift
+            else:
+                shifted = img_array.astype(np.float64) - self.shift
+            sq_dtype = np.float64
+        self.S1 = integral_image(shifted)
+        sq = shifted.astype(sq_dtype)
+        sq *= sq
+        self.S2 = integral_image(sq)
+
+    def __shifted_sum(self, coords):
+        return window_sums(self.S1, coords)
+
+    def sum(self, coords):
+        coords = np.asarray(coords).reshape(-1, 4)
+        n = coords[:, 2] * coords[:, 3]
+        return self.__shifted_sum(coords) + self.shift * n
+
+    def mean(self, coords):
+        coords = np.asarray(coords).reshape(-1, 4)
+        n = coords[:, 2] * coords[:, 3]
+        return self.sum(coords) / n.astype(np.float64)
+
+    def std(self, coords, ddof=1):
+        coords = np.asarray(coords).reshape(-1, 4)
+        n = (coords[:, 2] * coords[:, 3]).astype(np.float64)
+        s1 = self.__shifted_sum(coords).astype(np.float64)
+        s2 = window_sums(self.S2, coords).astype(np.float64)
+        var = (s2 - s1 * s1 / n) / np.maximum(n - ddof, 1)
+        if self.S2.dtype.kind == "f":
+            # rounding errors would give small nonzero values
+            var[self.min(coords) == self.max(coords)] = 0
+        return np.sqrt(np.maximum(var, 0))
+
+    def __extremum(self, coords, ufunc):
+        coords = np.asarray(coords, dtype=np.intp).reshape(-1, 4)
+        H, W = self.img_array.shape
+        out = np.empty(len(coords), dtype=self.img_array.dtype)
+        # tiles clipped by the plane's border are computed as full-size
+        # ones on a padded plane, so they don't add new window shapes
+        h_max, w_max = coords[:, 2].max(), coords[:, 3].max()
+        i, j, h, w = coords.T
+        h = np.where(i + h == H, h_max, h)
+        w = np.where(j + w == W, w_max, w)
+        dtype = self.img_array.dtype
+        padded = np.full((H + h_max - 1, W + w_max - 1),
+                         get_neutral(dtype, ufunc), dtype=dtype)
+        padded[:H, :W] = self.img_array
+        row_ext = {}
+        for tile_w in np.unique(w):
+            row_ext[tile_w] = running_extremum(padded, tile_w, 1,
+                                               ufunc=ufunc)
+        for tile_h, tile_w in set(zip(h, w)):
+            sel = (h == tile_h) & (w == tile_w)
+            ext = running_extremum(row_ext[tile_w], tile_h, 0, ufunc=ufunc)
+            out[sel] = ext[i[sel], j[sel]]
+        return out
+
+    def min(self, coords):
+        return self.__extremum(coords, np.minimum)
+
+    def max(self, coords):
+        return self.__extremum(coords, np.maximum)
+
+    def histograms(self, coords, bin_edges):
+        """\
+        Get the (n_tiles, n_bins) pixel counts for fixed bin edges.
+
+        Bins are as in np.histogram: half-open, except for the last one.
+        """
+        bin_edges = np.asarray(bin_edges)
+        n_bins = len(bin_edges) - 1
+        idx = np.searchsorted(bin_edges, self.img_array, side="right") - 1
+        idx[self.img_array == bin_edges[-1]] = n_bins - 1
+        counts = np.empty((len(np.asarray(coords).reshape(-1, 4)), n_bins),
+                          dtype=np.int64)
+        for b in xrange(n_bins):
+            counts[:, b] = window_sums(integral_image(idx == b), coords)
+        return counts
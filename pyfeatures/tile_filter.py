@@ -0,0 +1,104 @@
+# BEGIN_COPYRIGHT
+#
+# Copyright (C) 2017 Open Microscopy Environment:
+#   - University of Dundee
+#   - CRS4
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# END_COPYRIGHT
+
+"""\
+Cheap detection of background tiles.
+
+Each tile gets a score, computed for all tiles of a plane at once (see
+sliding); tiles whose score is not greater than a threshold are
+considered background, and their features are not computed. Scores:
+
+* variance: sample variance of the tile's pixels;
+* range: difference between the tile's maximum and minimum;
+* otsu: fraction of the tile's pixels that are foreground according
+  to the plane's Otsu threshold.
+
+With the default threshold (0), only tiles with constant pixels (or no
+foreground pixels at all, for otsu) are skipped.
+"""
+
+import numpy as np
+
+from pyfeatures.sliding import SlidingWindowStats, integral_image, window_sums
+
+METHODS = "variance", "range", "otsu"
+OTSU_BINS = 256
+
+
+def otsu_threshold(a, n_bins=OTSU_BINS):
+    """\
+    Get the threshold that maximizes the between-class variance of a.
+
+    Pixels not less than the threshold are foreground; if a is constant,
+    there is no foreground and the threshold is infinite.
+    """
+    a = np.asarray(a)
+    mn, mx = a.min(), a.max()
+    if mn == mx:
+        return np.inf
+    counts, edges = np.histogram(a, bins=n_bins, range=(mn, mx))
+    centers = (edges[:-1] + edges[1:]) / 2.
+    w0 = np.cumsum(counts).astype(np.float64)
+    w1 = w0[-1] - w0
+    s0 = np.cumsum(counts * centers)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        m0 = s0 / w0
+        m1 = (s0[-1] - s0) / w1
+        between = w0 * w1 * (m0 - m1) ** 2
+    between[~np.isfinite(between)] = -1
+    return edges[np.argmax(between) + 1]
+
+
+def get_scores(img_array, coords, method):
+    """\
+    Get the score of each (i, j, h, w) tile with the given method.
+    """
+    coords = np.asarray(coords, dtype=np.intp).reshape(-1, 4)
+    if method == "otsu":
+        fg = img_array >= otsu_threshold(img_array)
+        n = (coords[:, 2] * coords[:, 3]).astype(np.float64)
+        return window_sums(integral_image(fg), coords) / n
+    if method not in METHODS:
+        raise ValueError("unknown method: %r" % (method,))
+    stats = SlidingWindowStats(img_array)
+    if method == "variance":
+        return stats.std(coords) ** 2
+    mx, mn = stats.max(coords), stats.min(coords)
+    return mx.astype(np.float64) - mn.astype(np.float64)
+
+
+class TileFilter(object):
+
+    def __init__(self, method, threshold=0.):
+        if method not in METHODS:
+            raise ValueError("unknown method: %r" % (method,))
+        self.method = method
+        self.threshold = threshold
+
+    def get_background(self, img_array, coords):
+        """\
+        Get the set of (i, j) positions of the background tiles.
+        """
+        coords = list(coords)
+        if not coords:
+            return set()
+        scores = get_scores(img_array, coords, self.method)
+        return set((i, j) for (i, j, _, _), s in zip(coords, scores)
+                   if s <= self.threshold)
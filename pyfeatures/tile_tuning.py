@@ -0,0 +1,260 @@
+# BEGIN_COPYRIGHT
+#
+# Copyright (C) 2017 Open Microscopy Environment:
+#   - University of Dundee
+#   - CRS4
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# END_COPYRIGHT
+
+"""\
+Cost / error model for choosing tile sizes.
+
+Rather than computing features for every candidate tiling of a plane
+(as scripts/tiling/run_tile_size does), the model is fitted from a few
+sampled tile sizes, computing features only for a handful of randomly
+placed tiles of each size:
+
+* time per tile is modeled as a power law of the number of pixels in
+  the tile; the time for a tiling is that times the number of tiles,
+  except for the full plane, whose time is measured;
+* error is the relative distance between the mean of the tile feature
+  vectors and the full-plane feature vector, also modeled as a power
+  law of the tile's pixel count (and 0 for the full plane).
+
+Fitted models are stored in a JSON cache, keyed by plane shape, dtype
+and feature set, together with the recommendations made so far, which
+are reused for the same targets.
+"""
+
+import json
+import math
+import os
+import time
+
+import numpy as np
+
+from pyfeatures.feature_cache import get_names_id
+
+DEFAULT_CACHE = os.path.join("~", ".cache", "pyfeatures", "tune_tiles.json")
+MIN_ERROR = 1e-12
+
+
+def get_divisors(n, low=1):
+    return [_ for _ in xrange(n, max(low, 1) - 1, -1) if n % _ == 0]
+
+
+def count_tiles(H, W, w, h, dx, dy):
+    # same tiles as tiling.gen_tile_coords
+    n_rows = len(xrange(0, min(H, H - h + dy), dy))
+    return n_rows * len(xrange(0, min(W, W - w + dx), dx))
+
+
+def get_candidates(H, W, min_w=1, min_h=1, overlap=0.):
+    """\
+    Get candidate (w, h, dx, dy) tilings for a H x W plane.
+
+    Tile sizes are divisor pairs of W and H (so that there are no
+    partial tiles), excluding stripes (one side less than half of the
+    other) unless the short side spans the whole plane along its axis,
+    so that elongated planes still get the most square tiles they
+    allow; strides leave the given fraction of overlap between
+    consecutive tiles.
+    """
+    if not 0 <= overlap < 1:
+        raise ValueError("overlap must be in [0, 1)")
+    candidates = []
+    for w in get_divisors(W, low=min(min_w, W)):
+        for h in get_divisors(H, low=min(min_h, H)):
+            stripe = min(w, h) <= max(w, h) // 2
+            if stripe and not (h == H and h < w or w == W and w < h):
+                continue
+            dx = max(1, int(round(w * (1 - overlap))))
+            dy = max(1, int(round(h * (1 - overlap))))
+            candidates.append((w, h, dx, dy))
+    return candidates
+
+
+def get_sample_shapes(candidates, n_samples):
+    """\
+    Pick up to n_samples tile shapes, evenly spaced in log pixel count,
+    among candidates smaller than the largest one.
+    """
+    shapes = sorted(set((h, w) for w, h, _, _ in candidates),
+                    key=lambda _: (_[0] * _[1], _))
+    shapes = shapes[:-1]
+    if len(shapes) <= n_samples:
+        return shapes
+    idx = np.unique(np.round(np.linspace(0, len(shapes) - 1, n_samples)))
+    return [shapes[int(_)] for _ in idx]
+
+
+def relative_error(v, ref_v):
+    v, ref_v = np.asarray(v), np.asarray(ref_v)
+    return float(np.linalg.norm(v - ref_v) / (np.linalg.norm(ref_v) or 1.))
+
+
+def sample(backend, pixels, shapes, n_tiles=8, seed=None):
+    """\
+    Time the backend on random tiles of each shape and measure error.
+
+    Return (ref_time, samples), where ref_time is the time taken by
+    the full plane and samples is a list of (h, w, time_per_tile,
+    error) tuples.
+    """
+    rng = np.random.RandomState(seed)
+    H, W = pixels.shape
+    start = time.time()
+    _, ref_v = backend.compute(pixels)
+    ref_time = time.time() - start
+    samples = []
+    for h, w in shapes:
+        i = rng.randint(0, H - h + 1, n_tiles)
+        j = rng.randint(0, W - w + 1, n_tiles)
+        tiles = np.array([pixels[a: a + h, b: b + w] for a, b in zip(i, j)])
+        start = time.time()
+        _, values = backend.compute(tiles)
+        t = (time.time() - start) / n_tiles
+        samples.append((h, w, t, relative_error(values.mean(axis=0),
+                                                ref_v[0])))
+    return ref_time, samples
+
+
+class TileModel(object):
+
+    def __init__(self, H, W, time_coef, error_coef, ref_time=None):
+        self.H, self.W = H, W
+        self.time_coef = tuple(time_coef)
+        self.error_coef = tuple(error_coef)
+        self.ref_time = ref_time
+
+    @classmethod
+    def fit(cls, H, W, samples, ref_time=None):
+        if len(samples) < 2:
+            raise ValueError("at least two samples are required")
+        log_px = [math.log(h * w) for h, w, _, _ in samples]
+        log_t = [math.log(max(t, MIN_ERROR)) for _, _, t, _ in samples]
+        log_e = [math.log(max(e, MIN_ERROR)) for _, _, _, e in samples]
+        return cls(H, W, np.polyfit(log_px, log_t, 1).tolist(),
+                   np.polyfit(log_px, log_e, 1).tolist(), ref_time=ref_time)
+
+    def tile_time(self, w, h):
+        b, a = self.time_coef
+        return math.exp(a + b * math.log(w * h))
+
+    def predict(self, w, h, dx, dy):
+        """\
+        Return the predicted (time, error) for the given tiling.
+
+        For the full plane, the measured time (ref_time) is used if
+        available.
+        """
+        n = count_tiles(self.H, self.W, w, h, dx, dy)
+        if (w, h) == (self.W, self.H):
+            if self.ref_time is not None:
+                return self.ref_time, 0.
+            return self.tile_time(w, h), 0.
+        b, a = self.error_coef
+        return n * self.tile_time(w, h), math.exp(a + b * math.log(w * h))
+
+    def to_json(self):
+        return {"shape": [self.H, self.W], "time": list(self.time_coef),
+                "error": list(self.error_coef), "ref_time": self.ref_time}
+
+    @classmethod
+    def from_json(cls, d):
+        H, W = d["shape"]
+        return cls(H, W, d["time"], d["error"], ref_time=d.get("ref_time"))
+
+
+def recommend(model, candidates, time_budget=None, max_error=None):
+    """\
+    Choose a tiling among candidates.
+
+    With a time budget, return the most accurate tiling that fits in
+    it; with an error bound, the fastest one that satisfies it; with
+    both, the fastest one that satisfies both. If there is none, fall
+    back to the fastest (time budget) or most accurate (error bound)
+    tiling. Return ((w, h, dx, dy), time, error, feasible).
+    """
+    if time_budget is None and max_error is None:
+        raise ValueError("no time budget or error bound specified")
+    preds = [(c,) + model.predict(*c) for c in candidates]
+    fast = [time_budget is None or _[1] <= time_budget for _ in preds]
+    accurate = [max_error is None or _[2] <= max_error for _ in preds]
+    feasible = [p for p, f, a in zip(preds, fast, accurate) if f and a]
+    if max_error is None:
+        key = lambda _: (_[2], _[1])  # noqa: E731
+    else:
+        key = lambda _: (_[1], _[2])  # noqa: E731
+    if feasible:
+        return min(feasible, key=key) + (True,)
+    if time_budget is not None:
+        return min(preds, key=lambda _: (_[1], _[2])) + (False,)
+    return min(preds, key=lambda _: (_[2], _[1])) + (False,)
+
+
+def get_cache_key(H, W, dtype, long, backend_name, feature_names=None):
+    key = "%dx%d:%s:%s:%s" % (H, W, np.dtype(dtype).str,
+                              "long" if long else "short", backend_name)
+    if feature_names:
+        key += ":%s" % get_names_id(feature_names)
+    return key
+
+
+class ModelCache(object):
+
+    def __init__(self, path=DEFAULT_CACHE):
+        self.path = os.path.expanduser(path)
+        self.data = {}
+        if os.path.isfile(self.path):
+            with open(self.path) as f:
+                self.data = json.load(f)
+
+    def get_model(self, key):
+        try:
+            return TileModel.from_json(self.data[key]["model"])
+        except KeyError:
+            return None
+
+    def put_model(self, key, model):
+        self.data[key] = {"model": model.to_json(), "recommendations": {}}
+
+    def get_recommendation(self, key, target):
+        """\
+        Get the recommend output stored for target, or None.
+        """
+        try:
+            rec = self.data[key]["recommendations"][target]
+        except KeyError:
+            return None
+        tiling = tuple(rec["tiling"])
+        return tiling, rec["time"], rec["error"], rec["feasible"]
+
+    def put_recommendation(self, key, target, recommendation):
+        tiling, t, err, feasible = recommendation
+        self.data[key]["recommendations"][target] = {
+            "tiling": list(tiling), "time": t, "error": err,
+            "feasible": feasible,
+        }
+
+    def save(self):
+        d = os.path.dirname(self.path)
+        if d and not os.path.isdir(d):
+            os.makedirs(d)
+        tmp_fn = "%s.tmp" % self.path
+        with open(tmp_fn, "w") as fo:
+            json.dump(self.data, fo, sort_keys=True, indent=1,
+                      separators=(",", ": "))
+        os.rename(tmp_fn, self.path)
@@ -0,0 +1,112 @@
+# BEGIN_COPYRIGHT
+#
+# Copyright (C) 2017 Open Microscopy Environment:
+#   - University of Dundee
+#   - CRS4
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# END_COPYRIGHT
+
+"""\
+Tiling of image planes.
+
+Nothing here depends on WND-CHARM, so that tiles can be generated for
+any feature extraction backend (see backends).
+"""
+
+import numpy as np
+
+
+def get_tiling(H, W, w=None, h=None, dx=None, dy=None, ox=None, oy=None):
+    """\
+    Fill in defaults for tiling parameters, return (w, h, dx, dy, ox, oy).
+    """
+    if w is None or w > W:
+        w = W
+    if h is None or h > H:
+        h = H
+    if dx is None:
+        dx = w
+    if dy is None:
+        dy = h
+    if ox is None:
+        ox = 0
+    if oy is None:
+        oy = 0
+    if w < 1 or h < 1:
+        raise ValueError("smallest tile size is 1 x 1")
+    if dx < 1 or dy < 1:
+        raise ValueError("smallest distance between tiles is 1")
+    return w, h, dx, dy, ox, oy
+
+
+def gen_tile_coords(H, W, w=None, h=None, dx=None, dy=None, ox=None,
+                    oy=None):
+    """\
+    Same as gen_tiles, but yield (i, j, tile_h, tile_w) for a H x W image.
+    """
+    w, h, dx, dy, ox, oy = get_tiling(H, W, w, h, dx, dy, ox, oy)
+    # min(...): a maximum of one partial tile in that dimension
+    for i in xrange(oy, min(H, H - h + dy), dy):
+        for j in xrange(ox, min(W, W - w + dx), dx):
+            yield i, j, min(h, H - i), min(w, W - j)
+
+
+def gen_tiles(img_array, w=None, h=None, dx=None, dy=None, ox=None, oy=None):
+    if len(img_array.shape) != 2:
+        raise ValueError("array must be two-dimensional")
+    H, W = img_array.shape
+    for i, j, tile_h, tile_w in gen_tile_coords(
+            H, W, w=w, h=h, dx=dx, dy=dy, ox=ox, oy=oy):
+        yield i, j, img_array[i: i + tile_h, j: j + tile_w]
+
+
+def get_tile_stack(img_array, w=None, h=None, dx=None, dy=None, ox=None,
+                   oy=None):
+    """\
+    Get all full-size tiles generated by gen_tiles at once.
+
+    Return (tiles, coords, edge_coords), where tiles is a read-only
+    (n_rows, n_cols, h, w) view of img_array (no data is copied), coords
+    is the (n_rows * n_cols, 2) array of the (i, j) position of each
+    tile, in row-major order, and edge_coords is a list of (i, j, h, w)
+    tuples for the partial tiles at the right and bottom edges. Batch
+    kernels can reduce over the last two axes of tiles; note that
+    merging its first two axes (e.g., with reshape) makes a copy, since
+    the tiles are not evenly spaced in memory across rows.
+    """
+    if len(img_array.shape) != 2:
+        raise ValueError("array must be two-dimensional")
+    H, W = img_array.shape
+    w, h, dx, dy, ox, oy = get_tiling(H, W, w, h, dx, dy, ox, oy)
+    rows = np.arange(oy, min(H, H - h + dy), dy)
+    cols = np.arange(ox, min(W, W - w + dx), dx)
+    full_rows, full_cols = rows[rows + h <= H], cols[cols + w <= W]
+    s0, s1 = img_array.strides
+    tiles = np.lib.stride_tricks.as_strided(
+        img_array[oy:, ox:],
+        shape=(len(full_rows), len(full_cols), h, w),
+        strides=(dy * s0, dx * s1, s0, s1),
+        writeable=False,
+    )
+    coords = np.empty((len(full_rows), len(full_cols), 2), dtype=np.intp)
+    coords[..., 0] = full_rows[:, None]
+    coords[..., 1] = full_cols
+    # at most one partial row and one partial column
+    edge_coords = []
+    for i in rows:
+        edge_cols = cols if i + h > H else cols[len(full_cols):]
+        edge_coords.extend((int(i), int(j), min(h, H - i), min(w, W - j))
+                           for j in edge_cols)
+    return tiles, coords.reshape(-1, 2), edge_coords
@@ -0,0 +1,188 @@
+# BEGIN_COPYRIGHT
+#
+# Copyright (C) 2017 Open Microscopy Environment:
+#   - University of Dundee
+#   - CRS4
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# END_COPYRIGHT
+
+
+import unittest
+from cStringIO import StringIO
+
+import avro.schema
+from avro.io import BinaryDecoder, BinaryEncoder, DatumReader, DatumWriter
+
+import pyfeatures.avro_codec as avro_codec
+import pyfeatures.schema as schema
+from pyfeatures.feature_names import FEATURE_NAMES
+
+
+LINKED_LIST = """\
+{
+  "type": "record", "name": "Node", "fields": [
+    {"name": "value", "type": "double"},
+    {"name": "tag", "type": ["null", "string"]},
+    {"name": "attrs", "type": {
+      "type": "map", "values": {"type": "fixed", "name": "Pair", "size": 2}
+    }},
+    {"name": "next", "type": ["null", "Node"]}
+  ]
+}
+"""
+
+
+def make_records():
+    array_slice = {
+        "dtype": "UINT16",
+        "little_endian": False,
+        "shape": [4, 4, 1, 2, 3],
+        "offsets": [0, 0, 1, -2, 300],
+        "deltas": [4, 4, 1, 1, 1],
+        "data": "".join(chr(_) for _ in xrange(256)),
+    }
+    signatures = {
+        "version": u"3.2",
+        "name": u"img_\xe8",
+        "img_path": u"/bar/spam/img_0.tif",
+        "series": 0, "z": 1, "c": 2, "t": 3,
+        "x": 1 << 20, "y": -5, "w": 400, "h": 300,
+    }
+    for vname, idx in FEATURE_NAMES.itervalues():
+        signatures.setdefault(vname, []).append(idx * .1 - 7)
+    signatures["zernike_coefficients"] = []
+    return {
+        "BioImgPlane": {
+            "name": u"img_0",
+            "img_path": u"/bar/spam/img_0.tif",
+            "dimension_order": u"XYZCT",
+            "series": 0,
+            "pixel_data": array_slice,
+        },
+        "Signatures": signatures,
+    }
+
+
+def generic_encode(s, datum):
+    f = StringIO()
+    DatumWriter(s).write(datum, BinaryEncoder(f))
+    return f.getvalue()
+
+
+def generic_decode(s, data):
+    return DatumReader(s).read(BinaryDecoder(StringIO(data)))
+
+
+class TestLong(unittest.TestCase):
+
+    def runTest(self):
+        for n in (0, 1, -1, 63, -64, 64, 1 << 31, -(1 << 31), (1 << 63) - 1,
+                  -(1 << 63)):
+            out = bytearray()
+            avro_codec.write_long(out, n)
+            f = StringIO()
+            BinaryEncoder(f).write_long(n)
+            self.assertEqual(str(out), f.getvalue())
+            self.assertEqual(avro_codec.read_long(memoryview(str(out)), 0),
+                             (n, len(out)))
+        for n in 1 << 63, -(1 << 63) - 1:
+            self.assertRaises(ValueError, avro_codec.write_long,
+                              bytearray(), n)
+        self.assertRaises(ValueError, avro_codec.write_int, bytearray(),
+                          1 << 31)
+
+
+class TestSchemas(unittest.TestCase):
+
+    def setUp(self):
+        self.records = make_records()
+
+    def test_encode(self):
+        for name, rec in self.records.iteritems():
+            s = avro.schema.parse(getattr(schema, name))
+            out = bytearray()
+            avro_codec.compile_encoder(s)(out, rec)
+            self.assertEqual(str(out), generic_encode(s, rec))
+
+    def test_decode(self):
+        for name, rec in self.records.iteritems():
+            s = avro.schema.parse(getattr(schema, name))
+            data = generic_encode(s, rec) * 2
+            decode = avro_codec.compile_decoder(s)
+            rec1, pos = decode(memoryview(data), 0)
+            self.assertEqual(rec1, generic_decode(s, data))
+            self.assertEqual(rec1, rec)
+            rec2, end = decode(memoryview(data), pos)
+            self.assertEqual(rec2, rec)
+            self.assertEqual(end, len(data))
+
+    def test_negative_block_count(self):
+        s = avro.schema.parse('{"type": "array", "items": "double"}')
+        f = StringIO()
+        enc = BinaryEncoder(f)
+        enc.write_long(-2)
+        enc.write_long(16)
+        enc.write_double(1.5)
+        enc.write_double(2.5)
+        enc.write_long(1)
+        enc.write_double(3.5)
+        enc.write_long(0)
+        decode = avro_codec.compile_decoder(s)
+        self.assertEqual(decode(memoryview(f.getvalue()), 0),
+                         ([1.5, 2.5, 3.5], len(f.getvalue())))
+
+    def test_other_types(self):
+        s = avro.schema.parse(LINKED_LIST)
+        rec = {
+            "value": 1.5,
+            "tag": None,
+            "attrs": {u"a": "\x00\x01", u"b": "\xff\xfe"},
+            "next": {"value": -2.0, "tag": u"x", "attrs": {}, "next": None},
+        }
+        data = generic_encode(s, rec)
+        out = bytearray()
+        avro_codec.compile_encoder(s)(out, rec)
+        self.assertEqual(str(out), data)
+        self.assertEqual(avro_codec.compile_decoder(s)(memoryview(data), 0),
+                         (rec, len(data)))
+
+    def test_union_branch(self):
+        # the generic writer picks the last matching branch
+        s = avro.schema.parse('["double", "long", "null"]')
+        for datum in 3, 3.5, None:
+            out = bytearray()
+            avro_codec.compile_encoder(s)(out, datum)
+            self.assertEqual(str(out), generic_encode(s, datum))
+        out = bytearray()
+        encode = avro_codec.compile_encoder(s)
+        self.assertRaises(TypeError, encode, out, "foo")
+
+
+def load_tests(loader, tests, pattern):
+    test_cases = (TestLong, TestSchemas)
+    suite = unittest.TestSuite()
+    for tc in test_cases:
+        suite.addTests(loader.loadTestsFromTestCase(tc))
+    return suite
+
+
+def main():
+    suite = load_tests(unittest.defaultTestLoader, None, None)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+# BEGIN_COPYRIGHT
+#
+# Copyright (C) 2017 Open Microscopy Environment:
+#   - University of Dundee
+#   - CRS4
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# END_COPYRIGHT
+
+
+import unittest
+
+import numpy as np
+
+import pyfeatures.backends as backends
+import pyfeatures.batch_features as batch_features
+from pyfeatures.feature_layout import (
+    SUBVECTOR_NAMES, TileSignatures, get_feature_names, to_avro
+)
+
+
+class TestRegistry(unittest.TestCase):
+
+    def runTest(self):
+        for name in "wndcharm", "numpy", "stub":
+            self.assertTrue(name in backends.BACKENDS)
+        self.assertTrue(isinstance(backends.get_backend("stub"),
+                                   backends.StubBackend))
+        self.assertRaises(ValueError, backends.get_backend, "foo")
+
+        @backends.register_backend
+        class FooBackend(backends.StubBackend):
+            name = "foo"
+        try:
+            b = backends.get_backend("foo", long=True)
+            self.assertTrue(isinstance(b, FooBackend))
+            self.assertTrue(b.long)
+        finally:
+            del backends.BACKENDS["foo"]
+
+
+class TestBatchBackends(unittest.TestCase):
+
+    def setUp(self):
+        self.tiles = np.random.randint(0, 256, (6, 4, 5)).astype(np.uint8)
+
+    def test_stub(self):
+        b = backends.StubBackend()
+        names, values = b.compute(self.tiles)
+        self.assertEqual(names, b.names)
+        self.assertEqual(values.shape, (6, 5))
+        for row, t in zip(values, self.tiles):
+            self.assertEqual(row.tolist(), [t.sum() + _ for _ in xrange(5)])
+        grid = self.tiles.reshape((2, 3) + self.tiles.shape[1:])
+        self.assertTrue(np.array_equal(b.compute(grid)[1], values))
+        self.assertEqual(b.compute(self.tiles[0])[1].shape, (1, 5))
+
+    def test_numpy(self):
+        b = backends.NumpyBackend()
+        self.assertEqual(b.families, sorted(batch_features.FAMILIES))
+        names, values = b.compute(self.tiles)
+        exp_names, exp_values = batch_features.compute(self.tiles,
+                                                       b.families)
+        self.assertEqual(names, exp_names)
+        self.assertEqual(names, b.names)
+        self.assertTrue(np.array_equal(values, exp_values))
+        b = backends.NumpyBackend(
+            feature_names=get_feature_names(["gini_coefficient"])
+        )
+        self.assertEqual(b.families, ["gini_coefficient"])
+        self.assertEqual(b.compute(self.tiles)[1].shape, (6, 1))
+        for subset in (["haralick_textures"],
+                       ["gini_coefficient", "haralick_textures",
+                        "zernike_coefficients"]):
+            with self.assertRaises(ValueError) as cm:
+                backends.NumpyBackend(feature_names=get_feature_names(subset))
+            self.assertTrue(str(cm.exception).endswith(
+                ", ".join(_ for _ in subset if _ != "gini_coefficient")
+            ))
+
+    def test_to_avro(self):
+        for b in backends.StubBackend(), backends.NumpyBackend():
+            names, values = b.compute(self.tiles)
+            rec = to_avro(TileSignatures("foo", b.version, names, values[0],
+                                         x=1, y=2, w=5, h=4))
+            self.assertEqual(rec["version"], b.name)
+            self.assertEqual((rec["x"], rec["y"], rec["w"], rec["h"]),
+                             (1, 2, 5, 4))
+            self.assertEqual(sum(len(rec[_]) for _ in SUBVECTOR_NAMES),
+                             len(names))
+
+    def test_benchmark(self):
+        res = backends.benchmark(
+            [backends.StubBackend(), backends.NumpyBackend()], self.tiles,
+            repeat=1
+        )
+        self.assertEqual(sorted(res), ["numpy", "stub"])
+        self.assertTrue(all(_ >= 0 for _ in res.itervalues()))
+
+
+def load_tests(loader, tests, pattern):
+    test_cases = (TestRegistry, TestBatchBackends)
+    suite = unittest.TestSuite()
+    for tc in test_cases:
+        suite.addTests(loader.loadTestsFromTestCase(tc))
+    return suite
+
+
+def main():
+    suite = load_tests(unittest.defaultTestLoader, None, None)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
+
+
+if __name__ == '__main__':
+    main()
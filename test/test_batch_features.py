@@ -0,0 +1,187 @@
+# BEGIN_COPYRIGHT
+#
+# Copyright (C) 2017 Open Microscopy Environment:
+#   - University of Dundee
+#   - CRS4
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# END_COPYRIGHT
+
+
+import unittest
+
+import numpy as np
+
+import pyfeatures.batch_features as bf
+from pyfeatures.feature_names import FEATURE_NAMES
+
+
+# straightforward per-tile versions of the WND-CHARM code
+
+def ref_pixel_intensity_statistics(a):
+    v = sorted(a.ravel().astype(float))
+    n = len(v)
+    mean = sum(v) / n
+    std = (sum((_ - mean) ** 2 for _ in v) / (n - 1)) ** .5 if n > 1 else 0
+    return [mean, v[n // 2], std, v[0], v[-1]]
+
+
+def ref_histogram(a, n_bins):
+    mn, mx = a.min(), a.max()
+    bins = [0] * n_bins
+    for v in a.ravel():
+        if v == mx:
+            b = n_bins - 1
+        else:
+            b = int((v - mn) * n_bins / float(mx - mn))
+        bins[b] += 1
+    return bins
+
+
+def ref_multiscale_histograms(a):
+    out = []
+    for n_bins in 3, 5, 7, 9:
+        out.extend(ref_histogram(a, n_bins))
+    mx = float(max(out))
+    return [_ / mx for _ in out]
+
+
+def ref_gini_coefficient(a):
+    pixels = sorted(float(_) for _ in a.ravel() if _ > 0)
+    count = len(pixels)
+    if count <= 1:
+        return [0.]
+    mean = sum(pixels) / count
+    g = sum((2. * i - count - 1) * pixels[i - 1]
+            for i in xrange(1, count + 1))
+    return [g / (mean * count * (count - 1))]
+
+
+class TestFamilies(unittest.TestCase):
+
+    def setUp(self):
+        self.tiles = np.random.randint(0, 256, (4, 6, 5)).astype(np.uint8)
+        self.tiles[1] = 7  # constant
+        self.tiles[2, :, :3] = 0  # some zeros
+        self.tiles[3] = 0
+        self.tiles[3, 0, 0] = 1  # a single positive pixel
+
+    def __check(self, func, ref_func, n_values):
+        out = func(self.tiles)
+        self.assertEqual(out.shape, (len(self.tiles), n_values))
+        for v, t in zip(out, self.tiles):
+            self.assertTrue(np.allclose(v, ref_func(t)))
+
+    def test_pixel_intensity_statistics(self):
+        self.__check(bf.pixel_intensity_statistics,
+                     ref_pixel_intensity_statistics, 5)
+
+    def test_multiscale_histograms(self):
+        self.__check(bf.multiscale_histograms, ref_multiscale_histograms, 24)
+
+    def test_gini_coefficient(self):
+        self.__check(bf.gini_coefficient, ref_gini_coefficient, 1)
+
+    def test_grid(self):
+        grid = self.tiles.reshape((2, 2) + self.tiles.shape[1:])
+        for _, func in bf.FAMILIES.itervalues():
+            self.assertTrue(np.array_equal(func(grid), func(self.tiles)))
+
+
+class TestCompute(unittest.TestCase):
+
+    def runTest(self):
+        tiles = np.random.randint(0, 256, (3, 4, 4))
+        names, values = bf.compute(tiles, bf.FAMILIES)
+        self.assertEqual(values.shape, (3, 30))
+        self.assertEqual(len(names), 30)
+        vnames = [FEATURE_NAMES[_] for _ in names]
+        self.assertEqual(vnames[0], ("gini_coefficient", 0))
+        self.assertEqual(vnames[1:25], [("multiscale_histograms", _)
+                                        for _ in xrange(24)])
+        self.assertEqual(vnames[-1], ("pixel_intensity_statistics", 4))
+        names, values = bf.compute(tiles, [])
+        self.assertEqual((names, values.shape), ([], (3, 0)))
+        self.assertRaises(ValueError, bf.compute, tiles, ["zernike"])
+
+
+class TestChunks(unittest.TestCase):
+
+    def setUp(self):
+        self.tiles = np.random.randint(0, 256, (2, 3, 4, 5))
+
+    def test_chunks(self):
+        stack = self.tiles.reshape(6, 4, 5)
+        for t in self.tiles, stack:
+            chunks = list(bf.iter_chunks(t, max_pixels=45))
+            self.assertEqual([len(_) for _ in chunks], [2, 2, 2])
+            self.assertTrue(np.array_equal(np.vstack(chunks), stack))
+        chunks = list(bf.iter_chunks(stack, max_pixels=1))
+        self.assertEqual(len(chunks), 6)
+        self.assertEqual(list(bf.iter_chunks(stack[0]))[0].shape, (1, 4, 5))
+        old_chunk_pixels = bf.CHUNK_PIXELS
+        bf.CHUNK_PIXELS = 40
+        try:
+            names, values = bf.compute(self.tiles, bf.FAMILIES)
+        finally:
+            bf.CHUNK_PIXELS = old_chunk_pixels
+        self.assertTrue(np.array_equal(
+            values, bf.compute(self.tiles, bf.FAMILIES)[1]
+        ))
+
+    def test_windows(self):
+        coords = [(i, j, min(10, 37 - i), min(10, 50 - j))
+                  for i in xrange(0, 37, 3) for j in xrange(0, 50, 4)]
+        for dtype, low, high in ((np.uint16, 0, 1 << 12),
+                                 (np.uint32, 0, 1 << 32),
+                                 (np.int32, -(1 << 31), 1 << 31)):
+            a = np.random.randint(low, high, (37, 50), dtype=np.int64)
+            a = a.astype(dtype)
+            a[:10, :10] = 7  # constant tile
+            for families in bf.FAMILIES, ["gini_coefficient"], []:
+                names, values = bf.compute_windows(a, coords, families)
+                self.assertEqual(values.shape, (len(coords), len(names)))
+                for (i, j, h, w), v in zip(coords, values):
+                    exp_names, exp_v = bf.compute(a[i: i + h, j: j + w],
+                                                  families)
+                    self.assertEqual(names, exp_names)
+                    self.assertTrue(np.allclose(v, exp_v[0]))
+        rows = []
+        for sel, chunk in bf.iter_window_chunks(a, coords, max_pixels=300):
+            self.assertTrue(chunk.size <= 300)
+            for k, t in zip(sel, chunk):
+                i, j, h, w = coords[k]
+                self.assertTrue(np.array_equal(t, a[i: i + h, j: j + w]))
+            rows.extend(sel)
+        self.assertEqual(sorted(rows), range(len(coords)))
+        names, values = bf.compute_windows(a, [], bf.FAMILIES)
+        self.assertEqual(values.shape, (0, 30))
+
+
+def load_tests(loader, tests, pattern):
+    test_cases = (TestFamilies, TestCompute, TestChunks)
+    suite = unittest.TestSuite()
+    for tc in test_cases:
+        suite.addTests(loader.loadTestsFromTestCase(tc))
+    return suite
+
+
+def main():
+    suite = load_tests(unittest.defaultTestLoader, None, None)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
+
+
+if __name__ == '__main__':
+    main()
@@ -83,6 +83,11 @@ class TestArraySlice(unittest.TestCase):
             self.assertEqual(sl.offsets, self.offsets)
             self.assertEqual(sl.deltas, self.deltas)
             self.assertTrue(np.array_equal(sl.data, a))
+            self.assertFalse(sl.data.flags.writeable)
+            sl = bioimg.ArraySlice(record, copy=True)
+            self.assertTrue(np.array_equal(sl.data, a))
+            self.assertTrue(sl.data.flags.writeable)
+            self.assertTrue(sl.data.dtype.isnative)
 
 
 class TestBioImgPlane(TestArraySlice):
@@ -123,10 +128,23 @@ class TestBioImgPlane(TestArraySlice):
         self.assertEqual(plane.z, self.zct["Z"])
         self.assertEqual(plane.c, self.zct["C"])
         self.assertEqual(plane.t, self.zct["T"])
+        xy_shape = plane.get_xy_shape()
+        self.assertEqual(plane.get_xy().shape, xy_shape)
+        self.assertEqual(plane.get_xy_shape(), xy_shape)
+
+
+class TestLazyBioImgPlane(TestBioImgPlane):
+
+    def runTest(self):
+        self.record["pixel_data"]["deltas"][-1] = 1
+        self.record["pixel_data"]["data"] = "bad size"
+        plane = bioimg.BioImgPlane(self.record)  # pixels not decoded yet
+        self.assertEqual(plane.z, self.zct["Z"])
+        self.assertRaises(ValueError, plane.get_xy)
 
 
 def load_tests(loader, tests, pattern):
-    test_cases = (TestArraySlice, TestBioImgPlane)
+    test_cases = (TestArraySlice, TestBioImgPlane, TestLazyBioImgPlane)
     suite = unittest.TestSuite()
     for tc in test_cases:
         suite.addTests(loader.loadTestsFromTestCase(tc))
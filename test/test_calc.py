@@ -0,0 +1,133 @@
+# BEGIN_COPYRIGHT
+#
+# Copyright (C) 2017 Open Microscopy Environment:
+#   - University of Dundee
+#   - CRS4
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# END_COPYRIGHT
+
+import argparse
+import os
+import shutil
+import tempfile
+import unittest
+import warnings
+
+import numpy as np
+
+import pyfeatures.pyavroc_emu as pyavroc_emu
+with warnings.catch_warnings():
+    warnings.simplefilter("ignore")
+    import pyfeatures.app.calc as calc
+from pyfeatures.app.common import NullLogger
+from pyfeatures.feature_layout import is_skipped
+from pyfeatures.schema import BioImgPlane
+
+LOGGER = NullLogger()
+SIZEZ, H, W = 3, 20, 24
+
+
+def make_records():
+    records = []
+    for z in xrange(SIZEZ):
+        a = np.random.randint(0, 256, (H, W)).astype(np.uint8)
+        records.append({
+            "name": u"img_0",
+            "img_path": u"/bar/spam/img_0.tif",
+            "dimension_order": u"XYZCT",
+            "series": 0,
+            "pixel_data": {
+                "dtype": "UINT8",
+                "little_endian": True,
+                "shape": [W, H, SIZEZ, 1, 1],
+                "offsets": [0, 0, z, 0, 0],
+                "deltas": [W, H, 1, 1, 1],
+                "data": a.tostring(),
+            },
+        })
+    return records
+
+
+def get_key(rec):
+    return rec["z"], rec["c"], rec["t"], rec["y"], rec["x"]
+
+
+class Base(unittest.TestCase):
+
+    def setUp(self):
+        self.wd = tempfile.mkdtemp(prefix="pyfeatures_")
+        self.in_fn = os.path.join(self.wd, "img_0.avro")
+        with open(self.in_fn, "w") as f:
+            writer = pyavroc_emu.AvroFileWriter(f, BioImgPlane)
+            for r in make_records():
+                writer.write(r)
+            writer.close()
+        parser = argparse.ArgumentParser()
+        self.calc_parser = calc.add_parser(parser.add_subparsers())
+
+    def tearDown(self):
+        shutil.rmtree(self.wd)
+
+    def _run(self, out_dir, *argv):
+        out_dir = os.path.join(self.wd, out_dir)
+        args = self.calc_parser.parse_args([
+            self.in_fn, "-o", out_dir, "--backend", "stub", "-W", "4",
+            "-H", "5"
+        ] + list(argv))
+        calc.run(LOGGER, args)
+        with open(os.path.join(out_dir, "img_0_features.avro")) as f:
+            return list(pyavroc_emu.AvroFileReader(f))
+
+
+class TestWorkers(Base):
+
+    def test_workers(self):
+        exp_records = self._run("serial")
+        self.assertEqual(len(exp_records), SIZEZ * 4 * 6)
+        self.assertEqual([get_key(_) for _ in exp_records],
+                         sorted(get_key(_) for _ in exp_records))
+        records = self._run("ordered", "--workers", "2", "--keep-order")
+        self.assertEqual(records, exp_records)
+        records = self._run("unordered", "--workers", "2")
+        self.assertEqual(sorted(records, key=get_key), exp_records)
+
+
+class TestRuns(Base):
+
+    def test_options_do_not_leak(self):
+        records = self._run("first", "--skip-background", "range",
+                            "--background-threshold", "1000")
+        self.assertTrue(all(is_skipped(_) for _ in records))
+        records = self._run("second", "--backend", "numpy")
+        self.assertFalse(any(is_skipped(_) for _ in records))
+        self.assertEqual(set(_["version"] for _ in records), set(["numpy"]))
+
+
+def load_tests(loader, tests, pattern):
+    test_cases = (TestWorkers, TestRuns)
+    suite = unittest.TestSuite()
+    for tc in test_cases:
+        suite.addTests(loader.loadTestsFromTestCase(tc))
+    return suite
+
+
+def main():
+    suite = load_tests(unittest.defaultTestLoader, None, None)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
+
+
+if __name__ == '__main__':
+    main()
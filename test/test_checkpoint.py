@@ -0,0 +1,115 @@
+# BEGIN_COPYRIGHT
+#
+# Copyright (C) 2017 Open Microscopy Environment:
+#   - University of Dundee
+#   - CRS4
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# END_COPYRIGHT
+
+import unittest
+import os
+import shutil
+import tempfile
+
+import pyfeatures.checkpoint as checkpoint
+
+
+class TestJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.wd = tempfile.mkdtemp(prefix="pyfeatures_")
+        self.fn = checkpoint.get_journal_fn(os.path.join(self.wd, "foo"))
+
+    def tearDown(self):
+        shutil.rmtree(self.wd)
+
+    def test_missing(self):
+        self.assertEqual(checkpoint.load_journal(self.fn), (set(), None))
+
+    def test_roundtrip(self):
+        journal = checkpoint.Journal(self.fn)
+        units = [(0, 0, 0, 0, 0), (0, 0, 0, 10, 0), (1, 0, 0, 0, 0)]
+        for u in units[:2]:
+            journal.add(u)
+        journal.commit(100)
+        journal.add(units[2])
+        journal.commit(200)
+        journal.add((1, 0, 0, 10, 0))  # not committed
+        journal.close()
+        self.assertEqual(checkpoint.load_journal(self.fn), (set(units), 200))
+
+    def test_truncated(self):
+        journal = checkpoint.Journal(self.fn)
+        journal.add((0, 0, 0, 0, 0))
+        journal.commit(100)
+        journal.close()
+        with open(self.fn, "a") as f:
+            f.write("u 1 0 0 0 0\ns 2")
+        self.assertEqual(checkpoint.load_journal(self.fn),
+                         ({(0, 0, 0, 0, 0)}, 100))
+
+    def test_rewrite(self):
+        units = set([(0, 0, 0, 0, 0), (0, 0, 0, 10, 0)])
+        journal = checkpoint.Journal(self.fn)
+        for u in units:
+            journal.add(u)
+        journal.commit(100)
+        journal.close()
+        journal = checkpoint.Journal(self.fn, committed=units, offset=100)
+        # committed units are back in place before anything else is added
+        self.assertEqual(checkpoint.load_journal(self.fn), (units, 100))
+        self.assertEqual(os.listdir(self.wd), [os.path.basename(self.fn)])
+        journal.add((1, 0, 0, 0, 0))
+        journal.commit(200)
+        journal.close()
+        self.assertEqual(checkpoint.load_journal(self.fn),
+                         (units | set([(1, 0, 0, 0, 0)]), 200))
+
+    def test_params(self):
+        self.assertTrue(checkpoint.load_params(self.fn) is None)
+        params = {"series": 0, "width": 16, "features": ["foo", "bar"],
+                  "backend": "wndcharm", "height": None}
+        journal = checkpoint.Journal(self.fn, params=params)
+        journal.add((0, 0, 0, 0, 0))
+        journal.commit(100)
+        journal.close()
+        saved = checkpoint.load_params(self.fn)
+        self.assertEqual(saved, params)
+        self.assertEqual(checkpoint.load_journal(self.fn),
+                         ({(0, 0, 0, 0, 0)}, 100))
+        self.assertEqual(checkpoint.get_mismatches(params, saved), [])
+        other = dict(params, width=32, long=True)
+        self.assertEqual(checkpoint.get_mismatches(other, saved),
+                         ["long", "width"])
+        checkpoint.Journal(self.fn).close()  # no params
+        self.assertTrue(checkpoint.load_params(self.fn) is None)
+
+
+def load_tests(loader, tests, pattern):
+    test_cases = (TestJournal,)
+    suite = unittest.TestSuite()
+    for tc in test_cases:
+        suite.addTests(loader.loadTestsFromTestCase(tc))
+    return suite
+
+
+def main():
+    suite = load_tests(unittest.defaultTestLoader, None, None)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
+
+
+if __name__ == '__main__':
+    main()
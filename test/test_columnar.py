@@ -0,0 +1,145 @@
+# BEGIN_COPYRIGHT
+#
+# Copyright (C) 2017 Open Microscopy Environment:
+#   - University of Dundee
+#   - CRS4
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# END_COPYRIGHT
+
+import unittest
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from pyfeatures.app.plot import get_columnar_data
+from pyfeatures.columnar import ColumnarReader, ColumnarWriter, is_columnar
+from pyfeatures.feature_layout import SKIPPED_VERSION
+
+
+def make_record(i):
+    return {
+        "version": "3.2",
+        "name": "img_0",
+        "img_path": "/bar/spam/img_0.tif",
+        "series": 0, "z": i, "c": 0, "t": 0,
+        "x": 10 * i, "y": 0, "w": 10, "h": 20,
+        "foo": [float(i), i + .5],
+        "bar": [float(-i)],
+        "empty": [],
+    }
+
+
+class TestColumnar(unittest.TestCase):
+
+    def setUp(self):
+        self.wd = tempfile.mkdtemp(prefix="pyfeatures_")
+        self.path = os.path.join(self.wd, "foo.cols")
+        self.records = [make_record(_) for _ in xrange(5)]
+
+    def tearDown(self):
+        shutil.rmtree(self.wd)
+
+    def test_roundtrip(self):
+        writer = ColumnarWriter(self.path)
+        for r in self.records:
+            writer.write(r)
+        writer.close()
+        self.assertTrue(is_columnar(self.path))
+        reader = ColumnarReader(self.path)
+        self.assertEqual(len(reader), len(self.records))
+        self.assertEqual(reader.columns, ["bar", "empty", "foo"])
+        for name in reader.columns:
+            a = reader.get(name)
+            self.assertEqual(a.shape, (len(self.records), len(
+                self.records[0][name]
+            )))
+            self.assertTrue(np.array_equal(a, [_[name] for _ in self.records]))
+        for k in "name", "img_path", "version", "z", "x", "w", "h":
+            self.assertEqual(reader.meta[k].tolist(),
+                             [_[k] for _ in self.records])
+
+    def test_skipped(self):
+        for i in 0, 3:
+            r = self.records[i]
+            r["version"] = SKIPPED_VERSION
+            for k in "foo", "bar":
+                r[k] = []
+        writer = ColumnarWriter(self.path)
+        for r in self.records:
+            writer.write(r)
+        writer.close()
+        reader = ColumnarReader(self.path)
+        self.assertEqual(len(reader), len(self.records))
+        self.assertEqual(reader.meta["z"].tolist(), range(5))
+        foo = reader.get("foo")
+        self.assertEqual(foo.shape, (5, 2))
+        self.assertTrue(np.isnan(foo[[0, 3]]).all())
+        self.assertTrue(np.array_equal(foo[[1, 2, 4]],
+                                       [[1, 1.5], [2, 2.5], [4, 4.5]]))
+
+    def test_plot_data(self):
+        for i, r in enumerate(self.records):
+            r["x"] = 0
+            if i in (0, 3):
+                r["version"] = SKIPPED_VERSION
+                for k in "foo", "bar":
+                    r[k] = []
+        writer = ColumnarWriter(self.path)
+        for r in self.records:
+            writer.write(r)
+        writer.close()
+        data = get_columnar_data(self.path, "z")
+        self.assertEqual(data.keys(), [(0, 0)])  # c, t
+        self.assertEqual(data[(0, 0)].keys(), [(0, 0)])  # x, y
+        v = data[(0, 0)][(0, 0)]
+        self.assertEqual(v[("foo", 0)], [1., 2., 4.])
+        self.assertEqual(v[("foo", 1)], [1.5, 2.5, 4.5])
+        self.assertEqual(v[("bar", 0)], [-1., -2., -4.])
+
+    def test_all_skipped(self):
+        writer = ColumnarWriter(self.path)
+        for r in self.records:
+            r["version"] = SKIPPED_VERSION
+            writer.write(r)
+        writer.close()
+        reader = ColumnarReader(self.path)
+        self.assertEqual(len(reader), len(self.records))
+        self.assertEqual(reader.columns, [])
+
+    def test_bad_width(self):
+        writer = ColumnarWriter(self.path)
+        writer.write(self.records[0])
+        self.records[1]["foo"].append(1.)
+        self.assertRaises(ValueError, writer.write, self.records[1])
+
+
+def load_tests(loader, tests, pattern):
+    test_cases = (TestColumnar,)
+    suite = unittest.TestSuite()
+    for tc in test_cases:
+        suite.addTests(loader.loadTestsFromTestCase(tc))
+    return suite
+
+
+def main():
+    suite = load_tests(unittest.defaultTestLoader, None, None)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+# BEGIN_COPYRIGHT
+#
+# Copyright (C) 2017 Open Microscopy Environment:
+#   - University of Dundee
+#   - CRS4
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# END_COPYRIGHT
+
+import unittest
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from pyfeatures.feature_cache import (
+    FeatureCache, TileSignatures, get_key, get_options_id
+)
+
+
+def make_signatures(n, version="2.0"):
+    names = ["f%d" % _ for _ in xrange(n)]
+    return TileSignatures("foo", version, names, np.arange(n, dtype="f8"))
+
+
+class TestGetKey(unittest.TestCase):
+
+    def setUp(self):
+        self.a = np.arange(12, dtype="u2").reshape(3, 4)
+        self.opt = get_options_id(False, "1")
+
+    def test_content(self):
+        k = get_key(self.a, self.opt)
+        self.assertEqual(get_key(self.a.copy(), self.opt), k)
+        big = np.zeros((6, 8), dtype="u2")
+        big[1:4, 2:6] = self.a
+        self.assertEqual(get_key(big[1:4, 2:6], self.opt), k)
+        b = self.a.copy()
+        b[0, 0] += 1
+        self.assertNotEqual(get_key(b, self.opt), k)
+
+    def test_options(self):
+        k = get_key(self.a, self.opt)
+        self.assertEqual(get_options_id(False, "1"), self.opt)
+        for opt in (get_options_id(True, "1"), get_options_id(False, "2"),
+                    get_options_id(False, "1", feature_names=["f0"])):
+            self.assertNotEqual(opt, self.opt)
+            self.assertNotEqual(get_key(self.a, opt), k)
+        self.assertNotEqual(get_key(self.a.astype("u4"), self.opt), k)
+        self.assertNotEqual(get_key(self.a.reshape(4, 3), self.opt), k)
+
+
+class TestFeatureCache(unittest.TestCase):
+
+    def setUp(self):
+        self.wd = tempfile.mkdtemp(prefix="pyfeatures_")
+        self.path = os.path.join(self.wd, "cache")
+
+    def tearDown(self):
+        shutil.rmtree(self.wd)
+
+    def test_get_put(self):
+        cache = FeatureCache(self.path)
+        self.assertTrue(cache.get("k", "foo") is None)
+        sig = make_signatures(10)
+        cache.put("k", sig)
+        for c in cache, FeatureCache(self.path):
+            cached = c.get("k", "bar")
+            self.assertEqual(cached.basename, "bar")
+            self.assertEqual(cached.feature_set_version, "2.0")
+            self.assertEqual(cached.feature_names, sig.feature_names)
+            self.assertEqual(cached.values.tolist(), sig.values.tolist())
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_evict(self):
+        cache = FeatureCache(self.path, low_water=1)
+        cache.put("k0", make_signatures(100))
+        entry_size = cache.size
+        cache.max_size = 2 * entry_size
+        cache.put("k1", make_signatures(100))
+        os.utime(os.path.join(self.path, "k0.npy"), (0, 0))
+        os.utime(os.path.join(self.path, "k1.npy"), (1, 1))
+        self.assertFalse(cache.get("k0", "foo") is None)  # k0 is now newer
+        cache.put("k2", make_signatures(100))
+        self.assertEqual(cache.size, 2 * entry_size)
+        self.assertTrue(cache.get("k1", "foo") is None)
+        for k in "k0", "k2":
+            self.assertFalse(cache.get(k, "foo") is None)
+        self.assertEqual(FeatureCache(self.path).size, 2 * entry_size)
+
+    def test_low_water(self):
+        cache = FeatureCache(self.path)
+        cache.put("k0", make_signatures(100))
+        entry_size = cache.size
+        cache.max_size = 10 * entry_size
+        for k in xrange(1, 10):
+            cache.put("k%d" % k, make_signatures(100))
+        for k in xrange(10):
+            os.utime(os.path.join(self.path, "k%d.npy" % k), (k, k))
+        cache.put("k10", make_signatures(100))
+        # evicted down to 90% of the maximum size, oldest first
+        self.assertEqual(cache.size, 9 * entry_size)
+        for k in xrange(11):
+            self.assertEqual(cache.get("k%d" % k, "foo") is None, k < 2)
+        cache.put("k11", make_signatures(100))  # no eviction
+        self.assertEqual(cache.size, 10 * entry_size)
+        self.assertRaises(ValueError, FeatureCache, self.path, low_water=0)
+
+
+def load_tests(loader, tests, pattern):
+    test_cases = (TestGetKey, TestFeatureCache)
+    suite = unittest.TestSuite()
+    for tc in test_cases:
+        suite.addTests(loader.loadTestsFromTestCase(tc))
+    return suite
+
+
+def main():
+    suite = load_tests(unittest.defaultTestLoader, None, None)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
+
+
+if __name__ == '__main__':
+    main()
@@ -30,10 +30,16 @@ from libtiff import TIFF
 from avro.schema import AvroException
 from wndcharm.FeatureVector import FeatureVector
 
-from pyfeatures.feature_calc import gen_tiles, calc_features, to_avro
+from pyfeatures.feature_calc import (
+    SUBVECTOR_NAMES, FeatureSet, ImageMatrixPool, gen_tiles, get_tile_stack,
+    calc_features, calc_tile_features, get_feature_names, to_avro
+)
+from pyfeatures.backends import StubBackend
+from pyfeatures.feature_layout import SKIPPED_VERSION, is_skipped
 from pyfeatures.feature_names import FEATURE_NAMES
 import pyfeatures.pyavroc_emu as pyavroc_emu
 from pyfeatures.schema import Signatures
+from pyfeatures.tile_filter import TileFilter
 
 
 W, H = 8, 6
@@ -107,6 +113,51 @@ class TestGenTiles(unittest.TestCase):
                 self.assertTrue(np.array_equal(t, self.a[i1: i2, j1: j2]))
 
 
+class TestGetTileStack(TestGenTiles):
+
+    def runTest(self):
+        for kwargs, _ in self.cases + [({'w': 3, 'h': 4}, None),
+                                       ({'w': 5, 'h': 2, 'dx': 3, 'dy': 3},
+                                        None)]:
+            exp_tiles = list(gen_tiles(self.a, **kwargs))
+            tiles, coords, edge_coords = get_tile_stack(self.a, **kwargs)
+            self.assertFalse(tiles.flags.writeable)
+            self.assertEqual(len(coords) + len(edge_coords), len(exp_tiles))
+            tiles = tiles.reshape((-1,) + tiles.shape[2:])
+            for t, (i, j) in izip(tiles, coords):
+                self.assertTrue(np.array_equal(
+                    t, self.a[i: i + t.shape[0], j: j + t.shape[1]]
+                ))
+            all_coords = [(i, j) for i, j in coords.tolist()]
+            all_coords.extend((i, j) for i, j, _, _ in edge_coords)
+            self.assertEqual(sorted(all_coords),
+                             [(i, j) for i, j, _ in exp_tiles])
+            exp_edge = [(i, j) + t.shape for i, j, t in exp_tiles
+                        if t.shape != tiles.shape[1:]]
+            self.assertEqual(edge_coords, exp_edge)
+
+
+class TestImageMatrixPool(unittest.TestCase):
+
+    def runTest(self):
+        pool = ImageMatrixPool(max_edge_shapes=1)
+        a = make_random_data()
+        m1 = pool.get(a[:4, :3])
+        self.assertTrue(np.array_equal(m1.as_ndarray(), a[:4, :3]))
+        m2 = pool.get(a[:4, 3:6])
+        self.assertTrue(m2 is m1)
+        self.assertTrue(np.array_equal(m2.as_ndarray(), a[:4, 3:6]))
+        e1 = pool.get(a[:4, 6:])
+        self.assertFalse(e1 is m1)
+        self.assertEqual(e1.as_ndarray().shape, (4, 2))
+        self.assertTrue(pool.get(a[:4, 6:]) is e1)
+        e2 = pool.get(a[4:, 6:])  # evicts e1
+        self.assertFalse(pool.get(a[:4, 6:]) is e1)
+        self.assertTrue(np.array_equal(e2.as_ndarray(), a[4:, 6:]))
+        self.assertTrue(pool.get(a[4:, :3]) is not m1)
+        self.assertTrue(pool.get(a[:4, :3]) is m1)
+
+
 class Base(unittest.TestCase):
 
     def setUp(self):
@@ -168,6 +219,56 @@ class TestFeatureCalc(Base):
         self.assertEqual((s[3].x, s[3].y, s[3].w, s[3].h), (3, 3, 5, 2))
         self.assertFeaturesEqual(s[3], self.__get_exp_features(a[3:5, 3:]))
 
+    def test_batch_families(self):
+        a = make_random_data()
+        families = ["gini_coefficient", "multiscale_histograms",
+                    "pixel_intensity_statistics"]
+        for feature_names in None, get_feature_names(families[1:]):
+            exp_s = list(calc_features(a, self.name, w=3, h=4,
+                                       feature_names=feature_names))
+            s = list(calc_features(a, self.name, w=3, h=4,
+                                   feature_names=feature_names,
+                                   batch_families=families))
+            self.assertEqual(len(s), len(exp_s))
+            for sigs, exp_sigs in izip(s, exp_s):
+                self.assertEqual(sorted(sigs.feature_names),
+                                 sorted(exp_sigs.feature_names))
+                exp_values = dict(izip(exp_sigs.feature_names,
+                                       exp_sigs.values))
+                for name, v in izip(sigs.feature_names, sigs.values):
+                    self.assertAlmostEqual(v, exp_values[name], places=5)
+
+    def test_backend(self):
+        a = make_random_data()
+        backend = StubBackend()
+        s = list(calc_features(a, self.name, w=3, h=4, backend=backend))
+        exp_tiles = list(gen_tiles(a, w=3, h=4))
+        self.assertEqual(len(s), len(exp_tiles))
+        for sigs, (i, j, tile) in izip(s, exp_tiles):
+            self.assertEqual((sigs.x, sigs.y), (j, i))
+            self.assertEqual((sigs.h, sigs.w), tile.shape)
+            self.assertEqual(sigs.basename, self.name)
+            self.assertEqual(sigs.feature_set_version, backend.version)
+            self.assertEqual(sigs.feature_names, backend.names)
+            self.assertEqual(list(sigs.values),
+                             list(backend.compute(tile)[1][0]))
+
+    def test_tile_filter(self):
+        a = make_random_data()
+        a[:4, :3] = 7
+        backend = StubBackend()
+        tf = TileFilter("range")
+        s = list(calc_features(a, self.name, w=3, h=4, backend=backend,
+                               tile_filter=tf))
+        self.assertEqual(len(s), len(list(gen_tiles(a, w=3, h=4))))
+        self.assertEqual(s[0].feature_set_version, SKIPPED_VERSION)
+        self.assertEqual(len(s[0].values), 0)
+        rec = to_avro(s[0])
+        self.assertTrue(is_skipped(rec))
+        self.assertFalse(any(rec[_] for _ in SUBVECTOR_NAMES))
+        for sigs in s[1:]:
+            self.assertEqual(sigs.feature_set_version, backend.version)
+
     def assertFeaturesEqual(self, fv1, fv2):
         for name in "feature_names", "feature_set_version":
             self.assertEquals(getattr(fv1, name), getattr(fv2, name))
@@ -248,9 +349,37 @@ class TestToAvro(Base):
         self.assertEqual(
             (r[5]["x"], r[5]["y"], r[5]["w"], r[5]["h"]), (6, 4, 2, 2))
 
+    def test_feature_subset(self):
+        a = make_random_data()
+        subset = "pixel_intensity_statistics", "haralick_textures_fourier"
+        names = get_feature_names(subset)
+        sigs, = calc_features(a, self.name, feature_names=names)
+        self.assertEqual(list(sigs.feature_names), names)
+        rec = to_avro(sigs)
+        for vname in SUBVECTOR_NAMES:
+            if vname in subset:
+                self.assertTrue(len(rec[vname]) > 0)
+            else:
+                self.assertEqual(len(rec[vname]), 0)
+        self.assertRaises(ValueError, get_feature_names, ["foo"])
+
+    def test_feature_set(self):
+        a = make_random_data()
+        names = get_feature_names(["pixel_intensity_statistics"])
+        fs = FeatureSet(feature_names=names)
+        recs = []
+        for _ in xrange(2):
+            sigs = calc_tile_features(a, self.name, feature_set=fs)
+            rec = fs.to_avro(sigs)
+            self.assertEqual(rec, to_avro(sigs))
+            recs.append(rec)
+        self.assertTrue(fs.get_layout(sigs) is fs.get_layout(sigs))
+        self.assertEqual(recs[0], recs[1])
+
 
 def load_tests(loader, tests, pattern):
-    test_cases = (TestGenTiles, TestFeatureCalc, TestToAvro)
+    test_cases = (TestGenTiles, TestGetTileStack, TestImageMatrixPool,
+                  TestFeatureCalc, TestToAvro)
     suite = unittest.TestSuite()
     for tc in test_cases:
         suite.addTests(loader.loadTestsFromTestCase(tc))
@@ -0,0 +1,143 @@
+# BEGIN_COPYRIGHT
+#
+# Copyright (C) 2017 Open Microscopy Environment:
+#   - University of Dundee
+#   - CRS4
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# END_COPYRIGHT
+
+
+import sys
+import threading
+import time
+import traceback
+import unittest
+
+from pyfeatures.pipeline import Consumer, prefetch
+
+
+def get_tb_functions(callable_, *args):
+    try:
+        callable_(*args)
+    except RuntimeError:
+        return [_[2] for _ in traceback.extract_tb(sys.exc_info()[2])]
+    raise AssertionError("RuntimeError not raised")
+
+
+class TestPrefetch(unittest.TestCase):
+
+    def test_order(self):
+        self.assertEqual(list(prefetch(xrange(100), maxsize=3)), range(100))
+        self.assertEqual(list(prefetch([])), [])
+
+    def test_bounded(self):
+        produced = []
+
+        def gen():
+            for i in xrange(100):
+                produced.append(i)
+                yield i
+        it = prefetch(gen(), maxsize=4)
+        self.assertEqual(next(it), 0)
+        time.sleep(.2)
+        # consumed + queued + one waiting to be put
+        self.assertTrue(len(produced) <= 6)
+        it.close()
+
+    def test_error(self):
+        def gen():
+            yield 1
+            raise RuntimeError("foo")
+        it = prefetch(gen())
+        self.assertEqual(next(it), 1)
+        self.assertIn("gen", get_tb_functions(next, it))
+
+    def test_close(self):
+        n_threads = threading.active_count()
+        it = prefetch(iter(xrange(1000)), maxsize=2)
+        next(it)
+        it.close()
+        self.assertEqual(threading.active_count(), n_threads)
+
+    def test_thread(self):
+        names = []
+
+        def gen():
+            names.append(threading.current_thread().name)
+            yield 0
+        list(prefetch(gen()))
+        self.assertNotEqual(names, [threading.current_thread().name])
+
+
+class TestConsumer(unittest.TestCase):
+
+    def test_order(self):
+        out = []
+        c = Consumer(out.append, maxsize=2)
+        for i in xrange(100):
+            c.put(i)
+        c.close()
+        self.assertEqual(out, range(100))
+
+    def test_lazy(self):
+        c = Consumer(lambda _: None)
+        self.assertTrue(c.thread is None)
+        c.close()
+
+    def test_error(self):
+        def func(i):
+            if i == 3:
+                raise RuntimeError("foo")
+        c = Consumer(func, maxsize=1)
+
+        def put_all():
+            for i in xrange(100):
+                c.put(i)
+        self.assertIn("func", get_tb_functions(put_all))
+        self.assertIn("func", get_tb_functions(c.close))
+
+    def test_abort(self):
+        out = []
+        event = threading.Event()
+
+        def func(i):
+            event.wait()
+            out.append(i)
+        c = Consumer(func, maxsize=10)
+        for i in xrange(5):
+            c.put(i)
+        c.stop.set()
+        event.set()
+        c.abort()
+        self.assertTrue(len(out) <= 1)
+        self.assertTrue(c.thread is None)
+
+
+def load_tests(loader, tests, pattern):
+    test_cases = (TestPrefetch, TestConsumer)
+    suite = unittest.TestSuite()
+    for tc in test_cases:
+        suite.addTests(loader.loadTestsFromTestCase(tc))
+    return suite
+
+
+def main():
+    suite = load_tests(unittest.defaultTestLoader, None, None)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
+
+
+if __name__ == '__main__':
+    main()
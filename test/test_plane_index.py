@@ -0,0 +1,156 @@
+# BEGIN_COPYRIGHT
+#
+# Copyright (C) 2017 Open Microscopy Environment:
+#   - University of Dundee
+#   - CRS4
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# END_COPYRIGHT
+
+import unittest
+import copy
+import os
+import shutil
+import tempfile
+
+import avro.datafile
+import avro.schema
+from avro.io import DatumWriter
+
+import pyfeatures.plane_index as plane_index
+from pyfeatures.avro_container import iter_plane_subset, read_first_head
+from pyfeatures.schema import BioImgPlane
+
+SIZEZ, SIZEC = 3, 2
+
+
+def make_records():
+    records = []
+    for z in xrange(SIZEZ):
+        for c in xrange(SIZEC):
+            records.append({
+                "name": u"img_0",
+                "img_path": u"/bar/spam/img_0.tif",
+                "dimension_order": u"XYCZT",
+                "series": 0,
+                "pixel_data": {
+                    "dtype": "UINT8",
+                    "little_endian": True,
+                    "shape": [4, 2, SIZEC, SIZEZ, 1],
+                    "offsets": [0, 0, c, z, 0],
+                    "deltas": [4, 2, 1, 1, 1],
+                    "data": chr(z) * 4 + chr(c) * 4,
+                },
+            })
+    return records
+
+
+class TestPlaneIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.wd = tempfile.mkdtemp(prefix="pyfeatures_")
+        self.records = make_records()
+
+    def tearDown(self):
+        shutil.rmtree(self.wd)
+
+    def _write(self, codec):
+        fn = os.path.join(self.wd, "%s.avro" % codec)
+        schema = avro.schema.parse(BioImgPlane)
+        with open(fn, "w") as f:
+            writer = avro.datafile.DataFileWriter(
+                f, DatumWriter(), schema, codec=codec
+            )
+            for i, r in enumerate(self.records):
+                writer.append(r)
+                if i % 4 == 3:
+                    writer.sync()  # more than one block
+            writer.close()
+        return fn
+
+    def runTest(self):
+        for codec in "null", "deflate":
+            fn = self._write(codec)
+            self.assertTrue(plane_index.load_index(fn) is None)
+            index = plane_index.write_index(fn)
+            self.assertEqual(len(index.entries), len(self.records))
+            self.assertEqual(
+                len(set(_[4] for _ in index.entries)), 2  # block offsets
+            )
+            index = plane_index.load_index(fn)
+            self.assertFalse(index is None)
+            with open(fn) as f:
+                for z in xrange(SIZEZ):
+                    for c in xrange(SIZEC):
+                        pos = index.find(zsubset={z}, csubset={c})
+                        self.assertEqual(len(pos), 1)
+                        r, = plane_index.iter_records(f, pos)
+                        self.assertEqual(r, self.records[z * SIZEC + c])
+                pos = index.find(zsubset={0, SIZEZ - 1})
+                exp_records = self.records[:SIZEC] + self.records[-SIZEC:]
+                self.assertEqual(
+                    list(plane_index.iter_records(f, pos)), exp_records
+                )
+                self.assertEqual(index.find(tsubset={1}), [])
+                self.assertEqual(
+                    list(plane_index.iter_records(f, index.find())),
+                    self.records
+                )
+            with open(fn, "a") as f:
+                f.write("\0")
+            self.assertTrue(plane_index.load_index(fn) is None)  # stale
+
+
+class TestReadFirstHead(TestPlaneIndex):
+
+    def runTest(self):
+        for codec in "null", "deflate":
+            fn = self._write(codec)
+            with open(fn) as f:
+                head = read_first_head(f)
+            exp_head = copy.deepcopy(self.records[0])
+            del exp_head["pixel_data"]["data"]
+            self.assertEqual(head, exp_head)
+
+
+class TestIterPlaneSubset(TestPlaneIndex):
+
+    def runTest(self):
+        for codec in "null", "deflate":
+            fn = self._write(codec)
+            with open(fn) as f:
+                records = list(iter_plane_subset(f, zsubset={1}))
+                self.assertEqual(records, self.records[SIZEC: 2 * SIZEC])
+                records = list(iter_plane_subset(f, zsubset={0, 2},
+                                                 csubset={1}))
+                self.assertEqual(records, self.records[1::2 * SIZEC])
+                self.assertEqual(list(iter_plane_subset(f)), self.records)
+
+
+def load_tests(loader, tests, pattern):
+    test_cases = (TestPlaneIndex, TestReadFirstHead, TestIterPlaneSubset)
+    suite = unittest.TestSuite()
+    for tc in test_cases:
+        suite.addTests(loader.loadTestsFromTestCase(tc))
+    return suite
+
+
+def main():
+    suite = load_tests(unittest.defaultTestLoader, None, None)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
+
+
+if __name__ == '__main__':
+    main()
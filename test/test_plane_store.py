@@ -0,0 +1,78 @@
+# BEGIN_COPYRIGHT
+#
+# Copyright (C) 2017 Open Microscopy Environment:
+#   - University of Dundee
+#   - CRS4
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# END_COPYRIGHT
+
+import unittest
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+import pyfeatures.plane_store as plane_store
+
+
+class TestPlaneStore(unittest.TestCase):
+
+    def setUp(self):
+        self.wd = tempfile.mkdtemp(prefix="pyfeatures_")
+        self.store = plane_store.PlaneStore(dir=self.wd)
+        self.a = np.arange(6 * 8, dtype=">u2").reshape((6, 8))
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.wd)
+
+    def test_get_tile(self):
+        seg = self.store.put(self.a)
+        tile = plane_store.get_tile(seg, 2, 3, 4, 5)
+        self.assertEqual(tile.dtype, self.a.dtype)
+        self.assertTrue(np.array_equal(tile, self.a[2:6, 3:8]))
+        self.assertFalse(tile.flags.writeable)
+
+    def test_refcount(self):
+        seg = self.store.put(self.a)
+        self.store.acquire(seg)
+        self.store.release(seg)
+        self.assertTrue(os.path.isfile(seg))
+        self.store.release(seg)
+        self.assertFalse(os.path.exists(seg))
+
+    def test_close(self):
+        self.store.put(self.a)
+        self.store.close()
+        self.assertFalse(os.path.exists(self.store.dir))
+
+
+def load_tests(loader, tests, pattern):
+    test_cases = (TestPlaneStore,)
+    suite = unittest.TestSuite()
+    for tc in test_cases:
+        suite.addTests(loader.loadTestsFromTestCase(tc))
+    return suite
+
+
+def main():
+    suite = load_tests(unittest.defaultTestLoader, None, None)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
+
+
+if __name__ == '__main__':
+    main()
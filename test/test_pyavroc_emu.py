@@ -23,11 +23,34 @@ import tempfile
 import shutil
 import os
 
+from avro.datafile import DataFileReader
+from avro.io import AvroTypeException, DatumReader
+
+import pyfeatures.app.common as common
+import pyfeatures.avro_container as avro_container
 import pyfeatures.pyavroc_emu as pyavroc_emu
 import pyfeatures.schema as schema
+from pyfeatures.app.common import get_avro_reader
 from pyfeatures.feature_names import FEATURE_NAMES
 
 
+RANGES = """\
+{
+  "type": "record", "name": "Ranges", "fields": [
+    {"name": "i", "type": "int"},
+    {"name": "l", "type": "long"},
+    {"name": "b", "type": "boolean"}
+  ]
+}
+"""
+
+
+class FakeReader(object):
+
+    def __init__(self, f):
+        self.f = f
+
+
 class Base(unittest.TestCase):
 
     def setUp(self):
@@ -84,22 +107,196 @@ class TestFileIO(Base):
                 self.assertEqual(reader.next(), record)
 
 
+class TestAppend(TestFileIO):
+
+    def runTest(self):
+        record = self.record_map["Signatures"]
+        fn = os.path.join(self.wd, "foo")
+        with open(fn, "w") as f:
+            writer = pyavroc_emu.AvroFileWriter(f, schema.Signatures)
+            writer.write(record)
+            writer.close()
+        with open(fn, "r+b") as f:
+            writer = pyavroc_emu.AvroFileWriter(f)
+            writer.write(record)
+            writer.close()
+        with open(fn) as f:
+            reader = pyavroc_emu.AvroFileReader(f)
+            self.assertEqual(list(reader), [record, record])
+
+
+class TestCompiled(TestFileIO):
+
+    def test_blocks(self):
+        record = self.record_map["Signatures"]
+        fn = os.path.join(self.wd, "foo")
+        for codec in "null", "deflate":
+            with open(fn, "w") as f:
+                writer = pyavroc_emu.AvroFileWriter(f, schema.Signatures,
+                                                    codec=codec)
+                for i in xrange(20):
+                    record["x"] = i
+                    writer.write(record)
+                    if i % 7 == 0:
+                        writer.flush()
+                writer.close()
+            with open(fn) as f:
+                reader = pyavroc_emu.AvroFileReader(f)
+                self.assertFalse(reader.decode is None)
+                self.assertEqual([_["x"] for _ in reader], range(20))
+            with open(fn) as f:
+                self.assertEqual(len(list(DataFileReader(f, DatumReader()))),
+                                 20)
+
+    def test_bad_record(self):
+        record = self.record_map["Signatures"]
+        del record["x"]
+        with open(os.path.join(self.wd, "foo"), "w") as f:
+            writer = pyavroc_emu.AvroFileWriter(f, schema.Signatures)
+            self.assertRaises(AvroTypeException, writer.write, record)
+
+    def test_fallback(self):
+        schema_str = '["null", "int"]'
+        fn = os.path.join(self.wd, "foo")
+        with open(fn, "w") as f:
+            writer = pyavroc_emu.AvroFileWriter(f, schema_str)
+            for datum in None, 1, None:
+                writer.write(datum)
+            writer.close()
+        with open(fn) as f:
+            reader = pyavroc_emu.AvroFileReader(f)
+            self.assertFalse(reader.decode is None)
+            reader.decode = None  # force the generic decoder
+            self.assertEqual(list(reader), [None, 1, None])
+
+
+class TestCodecs(TestFileIO):
+
+    def test_codecs(self):
+        data = "foobar" * 100
+        for codec in avro_container.CODECS:
+            try:
+                codec = avro_container.get_codec(codec)
+            except ValueError:
+                continue  # module not available
+            compressed = avro_container.compress(codec, data)
+            self.assertEqual(avro_container.decompress(codec, compressed),
+                             data)
+        self.assertEqual(avro_container.get_codec("deflate"), "deflate")
+        self.assertRaises(ValueError, avro_container.get_codec, "foo")
+
+    def test_block_size(self):
+        record = self.record_map["Signatures"]
+        fn = os.path.join(self.wd, "foo")
+        with open(fn, "w+") as f:
+            writer = pyavroc_emu.AvroFileWriter(f, schema.Signatures,
+                                                codec="deflate", block_size=1)
+            for i in xrange(3):
+                record["x"] = i
+                writer.write(record)
+            writer.close()
+        with open(fn, "r+") as f:
+            writer = pyavroc_emu.AvroFileWriter(f, block_size=1 << 20)
+            record["x"] = 3
+            writer.write(record)
+            writer.write(record)
+            writer.close()
+        with open(fn) as f:
+            container = avro_container.ContainerReader(f)
+            self.assertEqual(container.codec, "deflate")
+            blocks = list(container.iter_block_data())
+            self.assertEqual([_[1] for _ in blocks], [1, 1, 1, 2])
+        with open(fn) as f:
+            reader = DataFileReader(f, DatumReader())
+            self.assertEqual([_["x"] for _ in reader], [0, 1, 2, 3, 3])
+
+    def test_get_avro_reader(self):
+        fn = os.path.join(self.wd, "foo")
+        with open(fn, "w") as f:
+            writer = pyavroc_emu.AvroFileWriter(f, schema.Signatures,
+                                                codec="deflate")
+            writer.write(self.record_map["Signatures"])
+            writer.close()
+        with open(fn) as f:
+            f.seek(10)
+            self.assertEqual(avro_container.get_file_codec(f), "deflate")
+            self.assertEqual(f.tell(), 10)
+            f.seek(0)
+            self.assertTrue(isinstance(get_avro_reader(f, FakeReader),
+                                       FakeReader))
+        old_native_codecs = common.NATIVE_CODECS
+        common.NATIVE_CODECS = frozenset(["null"])
+        try:
+            with open(fn) as f:
+                reader = get_avro_reader(f, FakeReader)
+                self.assertTrue(isinstance(reader, pyavroc_emu.AvroFileReader))
+                self.assertEqual(len(list(reader)), 1)
+        finally:
+            common.NATIVE_CODECS = old_native_codecs
+
+    def test_bad_args(self):
+        with open(os.path.join(self.wd, "foo"), "w") as f:
+            self.assertRaises(ValueError, pyavroc_emu.AvroFileWriter, f,
+                              schema.Signatures, codec="foo")
+            self.assertRaises(ValueError, pyavroc_emu.AvroFileWriter, f,
+                              schema.Signatures, block_size=0)
+
+
 class TestSerDe(Base):
 
     def setUp(self):
         super(TestSerDe, self).setUp()
 
-    def runTest(self):
+    def test_roundtrip(self):
         for name, record in self.record_map.iteritems():
             schema_str = getattr(schema, name)
             serializer = pyavroc_emu.AvroSerializer(schema_str)
             rec_bytes = serializer.serialize(record)
             deserializer = pyavroc_emu.AvroDeserializer(schema_str)
-            self.assertEqual(deserializer.deserialize(rec_bytes), record)
+            for data in (rec_bytes, bytearray(rec_bytes),
+                         memoryview(rec_bytes)):
+                self.assertEqual(deserializer.deserialize(data), record)
+            deserializer.decode = None  # force the generic decoder
+            self.assertEqual(
+                deserializer.deserialize(memoryview(rec_bytes)), record
+            )
+
+    def test_many(self):
+        for name, record in self.record_map.iteritems():
+            serializer = pyavroc_emu.AvroSerializer(getattr(schema, name))
+            expected = serializer.serialize(record)
+            self.assertEqual(serializer.serialize_many([record] * 3),
+                             [expected] * 3)
+            self.assertEqual(serializer.serialize_many([]), [])
+            self.assertEqual(serializer.serialize(record), expected)
+            serializer.encode = None  # force the generic encoder
+            self.assertEqual(serializer.serialize_many([record] * 2),
+                             [expected] * 2)
+
+    def test_bad_record(self):
+        serializer = pyavroc_emu.AvroSerializer(schema.Signatures)
+        record = self.record_map["Signatures"].copy()
+        del record["x"]
+        self.assertRaises(AvroTypeException, serializer.serialize, record)
+        record = self.record_map["Signatures"]
+        self.assertRaises(AvroTypeException, serializer.serialize_many,
+                          [record, {}])
+        self.assertTrue(serializer.serialize(record))
+
+    def test_bad_values(self):
+        serializer = pyavroc_emu.AvroSerializer(RANGES)
+        record = {"i": -(1 << 31), "l": (1 << 63) - 1, "b": True}
+        self.assertTrue(serializer.serialize(record))
+        for k, v in ("i", 1 << 40), ("l", 1 << 70), ("b", 5):
+            bad_record = record.copy()
+            bad_record[k] = v
+            self.assertRaises(AvroTypeException, serializer.serialize,
+                              bad_record)
 
 
 def load_tests(loader, tests, pattern):
-    test_cases = (TestFileIO, TestSerDe)
+    test_cases = (TestFileIO, TestAppend, TestCompiled, TestCodecs,
+                  TestSerDe)
     suite = unittest.TestSuite()
     for tc in test_cases:
         suite.addTests(loader.loadTestsFromTestCase(tc))
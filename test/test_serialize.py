@@ -0,0 +1,89 @@
+# BEGIN_COPYRIGHT
+#
+# Copyright (C) 2017 Open Microscopy Environment:
+#   - University of Dundee
+#   - CRS4
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# END_COPYRIGHT
+
+
+import unittest
+import os
+import shutil
+import tempfile
+
+from pyfeatures.app.serialize import (
+    get_new_containers, get_out_dir, list_containers
+)
+
+
+class TestGetOutDir(unittest.TestCase):
+
+    def runTest(self):
+        cwd = os.getcwd()
+        for argv, exp_res in [
+            (["/foo/img.ome.tif"], cwd),
+            (["-o", "out", "img"], "out"),
+            (["--outdir=out", "-zs", "1,2", "-t", "x", "img.tif"], "out"),
+            (["-ts", "0", "--tag", "x", "--outdir", "out", "img.tif"],
+             "out"),
+        ]:
+            self.assertEqual(get_out_dir(argv), exp_res)
+
+
+class TestGetNewContainers(unittest.TestCase):
+
+    def setUp(self):
+        self.wd = tempfile.mkdtemp(prefix="pyfeatures_")
+
+    def tearDown(self):
+        shutil.rmtree(self.wd)
+
+    def __touch(self, bn, mtime):
+        fn = os.path.join(self.wd, bn)
+        open(fn, "w").close()
+        os.utime(fn, (mtime, mtime))
+        return fn
+
+    def runTest(self):
+        t = 1000000.5
+        overwritten = self.__touch("img_0.avro", t)
+        self.__touch("img_1.avro", t)  # left by a previous run
+        self.__touch("notes.txt", t)
+        before = list_containers(self.wd)
+        self.assertEqual(len(before), 2)
+        self.__touch("img_0.avro", t + .25)
+        new = self.__touch("other_0.avro", t)
+        self.assertEqual(get_new_containers(self.wd, before),
+                         sorted([overwritten, new]))
+        self.assertEqual(list_containers(os.path.join(self.wd, "foo")), {})
+
+
+def load_tests(loader, tests, pattern):
+    test_cases = (TestGetOutDir, TestGetNewContainers)
+    suite = unittest.TestSuite()
+    for tc in test_cases:
+        suite.addTests(loader.loadTestsFromTestCase(tc))
+    return suite
+
+
+def main():
+    suite = load_tests(unittest.defaultTestLoader, None, None)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
+
+
+if __name__ == '__main__':
+    main()
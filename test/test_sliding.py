@@ -0,0 +1,151 @@
+# BEGIN_COPYRIGHT
+#
+# Copyright (C) 2017 Open Microscopy Environment:
+#   - University of Dundee
+#   - CRS4
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# END_COPYRIGHT
+
+
+import unittest
+
+import numpy as np
+
+from pyfeatures.sliding import (
+    SlidingWindowStats, integral_image, running_extremum, window_sums
+)
+from pyfeatures.tiling import gen_tile_coords
+
+
+def gen_coords(H, W, h, w, dy, dx):
+    return gen_tile_coords(H, W, w=w, h=h, dx=dx, dy=dy)
+
+
+class TestIntegralImage(unittest.TestCase):
+
+    def runTest(self):
+        a = np.random.randint(0, 1 << 16, (7, 9)).astype(np.uint16)
+        S = integral_image(a)
+        self.assertEqual(S.shape, (8, 10))
+        self.assertEqual(S.dtype, np.int64)
+        coords = [(0, 0, 7, 9), (2, 3, 4, 5), (6, 8, 1, 1)]
+        self.assertEqual(window_sums(S, coords).tolist(),
+                         [a[i: i + h, j: j + w].sum()
+                          for i, j, h, w in coords])
+        self.assertEqual(integral_image(a.astype("f4")).dtype, np.float64)
+
+
+class TestRunningExtremum(unittest.TestCase):
+
+    def runTest(self):
+        a = np.random.randint(0, 100, (5, 11)).astype(np.int32)
+        for size in 1, 3, 4, 11:
+            for ufunc, f in (np.minimum, np.min), (np.maximum, np.max):
+                r = running_extremum(a, size, 1, ufunc=ufunc)
+                self.assertEqual(r.shape, (5, 12 - size))
+                for k in xrange(12 - size):
+                    self.assertEqual(r[:, k].tolist(),
+                                     f(a[:, k: k + size], axis=1).tolist())
+        self.assertRaises(ValueError, running_extremum, a, 6, 0)
+
+
+class TestSlidingWindowStats(unittest.TestCase):
+
+    def setUp(self):
+        self.H, self.W = 37, 50
+        self.a = np.random.randint(0, 1 << 12, (self.H, self.W)).astype(
+            np.uint16
+        )
+        self.coords = list(gen_coords(self.H, self.W, 10, 12, 3, 4))
+        self.tiles = [self.a[i: i + h, j: j + w]
+                      for i, j, h, w in self.coords]
+        self.stats = SlidingWindowStats(self.a)
+
+    def test_sum_mean_std(self):
+        self.assertEqual(self.stats.sum(self.coords).tolist(),
+                         [_.sum() for _ in self.tiles])
+        exp_mean = [_.mean() for _ in self.tiles]
+        exp_std = [_.std(ddof=1) for _ in self.tiles]
+        for v, exp_v in zip(self.stats.mean(self.coords), exp_mean):
+            self.assertAlmostEqual(v, exp_v)
+        for v, exp_v in zip(self.stats.std(self.coords), exp_std):
+            self.assertAlmostEqual(v, exp_v, places=6)
+
+    def test_float(self):
+        for v in 0.1, 1e6 + 0.7:
+            stats = SlidingWindowStats(np.full((self.H, self.W), v))
+            self.assertEqual(stats.std(self.coords).tolist(),
+                             [0.] * len(self.coords))
+            for s, (_, _, h, w) in zip(stats.mean(self.coords), self.coords):
+                self.assertAlmostEqual(s, v)
+            a = self.a / 7. + v
+            a[:10, :12] = v  # a constant tile in a non-constant plane
+            stats = SlidingWindowStats(a)
+            tiles = [a[i: i + h, j: j + w] for i, j, h, w in self.coords]
+            std = stats.std(self.coords)
+            self.assertEqual(std[0], 0.)
+            for s, t in zip(std, tiles):
+                self.assertAlmostEqual(s, t.std(ddof=1), places=6)
+            for s, t in zip(stats.sum(self.coords), tiles):
+                self.assertAlmostEqual(s / t.sum(), 1.)
+
+    def test_int32(self):
+        for dtype, low in (np.uint32, 0), (np.int32, -(1 << 31)):
+            a = np.random.randint(low, low + (1 << 32), (self.H, self.W),
+                                  dtype=np.int64).astype(dtype)
+            a[:10, :12] = low  # a constant tile
+            stats = SlidingWindowStats(a)
+            tiles = [a[i: i + h, j: j + w].astype(np.float64)
+                     for i, j, h, w in self.coords]
+            std = stats.std(self.coords)
+            self.assertEqual(std[0], 0.)
+            self.assertTrue(np.allclose(std, [_.std(ddof=1) for _ in tiles]))
+            self.assertTrue(np.allclose(stats.mean(self.coords),
+                                        [_.mean() for _ in tiles]))
+            self.assertEqual(stats.max(self.coords).tolist(),
+                             [_.max() for _ in tiles])
+
+    def test_min_max(self):
+        self.assertEqual(self.stats.min(self.coords).tolist(),
+                         [_.min() for _ in self.tiles])
+        self.assertEqual(self.stats.max(self.coords).tolist(),
+                         [_.max() for _ in self.tiles])
+
+    def test_histograms(self):
+        bin_edges = np.linspace(0, 1 << 12, 6)
+        counts = self.stats.histograms(self.coords, bin_edges)
+        self.assertEqual(counts.shape, (len(self.coords), 5))
+        for c, t in zip(counts, self.tiles):
+            self.assertEqual(c.tolist(),
+                             np.histogram(t, bins=bin_edges)[0].tolist())
+
+
+def load_tests(loader, tests, pattern):
+    test_cases = (TestIntegralImage, TestRunningExtremum,
+                  TestSlidingWindowStats)
+    suite = unittest.TestSuite()
+    for tc in test_cases:
+        suite.addTests(loader.loadTestsFromTestCase(tc))
+    return suite
+
+
+def main():
+    suite = load_tests(unittest.defaultTestLoader, None, None)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
+
+
+if __name__ == '__main__':
+    main()
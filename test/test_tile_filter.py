@@ -0,0 +1,139 @@
+# BEGIN_COPYRIGHT
+#
+# Copyright (C) 2017 Open Microscopy Environment:
+#   - University of Dundee
+#   - CRS4
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# END_COPYRIGHT
+
+
+import unittest
+
+import numpy as np
+
+from pyfeatures.tile_filter import (
+    METHODS, TileFilter, get_scores, otsu_threshold
+)
+
+H, W = 12, 16
+
+
+def make_plane():
+    a = np.zeros((H, W), dtype=np.uint16)
+    a[:6, :8] = np.random.randint(1000, 2000, (6, 8))
+    a[6:, 8:] = 3
+    return a
+
+
+def get_coords(h, w):
+    return [(i, j, min(h, H - i), min(w, W - j))
+            for i in xrange(0, H, h) for j in xrange(0, W, w)]
+
+
+class TestOtsu(unittest.TestCase):
+
+    def test_bimodal(self):
+        a = np.concatenate([np.random.randint(0, 10, 100),
+                            np.random.randint(200, 210, 50)])
+        t = otsu_threshold(a)
+        self.assertTrue(9 < t <= 200)
+        self.assertEqual((a >= t).sum(), 50)
+
+    def test_constant(self):
+        a = np.full((4, 4), 5, dtype=np.uint8)
+        self.assertFalse((a >= otsu_threshold(a)).any())
+
+
+class TestScores(unittest.TestCase):
+
+    def setUp(self):
+        self.a = make_plane()
+        self.coords = get_coords(5, 6)
+
+    def test_naive(self):
+        a = self.a
+        tiles = [a[i: i + h, j: j + w] for i, j, h, w in self.coords]
+        scores = get_scores(a, self.coords, "variance")
+        for s, t in zip(scores, tiles):
+            self.assertAlmostEqual(s, t.astype(np.float64).var(ddof=1))
+        scores = get_scores(a, self.coords, "range")
+        for s, t in zip(scores, tiles):
+            self.assertEqual(s, float(t.max()) - t.min())
+        scores = get_scores(a, self.coords, "otsu")
+        thr = otsu_threshold(a)
+        for s, t in zip(scores, tiles):
+            self.assertAlmostEqual(s, (t >= thr).mean())
+
+    def test_bad_method(self):
+        self.assertRaises(ValueError, get_scores, self.a, self.coords, "foo")
+        self.assertRaises(ValueError, TileFilter, "foo")
+
+
+class TestTileFilter(unittest.TestCase):
+
+    def test_int(self):
+        a = make_plane()
+        coords = get_coords(6, 8)
+        for m in METHODS:
+            bg = TileFilter(m).get_background(a, coords)
+            self.assertEqual(bg, set([(0, 8), (6, 0), (6, 8)]))
+        bg = TileFilter("range", threshold=3).get_background(a, coords)
+        self.assertEqual(bg, set([(0, 8), (6, 0), (6, 8)]))
+        bg = TileFilter("range", threshold=1e6).get_background(a, coords)
+        self.assertEqual(len(bg), 4)
+        self.assertEqual(TileFilter("otsu").get_background(a, []), set())
+
+    def test_int32(self):
+        coords = get_coords(3, 4)
+        for dtype, low in (np.uint32, 0), (np.int32, -(1 << 31)):
+            a = np.random.randint(low, low + (1 << 32), (H, W),
+                                  dtype=np.int64).astype(dtype)
+            a[:3, :4] = low  # a constant tile
+            for m in "variance", "range":
+                bg = TileFilter(m).get_background(a, coords)
+                self.assertEqual(bg, set([(0, 0)]))
+            exp_scores = [a[i: i + h, j: j + w].astype(np.float64).var(ddof=1)
+                          for i, j, h, w in coords]
+            scores = get_scores(a, coords, "variance")
+            self.assertTrue(np.allclose(scores, exp_scores))
+
+    def test_float(self):
+        coords = get_coords(6, 8)
+        for v in 0.1, 1e6 + 0.7:
+            a = np.full((H, W), v)
+            for m in METHODS:
+                bg = TileFilter(m).get_background(a, coords)
+                self.assertEqual(len(bg), 4)
+            a = make_plane().astype(np.float32) / 7 + v
+            bg = TileFilter("variance").get_background(a, coords)
+            self.assertEqual(bg, set([(0, 8), (6, 0), (6, 8)]))
+
+
+def load_tests(loader, tests, pattern):
+    test_cases = (TestOtsu, TestScores, TestTileFilter)
+    suite = unittest.TestSuite()
+    for tc in test_cases:
+        suite.addTests(loader.loadTestsFromTestCase(tc))
+    return suite
+
+
+def main():
+    suite = load_tests(unittest.defaultTestLoader, None, None)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+# BEGIN_COPYRIGHT
+#
+# Copyright (C) 2017 Open Microscopy Environment:
+#   - University of Dundee
+#   - CRS4
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy
+# of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+# END_COPYRIGHT
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+import pyfeatures.backends as backends
+import pyfeatures.tile_tuning as tile_tuning
+
+
+class TestCandidates(unittest.TestCase):
+
+    def test_count_tiles(self):
+        self.assertEqual(tile_tuning.count_tiles(6, 8, 4, 3, 4, 3), 4)
+        self.assertEqual(tile_tuning.count_tiles(6, 8, 4, 3, 2, 3), 6)
+        self.assertEqual(tile_tuning.count_tiles(6, 8, 8, 6, 8, 6), 1)
+
+    def test_candidates(self):
+        candidates = tile_tuning.get_candidates(12, 12, min_w=3, min_h=3)
+        self.assertTrue((12, 12, 12, 12) in candidates)
+        self.assertTrue((4, 3, 4, 3) in candidates)
+        self.assertFalse((12, 3, 12, 3) in candidates)  # stripe
+        for w, h, dx, dy in candidates:
+            self.assertTrue(w >= 3 and h >= 3)
+            self.assertEqual(12 % w, 0)
+            self.assertEqual(12 % h, 0)
+            self.assertEqual((dx, dy), (w, h))
+
+    def test_elongated(self):
+        candidates = tile_tuning.get_candidates(12, 48, min_w=3, min_h=3)
+        for tiling in (48, 12, 48, 12), (24, 12, 24, 12), (12, 12, 12, 12):
+            self.assertTrue(tiling in candidates)
+        self.assertFalse((48, 6, 48, 6) in candidates)  # stripe
+        self.assertFalse((12, 3, 12, 3) in candidates)  # stripe
+        candidates = tile_tuning.get_candidates(48, 12, min_w=3, min_h=3)
+        self.assertTrue((12, 24, 12, 24) in candidates)
+        self.assertFalse((6, 48, 6, 48) in candidates)
+
+    def test_overlap(self):
+        candidates = tile_tuning.get_candidates(8, 8, min_w=4, min_h=4,
+                                                overlap=.5)
+        self.assertTrue((4, 4, 2, 2) in candidates)
+        self.assertRaises(ValueError, tile_tuning.get_candidates, 8, 8,
+                          overlap=1)
+
+    def test_sample_shapes(self):
+        candidates = tile_tuning.get_candidates(64, 64, min_w=2, min_h=2)
+        shapes = tile_tuning.get_sample_shapes(candidates, 3)
+        self.assertEqual(len(shapes), 3)
+        self.assertFalse((64, 64) in shapes)
+        self.assertEqual(shapes[0], (2, 2))
+        sizes = [h * w for h, w in shapes]
+        self.assertEqual(sizes, sorted(sizes))
+
+
+class TestModel(unittest.TestCase):
+
+    def setUp(self):
+        # time per tile = 1e-6 * px ** 1.5, error = 10 / sqrt(px)
+        self.samples = [(s, s, 1e-6 * s ** 3, 10. / s) for s in (4, 8, 16)]
+        self.model = tile_tuning.TileModel.fit(32, 32, self.samples)
+
+    def test_fit(self):
+        self.assertRaises(ValueError, tile_tuning.TileModel.fit, 32, 32,
+                          self.samples[:1])
+        t, err = self.model.predict(8, 8, 8, 8)
+        self.assertAlmostEqual(t, 16 * 512e-6)
+        self.assertAlmostEqual(err, 10. / 8)
+        t, err = self.model.predict(32, 32, 32, 32)
+        self.assertAlmostEqual(t, 1e-6 * 32 ** 3)
+        self.assertEqual(err, 0)
+        model = tile_tuning.TileModel.fit(32, 32, self.samples,
+                                          ref_time=.5)
+        self.assertEqual(model.predict(32, 32, 32, 32), (.5, 0.))
+        self.assertEqual(model.predict(8, 8, 8, 8),
+                         self.model.predict(8, 8, 8, 8))
+        t_overlap, _ = self.model.predict(8, 8, 4, 4)
+        self.assertTrue(t_overlap > 16 * 512e-6)
+
+    def test_json(self):
+        model = tile_tuning.TileModel.from_json(self.model.to_json())
+        self.assertEqual(model.predict(8, 8, 8, 8),
+                         self.model.predict(8, 8, 8, 8))
+        self.model.ref_time = .5
+        model = tile_tuning.TileModel.from_json(self.model.to_json())
+        self.assertEqual(model.predict(32, 32, 32, 32), (.5, 0.))
+        d = self.model.to_json()
+        del d["ref_time"]  # cached before ref_time was stored
+        self.assertTrue(tile_tuning.TileModel.from_json(d).ref_time is None)
+
+    def test_recommend(self):
+        candidates = tile_tuning.get_candidates(32, 32)
+        tiling, t, err, ok = tile_tuning.recommend(
+            self.model, candidates, max_error=1.
+        )
+        self.assertTrue(ok)
+        self.assertEqual(tiling, (16, 16, 16, 16))
+        tiling, t, err, ok = tile_tuning.recommend(
+            self.model, candidates, max_error=.1
+        )
+        self.assertTrue(ok)
+        self.assertEqual(tiling, (32, 32, 32, 32))
+        tiling, t, err, ok = tile_tuning.recommend(
+            self.model, candidates, time_budget=.01
+        )
+        self.assertTrue(ok)
+        self.assertEqual(tiling, (8, 8, 8, 8))
+        tiling, t, err, ok = tile_tuning.recommend(
+            self.model, candidates, time_budget=1e-9
+        )
+        self.assertFalse(ok)
+        self.assertRaises(ValueError, tile_tuning.recommend, self.model,
+                          candidates)
+
+
+class TestSample(unittest.TestCase):
+
+    def runTest(self):
+        pixels = np.arange(64 * 48, dtype=np.uint16).reshape(64, 48)
+        backend = backends.get_backend("numpy")
+        shapes = [(8, 8), (16, 16)]
+        ref_time, samples = tile_tuning.sample(backend, pixels, shapes,
+                                               n_tiles=4, seed=0)
+        self.assertTrue(ref_time >= 0)
+        self.assertEqual([_[:2] for _ in samples], shapes)
+        for _, _, t, err in samples:
+            self.assertTrue(t >= 0)
+            self.assertTrue(err > 0)
+
+
+class TestCache(unittest.TestCase):
+
+    def setUp(self):
+        self.wd = tempfile.mkdtemp(prefix="pyfeatures_")
+
+    def tearDown(self):
+        shutil.rmtree(self.wd)
+
+    def runTest(self):
+        fn = os.path.join(self.wd, "sub", "cache.json")
+        key = tile_tuning.get_cache_key(64, 48, np.uint16, False, "stub")
+        self.assertNotEqual(key, tile_tuning.get_cache_key(
+            64, 48, np.uint8, False, "stub"
+        ))
+        cache = tile_tuning.ModelCache(fn)
+        self.assertTrue(cache.get_model(key) is None)
+        model = tile_tuning.TileModel(64, 48, [1., -10.], [-.5, 1.])
+        cache.put_model(key, model)
+        rec = (16, 16, 16, 16), 1.5, .25, True
+        cache.put_recommendation(key, "foo", rec)
+        cache.save()
+        cache = tile_tuning.ModelCache(fn)
+        self.assertEqual(cache.get_model(key).to_json(), model.to_json())
+        self.assertEqual(cache.get_recommendation(key, "foo"), rec)
+        self.assertTrue(cache.get_recommendation(key, "bar") is None)
+        cache.put_model(key, model)
+        self.assertTrue(cache.get_recommendation(key, "foo") is None)
+
+
+def load_tests(loader, tests, pattern):
+    test_cases = (TestCandidates, TestModel, TestSample, TestCache)
+    suite = unittest.TestSuite()
+    for tc in test_cases:
+        suite.addTests(loader.loadTestsFromTestCase(tc))
+    return suite
+
+
+def main():
+    suite = load_tests(unittest.defaultTestLoader, None, None)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
+
+
+if __name__ == '__main__':
+    main()